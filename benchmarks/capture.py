@@ -0,0 +1,68 @@
+"""
+Benchmark of capture reading: core.pcap streaming parser against scapy readers,
+raw frames (RawPcapReader) and dissected packets (PcapReader), all followed by the classification.
+
+Usage: python -m benchmarks.capture CAPTURE [-n PACKETS]
+"""
+import argparse
+import itertools
+import time
+from scapy.utils import RawPcapReader, PcapReader
+import scapy.layers.all  # registers link layers dissected by PcapReader
+from core.packets import classify, read_capture
+
+
+def own_reader(path: str, packets: int) -> int:
+    count = 0
+
+    for timestamp, linktype, frame in itertools.islice(read_capture(path), packets):
+        classify(frame, linktype)
+        count += 1
+
+    return count
+
+
+def scapy_raw_reader(path: str, packets: int) -> int:
+    count = 0
+
+    with RawPcapReader(path) as reader:
+        for frame, metadata in itertools.islice(reader, packets):
+            classify(frame, getattr(metadata, "linktype", reader.linktype))
+            count += 1
+
+    return count
+
+
+def scapy_reader(path: str, packets: int) -> int:
+    count = 0
+
+    with PcapReader(path) as reader:
+        for packet in itertools.islice(reader, packets):
+            # the dissected packet is built anyway, classification needs the raw frame again
+            classify(bytes(packet), reader.linktype)
+            count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture reading benchmark")
+    parser.add_argument("capture", help="pcap/pcapng capture")
+    parser.add_argument("-n", dest="packets", type=int, default=100000, help="Packets read by each reader")
+    args = parser.parse_args()
+
+    results = {}
+
+    for name, reader in (("core.pcap", own_reader), ("scapy RawPcapReader", scapy_raw_reader),
+                         ("scapy PcapReader", scapy_reader)):
+        start = time.perf_counter()
+        count = reader(args.capture, args.packets)
+        elapsed = time.perf_counter() - start
+
+        results[name] = count / elapsed
+        print("%-20s %10d packets %10.0f packets/s  core.pcap speedup x%.1f" % (
+            name, count, results[name], results["core.pcap"] / results[name]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of the packet classification path with IPv4 only and mixed IPv4/IPv6 traffic
+
+Usage: python -m benchmarks.classify [-n PACKETS]
+"""
+import argparse
+import random
+import time
+from scapy.layers.l2 import Ether
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.inet6 import IPv6, IPv6ExtHdrHopByHop, IPv6ExtHdrDestOpt
+from core.packets import LINKTYPE_ETHERNET
+from core.traffic import Target
+
+
+def ipv4_frames():
+    return [
+        bytes(Ether() / IP(src="10.0.0.1", dst="192.168.1.9") / TCP(flags="S")),
+        bytes(Ether() / IP(src="192.168.1.9", dst="10.0.0.1") / TCP(flags="SA")),
+        bytes(Ether() / IP(src="10.0.0.1", dst="192.168.1.9") / TCP(flags="A")),
+        bytes(Ether() / IP(src="10.0.0.1", dst="192.168.1.9") / UDP()),
+    ]
+
+
+def ipv6_frames():
+    return [
+        bytes(Ether() / IPv6(src="2001:db8::1", dst="2001:db8::9") / TCP(flags="S")),
+        bytes(Ether() / IPv6(src="2001:db8::9", dst="2001:db8::1") / TCP(flags="SA")),
+        bytes(Ether() / IPv6(src="2001:db8::1", dst="2001:db8::9") / IPv6ExtHdrHopByHop() /
+              IPv6ExtHdrDestOpt() / TCP(flags="S")),
+        bytes(Ether() / IPv6(src="2001:db8::1", dst="2001:db8::9") / UDP()),
+    ]
+
+
+def run(frames, target):
+    """
+    :return: nanoseconds spent for each packet
+    """
+
+    count = target.count
+    start = time.perf_counter_ns()
+
+    for frame in frames:
+        count(frame, LINKTYPE_ETHERNET)
+
+    return (time.perf_counter_ns() - start) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet classification benchmark")
+    parser.add_argument("-n", dest="packets", type=int, default=1000000, help="Number of packets per run")
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    v4 = ipv4_frames()
+    v6 = ipv6_frames()
+
+    ipv4_traffic = [random.choice(v4) for _ in range(args.packets)]
+    mixed_traffic = [random.choice(v4 + v6) for _ in range(args.packets)]
+
+    for name, frames in (("ipv4", ipv4_traffic), ("mixed ipv4/ipv6", mixed_traffic)):
+        target = Target("bench", ["192.168.1.9", "2001:db8::9"])
+        ns = run(frames, target)
+        print("%-16s %8.1f ns/packet  %10.0f packets/s  syn: %d synack: %d" %
+              (name, ns, 1e9 / ns, target._syn_counter, target._synack_counter))
+
+
+if __name__ == "__main__":
+    main()
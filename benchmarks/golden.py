@@ -0,0 +1,245 @@
+"""
+Golden output regression harness: replays reference per interval SYN and SYN/ACK counts
+through every detector engine and checks that all of them give the same output in every interval,
+equal to the reference output saved in the golden file.
+
+Non parametric engines: SYNNPCusumDetector (scalar), NPCusumDetector with the smoothing stage
+precomputed by SmoothingCache.compute (vectorized) or read back from a cache directory (cached)
+and CompactNPCusumDetector (compact). Parametric engines: SYNCusumDetector (scalar) and CompactCusumDetector
+(compact).
+The background refit of the smoothing factor is also checked: on a drifting series it must fit
+a factor different from the initial guess.
+
+Usage: python -m benchmarks.golden [--golden FILE] [--update] [-n INTERVALS] [--seed SEED]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from core import utils
+from core.clock import PacketClock
+from core.detectors import SYNNPCusumDetector, SYNCusumDetector, NPCusumDetector
+from core.compact import CompactNPCusumDetector, NPCusumParameters, CompactCusumDetector, CusumParameters
+from core.smoothing import SmoothingCache, CachedNPSmoothingStage
+from core.forecasting import SingleExponentialSmoothing
+from core.refit import fit_smoothing_factor
+from benchmarks.synthetic import Flood, SHAPES
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.json")
+
+# detector variables compared in every interval
+FIELDS = ("mu", "sigma", "z", "test_statistic", "threshold", "under_attack", "time_start", "time_end")
+
+START_TIME = 1600000000
+TIME_INTERVAL = 5
+THRESHOLD = 5.0
+
+
+def reference_counts(shape: str, intervals: int, seed: int) -> dict:
+    """
+    Generates the SYN and SYN/ACK counts of every interval: legitimate connections (a few left unanswered)
+    and a flood of given shape in the middle third of the series
+
+    :return: dictionary of "syn" and "synack" lists
+    """
+
+    rng = random.Random("%s %d" % (shape, seed))
+    duration = intervals * TIME_INTERVAL
+    flood = Flood(duration / 3, duration / 3, 100, shape)
+    syn = []
+    synack = []
+
+    for n in range(intervals):
+        legitimate = max(int(round(rng.gauss(250, 15))), 0)
+        spoofed = sum(flood.rate_at(n * TIME_INTERVAL + second) for second in range(TIME_INTERVAL))
+
+        syn.append(legitimate + int(spoofed))
+        synack.append(max(legitimate - rng.randint(0, 5), 0))
+
+    return {"syn": syn, "synack": synack}
+
+
+def ratios(counts: dict) -> list:
+    """
+    SYN/ACK deficit ratio of every interval, as computed by SYNNPCusumDetector.analyze
+    """
+
+    return [max(float(syn - synack) / float(syn), 0) if syn != 0 else 0.0
+            for syn, synack in zip(counts["syn"], counts["synack"])]
+
+
+def replay(detector, clock: PacketClock, update, inputs: list) -> list:
+    """
+    Updates a detector with every input, the clock following the end of each interval
+
+    :param update: function updating the detector with an input
+    :return: the values of FIELDS after each interval
+    """
+
+    outputs = []
+
+    for n, value in enumerate(inputs):
+        clock.now = START_TIME + (n + 1) * TIME_INTERVAL
+        update(value)
+
+        state = detector.get_state()
+        outputs.append([state[field] for field in FIELDS])
+
+    return outputs
+
+
+def non_parametric_engines(counts: dict, cache_directory: str) -> dict:
+    values = ratios(counts)
+    pairs = list(zip(counts["syn"], counts["synack"]))
+    outputs = {}
+
+    clock = PacketClock()
+    detector = SYNNPCusumDetector(clock=clock)
+    outputs["scalar"] = replay(detector, clock, lambda pair: detector.analyze(*pair), pairs)
+
+    clock = PacketClock()
+    vectorized = NPCusumDetector(clock=clock, stage=CachedNPSmoothingStage(SmoothingCache.compute(values)))
+    outputs["vectorized"] = replay(vectorized, clock, vectorized.update, values)
+
+    # the second cache reads the series saved by the first one
+    SmoothingCache(cache_directory).get(values)
+    clock = PacketClock()
+    cached = NPCusumDetector(clock=clock, stage=CachedNPSmoothingStage(SmoothingCache(cache_directory).get(values)))
+    outputs["cached"] = replay(cached, clock, cached.update, values)
+
+    clock = PacketClock()
+    compact = CompactNPCusumDetector(NPCusumParameters(clock=clock))
+    outputs["compact"] = replay(compact, clock, compact.update, values)
+
+    return outputs
+
+
+def parametric_engines(counts: dict) -> dict:
+    outputs = {}
+
+    clock = PacketClock()
+    detector = SYNCusumDetector(threshold=THRESHOLD, clock=clock)
+    outputs["scalar"] = replay(detector, clock, detector.analyze, counts["syn"])
+
+    clock = PacketClock()
+    compact = CompactCusumDetector(CusumParameters(threshold=THRESHOLD, clock=clock))
+    outputs["compact"] = replay(compact, clock, compact.update, counts["syn"])
+
+    return outputs
+
+
+def refit_check(seed: int) -> bool:
+    """
+    Fits the smoothing factor on a drifting baseline (window means growing over the day, as seen by the refitter)
+
+    :return: True if the fit succeeded and moved away from the initial guess
+    """
+
+    rng = random.Random("refit %d" % seed)
+    values = [0.1 + 0.0005 * n + rng.gauss(0, 0.01) for n in range(720)]
+
+    factor, seconds = fit_smoothing_factor(values)
+    guess = SingleExponentialSmoothing.initial_guess(SingleExponentialSmoothing.BOUNDS)[0]
+    passed = factor is not None and abs(factor - guess) > 1e-6
+
+    print("%-28s %-12s %s (factor %s, initial guess %s, %.3f s)" % (
+        "refit/drift", "scalar", "ok" if passed else "FAILED", factor, guess, seconds))
+
+    return passed
+
+
+def first_difference(expected: list, actual: list):
+    """
+    Returns (interval, field, expected value, actual value) of the first difference, None if outputs are identical
+    """
+
+    if len(expected) != len(actual):
+        return min(len(expected), len(actual)), "intervals", len(expected), len(actual)
+
+    for n, (expected_row, actual_row) in enumerate(zip(expected, actual)):
+        for field, expected_value, actual_value in zip(FIELDS, expected_row, actual_row):
+            if expected_value != actual_value:
+                return n, field, expected_value, actual_value
+
+    return None
+
+
+def write_golden(path: str, intervals: int, seed: int, series: dict, outputs: dict):
+    """
+    Writes the golden file with one line per interval, so that differences are readable
+    """
+
+    with open(path, "w") as golden:
+        golden.write('{"intervals": %d, "seed": %d, "fields": %s,\n' % (intervals, seed, json.dumps(FIELDS)))
+        golden.write(' "series": %s,\n "outputs": {' % json.dumps(series))
+
+        for n, (name, rows) in enumerate(sorted(outputs.items())):
+            golden.write('%s\n  "%s": [\n' % ("," if n > 0 else "", name))
+            golden.write(",\n".join("   " + json.dumps(row) for row in rows))
+            golden.write("\n  ]")
+
+        golden.write("\n }\n}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detectors golden output regression harness")
+    parser.add_argument("--golden", default=GOLDEN, help="Golden file (default: benchmarks/golden.json)")
+    parser.add_argument("--update", action="store_true",
+                        help="Generate the reference series and write their scalar outputs to the golden file")
+    parser.add_argument("-n", dest="intervals", type=int, default=120, help="Intervals of each series (--update)")
+    parser.add_argument("--seed", type=int, default=0, help="Random generator seed of the series (--update)")
+    args = parser.parse_args()
+
+    utils.enabled = False
+
+    if args.update:
+        series = {shape: reference_counts(shape, args.intervals, args.seed) for shape in SHAPES}
+        golden = None
+    else:
+        with open(args.golden) as file:
+            golden = json.load(file)
+        series = golden["series"]
+
+    failures = 0
+    references = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for shape, counts in series.items():
+            engines = {
+                "non_parametric": non_parametric_engines(counts, os.path.join(directory, shape)),
+                "parametric": parametric_engines(counts)
+            }
+
+            for kind, outputs in engines.items():
+                name = kind + "/" + shape
+                reference = references[name] = outputs["scalar"]
+                expected = golden["outputs"][name] if golden is not None else reference
+                attacks = sum(row[FIELDS.index("under_attack")] for row in reference)
+
+                for engine, rows in outputs.items():
+                    difference = first_difference(expected, rows)
+
+                    if difference is None:
+                        print("%-28s %-12s ok (%d intervals, %d under attack)" % (name, engine, len(rows), attacks))
+                    else:
+                        failures += 1
+                        print("%-28s %-12s FAILED at interval %d: %s expected %r, got %r" % ((name, engine) +
+                                                                                          difference))
+
+    if not refit_check(args.seed if golden is None else golden["seed"]):
+        failures += 1
+
+    if args.update:
+        if failures > 0:
+            sys.exit("Engines disagree, golden file not written")
+
+        write_golden(args.golden, args.intervals, args.seed, series, references)
+        print("Golden file written to %s" % args.golden)
+
+    sys.exit(1 if failures > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
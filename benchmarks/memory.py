@@ -0,0 +1,114 @@
+"""
+Memory and update cost of many detectors, as in per address detection:
+bytes per detector and updates per second of the standard and compact (__slots__) detectors.
+
+Usage: python -m benchmarks.memory [-n DETECTORS] [-r ROUNDS] [--seed SEED]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from core import utils
+from core.detectors import NPCusumDetector, CusumDetector
+from core.compact import CompactNPCusumDetector, NPCusumParameters, CompactCusumDetector, CusumParameters
+
+
+def deep_size(objects: list) -> int:
+    """
+    Returns the memory used by given objects and by everything they reference,
+    objects shared among them (e.g. parameters) are counted once
+    """
+
+    seen = set()
+    pending = list(objects)
+    size = 0
+
+    while pending:
+        obj = pending.pop()
+
+        if id(obj) in seen or isinstance(obj, type) or callable(obj):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            pending.extend(obj)
+
+        if hasattr(obj, "__dict__"):
+            pending.append(obj.__dict__)
+
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name.startswith("__") and not name.endswith("__"):
+                    name = "_" + cls.__name__.lstrip("_") + name
+                if hasattr(obj, name):
+                    pending.append(getattr(obj, name))
+
+    return size
+
+
+def measure(factory, values: list, rounds: int) -> dict:
+    """
+    Creates len(values) detectors, brings them past the smoothing fit and updates all of them for some rounds
+
+    :param factory: function creating a detector
+    :param values: input values of each detector, one list per detector
+    :param rounds: update rounds measured
+    """
+
+    detectors = [factory() for _ in values]
+    created = deep_size(detectors)
+
+    # filling windows and fitting smoothing factors
+    warmup = len(values[0]) - rounds
+    for detector, series in zip(detectors, values):
+        for value in series[:warmup]:
+            detector.update(value)
+    fitted = deep_size(detectors)
+
+    started = time.perf_counter()
+    for n in range(warmup, warmup + rounds):
+        for detector, series in zip(detectors, values):
+            detector.update(series[n])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "detectors": len(detectors),
+        "bytes_per_detector_created": created / len(detectors),
+        "bytes_per_detector": fitted / len(detectors),
+        "updates_per_second": len(detectors) * rounds / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DoSTect detectors memory benchmark")
+    parser.add_argument("-n", dest="detectors", type=int, default=10000, help="Number of detectors")
+    parser.add_argument("-r", dest="rounds", type=int, default=20, help="Measured update rounds")
+    parser.add_argument("--seed", type=int, default=0, help="Random generator seed")
+    args = parser.parse_args()
+
+    utils.enabled = False
+
+    rng = random.Random(args.seed)
+    warmup = 5
+    ratios = [[max(rng.gauss(0.05, 0.02), 0) for _ in range(warmup + args.rounds)] for _ in range(args.detectors)]
+    counts = [[max(rng.gauss(250, 15), 0) for _ in range(warmup + args.rounds)] for _ in range(args.detectors)]
+
+    np_parameters = NPCusumParameters()
+    parameters = CusumParameters(threshold=5.0)
+
+    results = {
+        "NPCusumDetector": measure(NPCusumDetector, ratios, args.rounds),
+        "CompactNPCusumDetector": measure(lambda: CompactNPCusumDetector(np_parameters), ratios, args.rounds),
+        "CusumDetector": measure(lambda: CusumDetector(threshold=5.0), counts, args.rounds),
+        "CompactCusumDetector": measure(lambda: CompactCusumDetector(parameters), counts, args.rounds)
+    }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
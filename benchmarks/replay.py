@@ -0,0 +1,208 @@
+"""
+Replays a capture into the live pipeline transmitting its frames on a network interface
+(e.g. loopback or one end of a veth pair) while a LiveCatcher monitors the interface.
+On loopback every frame is seen twice, as sent and as received: the catcher drops the outgoing copies.
+
+Replay speed can be the original one (--speed 1), N times faster (--speed N) or as fast as possible (--speed 0).
+With --max-rate frames are sent at increasing fixed rates to find the maximum packet rate
+sustained by the live pipeline before the kernel starts dropping packets.
+
+Usage: python -m benchmarks.replay CAPTURE -i INTERFACE [--speed N] [--max-rate] [-a ADDRESS]
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from core import utils
+from core.packets import LINKTYPE_ETHERNET, read_capture, pack_address
+from core.profiling import Profiler
+from core.traffic import LiveCatcher
+
+
+class Replayer:
+    """
+    Transmits captured frames on an interface through a raw packet socket
+    """
+
+    def __init__(self, path: str, interface: str):
+        # ethernet frames only can be transmitted as they are
+        self.__frames = [(timestamp, frame) for timestamp, linktype, frame in read_capture(path)
+                         if linktype == LINKTYPE_ETHERNET]
+
+        self.__socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        self.__socket.bind((interface, 0))
+
+    def __len__(self):
+        return len(self.__frames)
+
+    def replay(self, speed: float = 1) -> dict:
+        """
+        Sends all frames keeping their relative timing scaled by speed
+
+        :param speed: speed multiplier, 0 to send as fast as possible
+        :return: sent frames count, elapsed seconds and achieved rate
+        """
+
+        send = self.__socket.send
+        sent = 0
+        start = time.perf_counter()
+
+        if len(self.__frames) > 0:
+            first = self.__frames[0][0]
+
+            for timestamp, frame in self.__frames:
+                if speed > 0:
+                    delay = (timestamp - first) / speed - (time.perf_counter() - start)
+                    if delay > 0.001:
+                        time.sleep(delay)
+
+                try:
+                    send(frame)
+                    sent += 1
+                except OSError:
+                    # transmission queue full
+                    pass
+
+        elapsed = time.perf_counter() - start
+
+        return {"sent": sent, "seconds": elapsed, "packets_per_second": sent / elapsed if elapsed > 0 else 0}
+
+    def send_at_rate(self, rate: float, duration: float) -> dict:
+        """
+        Sends frames cyclically at a fixed rate ignoring their timestamps
+
+        :param rate: packets per second
+        :param duration: seconds of transmission
+        :return: sent frames count, elapsed seconds and achieved rate
+        """
+
+        send = self.__socket.send
+        frames = [frame for _, frame in self.__frames]
+        sent = 0
+        start = time.perf_counter()
+
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                break
+
+            # sending the packets due until now in a burst
+            due = int(elapsed * rate) - sent
+            for _ in range(min(due, 1000)):
+                try:
+                    send(frames[sent % len(frames)])
+                    sent += 1
+                except OSError:
+                    break
+
+            if due <= 0:
+                time.sleep(0.0005)
+
+        elapsed = time.perf_counter() - start
+
+        return {"sent": sent, "seconds": elapsed, "packets_per_second": sent / elapsed}
+
+    def close(self):
+        self.__socket.close()
+
+
+def capture_counters(profiler: Profiler, interface: str):
+    gauges = profiler.gauges()
+
+    return (
+        profiler.stage("count").count,
+        gauges['capture_received{interface="%s"}' % interface],
+        gauges['capture_dropped{interface="%s"}' % interface]
+    )
+
+
+def max_rate(replayer: Replayer, profiler: Profiler, interface: str, start_rate: float, step_duration: float,
+             tolerance: float) -> dict:
+    """
+    Doubles the sending rate until the pipeline drops more than tolerance packets or the sender saturates
+
+    :return: the steps results and the maximum sustained rate
+    """
+
+    steps = []
+    sustained = 0
+    rate = start_rate
+
+    while True:
+        processed, received, dropped = capture_counters(profiler, interface)
+        result = replayer.send_at_rate(rate, step_duration)
+
+        # letting the pipeline drain its queue
+        time.sleep(0.5)
+        processed_after, received_after, dropped_after = capture_counters(profiler, interface)
+
+        result["rate"] = rate
+        result["processed"] = processed_after - processed
+        result["dropped"] = dropped_after - dropped
+        result["drop_ratio"] = result["dropped"] / max(received_after - received, 1)
+        steps.append(result)
+
+        if result["drop_ratio"] > tolerance:
+            break
+
+        sustained = result["processed"] / result["seconds"]
+
+        if result["packets_per_second"] < rate * 0.9:
+            # the sender can't go faster
+            break
+
+        rate *= 2
+
+    return {"steps": steps, "max_sustained_packets_per_second": sustained}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture replay into the live pipeline")
+    parser.add_argument("capture", help="Capture to replay")
+    parser.add_argument("-i", dest="interface", default="lo", help="Interface where frames are transmitted")
+    parser.add_argument("-a", dest="address", action="append", default=[],
+                        help="Monitored address in the capture, added to the interface addresses")
+    parser.add_argument("-s", dest="interval", type=int, default=5, help="Time interval in seconds")
+    parser.add_argument("--speed", type=float, default=1, help="Speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--max-rate", dest="max_rate", action="store_true",
+                        help="Search the maximum packet rate sustained without drops")
+    parser.add_argument("--start-rate", dest="start_rate", type=float, default=1000, help="First --max-rate step rate")
+    parser.add_argument("--step", type=float, default=3, help="Duration of each --max-rate step in seconds")
+    parser.add_argument("--tolerance", type=float, default=0.001, help="Tolerated drop ratio")
+    args = parser.parse_args()
+
+    utils.enabled = False
+
+    profiler = Profiler()
+    catcher = LiveCatcher([args.interface], time_interval=args.interval, profiler=profiler)
+
+    for address in args.address:
+        catcher.get_targets()[0].addresses.add(pack_address(address))
+
+    threading.Thread(target=catcher.start, daemon=True).start()
+
+    replayer = Replayer(args.capture, args.interface)
+
+    # waiting the capture socket
+    time.sleep(0.5)
+
+    if args.max_rate:
+        results = max_rate(replayer, profiler, args.interface, args.start_rate, args.step, args.tolerance)
+    else:
+        results = replayer.replay(args.speed)
+        time.sleep(0.5)
+
+        processed, received, dropped = capture_counters(profiler, args.interface)
+        results.update(processed=processed, received=received, dropped=dropped,
+                       intervals=catcher.get_total_intervals(),
+                       anomalous_intervals=catcher.get_anomalous_intervals_count())
+
+    replayer.close()
+    profiler.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark suite: offline analysis throughput, detectors cost, smoothing fitting cost
+and end-to-end detection delay on synthetic captures.
+Results are written as JSON so that runs of different versions can be compared.
+
+Usage: python -m benchmarks.run [-o RESULTS.json] [--compare BASELINE.json] [--capture PCAP]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from core import utils
+from core.detectors import NPCusumDetector, CusumDetector
+from core.forecasting import SingleExponentialSmoothing, DoubleExponentialSmoothing
+from core.packets import read_capture
+from core.traffic import OfflineCatcher, Target
+from benchmarks.synthetic import Flood, SERVER, generate
+
+
+def offline_throughput(path: str, packets: int, parametric: bool, time_interval: int = 5) -> dict:
+    catcher = OfflineCatcher(path, SERVER, parametric=parametric, time_interval=time_interval, threshold=5.0)
+
+    start = time.perf_counter()
+    catcher.start()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "packets_per_second": packets / elapsed,
+        "intervals": catcher.get_total_intervals(),
+        "anomalous_intervals": catcher.get_anomalous_intervals_count()
+    }
+
+
+def detector_update(detector, values: list) -> dict:
+    """
+    Measures the cost of each detector update, skipping the first window used to fit smoothing factors
+    """
+
+    for value in values[:10]:
+        detector.update(value)
+
+    start = time.perf_counter_ns()
+    for value in values[10:]:
+        detector.update(value)
+    elapsed = time.perf_counter_ns() - start
+
+    return {"updates": len(values) - 10, "ns_per_update": elapsed / (len(values) - 10)}
+
+
+def smoothing_initialize(smoothing_class, windows: list) -> dict:
+    start = time.perf_counter_ns()
+    for window in windows:
+        smoothing_class().initialize(window)
+    elapsed = time.perf_counter_ns() - start
+
+    return {"fits": len(windows), "ms_per_fit": elapsed / len(windows) / 1e6}
+
+
+def detection_delay(path: str, flood: Flood, start_time: float, time_interval: int, parametric: bool) -> dict:
+    """
+    Replays the capture through a target closing intervals on packet time and measures
+    the time between flood start and the end of the first interval reported under attack
+    """
+
+    target = Target(SERVER, [SERVER], parametric=parametric, threshold=5.0)
+    interval_end = None
+    detected = None
+    ended = None
+
+    for timestamp, linktype, frame in read_capture(path):
+        if interval_end is None:
+            interval_end = timestamp + time_interval
+
+        while timestamp >= interval_end:
+            target._counter_reader()
+
+            if detected is None and target._syn_cusum.under_attack():
+                detected = interval_end
+            elif detected is not None and ended is None and not target._syn_cusum.under_attack():
+                ended = interval_end
+
+            interval_end += time_interval
+
+        target.count(frame, linktype)
+
+    flood_start = start_time + flood.start
+    flood_end = flood_start + flood.duration
+
+    return {
+        "detected": detected is not None,
+        "delay_seconds": detected - flood_start if detected is not None else None,
+        "end_delay_seconds": ended - flood_end if ended is not None else None
+    }
+
+
+def version() -> str:
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, prefix: str = ""):
+    """
+    Prints relative changes of numeric results in relation to a baseline
+    """
+
+    for key, value in results.items():
+        name = prefix + key
+        old = baseline.get(key)
+
+        if isinstance(value, dict) and isinstance(old, dict):
+            compare(value, old, name + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                isinstance(old, (int, float)) and old != 0:
+            print("%-60s %14.4g %14.4g %+8.1f%%" % (name, old, value, (value - old) / old * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DoSTect benchmark suite")
+    parser.add_argument("-o", dest="output", help="JSON results file (default: stdout)")
+    parser.add_argument("--compare", dest="baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--capture", help="Use the given synthetic capture instead of generating it")
+    parser.add_argument("-d", dest="duration", type=float, default=600, help="Synthetic capture duration in seconds")
+    parser.add_argument("-b", dest="baseline_rate", type=float, default=50, help="Legitimate connections per second")
+    parser.add_argument("--flood", nargs=4, default=["300", "120", "1000", "constant"],
+                        metavar=("START", "DURATION", "RATE", "SHAPE"), help="Flood segment")
+    parser.add_argument("-s", dest="interval", type=int, default=5, help="Time interval in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random generator seed")
+    args = parser.parse_args()
+
+    utils.enabled = False
+
+    flood = Flood(float(args.flood[0]), float(args.flood[1]), float(args.flood[2]), args.flood[3])
+    start_time = 1600000000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.capture
+        if path is None:
+            path = os.path.join(directory, "synthetic.pcap")
+            generate(path, args.duration, args.baseline_rate, [flood], seed=args.seed, start_time=start_time)
+
+        packets = sum(1 for _ in read_capture(path))
+
+        rng = random.Random(args.seed)
+        ratios = [max(rng.gauss(0.05, 0.02), 0) for _ in range(5000)]
+        counts = [max(rng.gauss(250, 15), 0) for _ in range(5000)]
+        windows = [[rng.gauss(250, 15) for _ in range(3)] for _ in range(50)]
+
+        results = {
+            "meta": {
+                "version": version(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.time(),
+                "packets": packets,
+                "flood": flood.to_dict(),
+                "baseline_rate": args.baseline_rate,
+                "interval": args.interval,
+                "seed": args.seed
+            },
+            "offline_throughput": {
+                "non_parametric": offline_throughput(path, packets, False, args.interval),
+                "parametric": offline_throughput(path, packets, True, args.interval)
+            },
+            "detector_update": {
+                "NPCusumDetector": detector_update(NPCusumDetector(), ratios),
+                "CusumDetector": detector_update(CusumDetector(threshold=5.0), counts)
+            },
+            "smoothing_initialize": {
+                "SingleExponentialSmoothing": smoothing_initialize(SingleExponentialSmoothing, windows),
+                "DoubleExponentialSmoothing": smoothing_initialize(DoubleExponentialSmoothing, windows)
+            },
+            "detection_delay": {
+                "non_parametric": detection_delay(path, flood, start_time, args.interval, False),
+                "parametric": detection_delay(path, flood, start_time, args.interval, True)
+            }
+        }
+
+    output = json.dumps(results, indent=2)
+
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        print("%-60s %14s %14s %9s" % ("metric", "baseline", "current", "change"), file=sys.stderr)
+        compare({k: v for k, v in results.items() if k != "meta"}, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Replays the per interval values of a capture through the non parametric CUSUM
+with different alarm delays. The capture is read once and the smoothing stage
+(window means and smoothing fit) is computed once: only the alarm state machine
+runs for each combination of parameters.
+
+Usage: python -m benchmarks.sweep CAPTURE -a ADDRESS [-s INTERVAL] [--start-delay N...] [--stop-delay N...]
+                                  [--cache DIRECTORY]
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import time
+import numpy as np
+from core import utils
+from core.detectors import NPCusumDetector
+from core.packets import SYN, ACK, classify, pack_address, read_capture
+from core.smoothing import SmoothingCache, CachedNPSmoothingStage
+
+
+def read_ratios(path: str, address: str, time_interval: float) -> np.ndarray:
+    """
+    Computes the SYN/ACK deficit ratio of every interval of a capture, the input of SYNNPCusumDetector
+
+    :param path: capture path
+    :param address: attacked address
+    :param time_interval: interval duration in seconds
+    :return: ratio of each interval
+    """
+
+    address = pack_address(address)
+    ratios = []
+    syn = synack = 0
+    interval_end = None
+
+    for timestamp, linktype, frame in read_capture(path):
+        if interval_end is None:
+            interval_end = timestamp + time_interval
+
+        while timestamp >= interval_end:
+            ratios.append(max(float(syn - synack) / syn, 0) if syn != 0 else 0.0)
+            syn = synack = 0
+            interval_end += time_interval
+
+        fields = classify(frame, linktype)
+        if fields is None:
+            continue
+
+        protocol, flags, src, dst, transport = fields
+        if flags & SYN:
+            if flags & ACK:
+                synack += src == address
+            else:
+                syn += dst == address
+
+    return np.array(ratios)
+
+
+def cached_ratios(path: str, address: str, time_interval: float, directory: str = None) -> np.ndarray:
+    """
+    Reads the ratios of a capture from the cache directory if the capture didn't change
+    """
+
+    if directory is None:
+        return read_ratios(path, address, time_interval)
+
+    stat = os.stat(path)
+    key = hashlib.sha1(("%s %d %d %s %r" % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns,
+                                            address, time_interval)).encode()).hexdigest()
+    cache_path = os.path.join(directory, "ratios-" + key + ".npy")
+
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+
+    ratios = read_ratios(path, address, time_interval)
+    os.makedirs(directory, exist_ok=True)
+    np.save(cache_path, ratios)
+
+    return ratios
+
+
+def run(series: dict, values: list, start_alarm_delay: int, stop_alarm_delay: int) -> dict:
+    detector = NPCusumDetector(start_alarm_delay=start_alarm_delay, stop_alarm_delay=stop_alarm_delay,
+                               stage=CachedNPSmoothingStage(series))
+    attacks = []
+    anomalous = 0
+
+    for n, value in enumerate(values):
+        detector.update(value)
+
+        if detector.under_attack():
+            anomalous += 1
+            if len(attacks) == 0 or attacks[-1][1] is not None:
+                attacks.append([n, None])
+        elif len(attacks) > 0 and attacks[-1][1] is None:
+            attacks[-1][1] = n
+
+    return {"anomalous_intervals": anomalous, "attacks": attacks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Non parametric CUSUM alarm delays sweep over a capture")
+    parser.add_argument("capture", help="pcap/pcapng capture")
+    parser.add_argument("-a", dest="address", required=True, help="Attacked address")
+    parser.add_argument("-s", dest="interval", type=float, default=5, help="Time interval in seconds")
+    parser.add_argument("--start-delay", type=int, nargs="+", default=[2, 3, 4, 5], help="Start alarm delays")
+    parser.add_argument("--stop-delay", type=int, nargs="+", default=[2, 3, 4, 5], help="Stop alarm delays")
+    parser.add_argument("--cache", dest="directory", help="Directory where intervals values are cached")
+    args = parser.parse_args()
+
+    utils.enabled = False
+
+    start = time.perf_counter()
+    ratios = cached_ratios(args.capture, args.address, args.interval, args.directory)
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    series = SmoothingCache(args.directory).get(ratios)
+    values = ratios.tolist()
+    smoothing_seconds = time.perf_counter() - start
+
+    print("intervals: %d  capture read: %.3fs  smoothing stage: %.3fs" % (len(values), read_seconds,
+                                                                            smoothing_seconds))
+    print("%-6s %-6s %-10s %-10s %s" % ("start", "stop", "anomalous", "seconds", "attacks (intervals)"))
+
+    for start_alarm_delay, stop_alarm_delay in itertools.product(args.start_delay, args.stop_delay):
+        start = time.perf_counter()
+        result = run(series, values, start_alarm_delay, stop_alarm_delay)
+        elapsed = time.perf_counter() - start
+
+        print("%-6d %-6d %-10d %-10.4f %s" % (start_alarm_delay, stop_alarm_delay, result["anomalous_intervals"],
+                                              elapsed, " ".join("%s-%s" % tuple(attack)
+                                                                for attack in result["attacks"])))
+
+
+if __name__ == "__main__":
+    main()
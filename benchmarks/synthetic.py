@@ -0,0 +1,176 @@
+"""
+Synthetic SYN flood captures generation.
+
+Baseline traffic is made of connections whose arrivals follow a Poisson process:
+each connection is a SYN from a client, a SYN/ACK from the server and the client ACK.
+Flood segments add SYN packets from random spoofed sources with a configurable rate and shape.
+
+Usage: python -m benchmarks.synthetic OUTPUT [-d DURATION] [-b RATE] [--flood START DURATION RATE SHAPE]
+"""
+import argparse
+import math
+import random
+import socket
+import struct
+
+SERVER = "192.168.1.9"
+
+SHAPES = ("constant", "ramp", "pulse")
+
+PCAP_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+RECORD_HEADER = struct.Struct("<IIII")
+ETHERNET = bytes.fromhex("000000000002" "000000000001" "0800")
+IPV4_HEADER = struct.Struct("!BBHHHBBH4s4s")
+TCP_HEADER = struct.Struct("!HHIIBBHHH")
+
+
+class Flood:
+    """
+    A flood segment: SYNs from spoofed sources sent with given peak rate and shape
+    """
+
+    def __init__(self, start: float, duration: float, rate: float, shape: str = "constant"):
+        if shape not in SHAPES:
+            raise ValueError("Unknown flood shape %s" % shape)
+
+        self.start = start
+        self.duration = duration
+        self.rate = rate
+        self.shape = shape
+
+    def rate_at(self, t: float) -> float:
+        """
+        Returns the flood rate (packets per second) at time t
+        """
+
+        if not self.start <= t < self.start + self.duration:
+            return 0
+
+        if self.shape == "ramp":
+            return self.rate * (t - self.start) / self.duration
+
+        if self.shape == "pulse":
+            # one second on, one second off
+            return self.rate if int(t - self.start) % 2 == 0 else 0
+
+        return self.rate
+
+    def to_dict(self) -> dict:
+        return {"start": self.start, "duration": self.duration, "rate": self.rate, "shape": self.shape}
+
+
+def checksum(header: bytes) -> int:
+    s = sum(struct.unpack("!10H", header))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+
+    return ~s & 0xFFFF
+
+
+def frame(src: bytes, dst: bytes, sport: int, dport: int, flags: int) -> bytes:
+    header = IPV4_HEADER.pack(0x45, 0, 40, 0, 0x4000, 64, 6, 0, src, dst)
+    header = header[:10] + struct.pack("!H", checksum(header)) + header[12:]
+
+    return ETHERNET + header + TCP_HEADER.pack(sport, dport, 0, 0, 0x50, flags, 65535, 0, 0)
+
+
+def generate(path: str, duration: float = 300, baseline_rate: float = 50, floods=(), rtt: float = 0.005,
+             flood_synack_ratio: float = 0.0, seed: int = 0, start_time: float = 1600000000):
+    """
+    Writes a synthetic capture
+
+    :param path: output pcap path
+    :param duration: capture duration in seconds
+    :param baseline_rate: mean number of legitimate connections per second
+    :param floods: Flood segments
+    :param rtt: round trip time between clients and server
+    :param flood_synack_ratio: fraction of flood SYNs answered by the server with a SYN/ACK
+    :param seed: random generator seed
+    :param start_time: timestamp of capture start
+    :return: number of packets written
+    """
+
+    rng = random.Random(seed)
+    server = socket.inet_aton(SERVER)
+    packets = 0
+
+    # events carried over to next second: (time, frame)
+    carry = []
+
+    with open(path, "wb") as output:
+        output.write(PCAP_HEADER)
+
+        for second in range(int(math.ceil(duration))):
+            events = []
+
+            # legitimate connections
+            t = second + rng.expovariate(baseline_rate)
+            while t < second + 1:
+                client = struct.pack("!I", 0x0A000000 | rng.getrandbits(16))
+                port = rng.randint(1024, 65535)
+
+                events.append((t, frame(client, server, port, 80, 0x02)))
+                carry.append((t + rtt, frame(server, client, 80, port, 0x12)))
+                carry.append((t + rtt * 2, frame(client, server, port, 80, 0x10)))
+
+                t += rng.expovariate(baseline_rate)
+
+            # flood segments
+            for flood in floods:
+                t = second
+                while t < second + 1:
+                    rate = flood.rate_at(t)
+
+                    if rate <= 0:
+                        t += 0.01
+                        continue
+
+                    client = struct.pack("!I", rng.getrandbits(32))
+                    port = rng.randint(1024, 65535)
+
+                    events.append((t, frame(client, server, port, 80, 0x02)))
+
+                    if rng.random() < flood_synack_ratio:
+                        carry.append((t + rtt, frame(server, client, 80, port, 0x12)))
+
+                    t += rng.expovariate(rate)
+
+            # replies due in this second, including the ones to connections opened in it
+            events.extend(event for event in carry if event[0] < second + 1)
+            carry = [event for event in carry if event[0] >= second + 1]
+
+            events.sort(key=lambda event: event[0])
+
+            for t, data in events:
+                if t >= duration:
+                    continue
+
+                timestamp = start_time + t
+                output.write(RECORD_HEADER.pack(int(timestamp), int((timestamp % 1) * 1000000), len(data), len(data)))
+                output.write(data)
+                packets += 1
+
+    return packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic SYN flood capture generator")
+    parser.add_argument("output", help="Output pcap file")
+    parser.add_argument("-d", dest="duration", type=float, default=300, help="Capture duration in seconds")
+    parser.add_argument("-b", dest="baseline_rate", type=float, default=50, help="Legitimate connections per second")
+    parser.add_argument("--flood", nargs=4, action="append", default=[], metavar=("START", "DURATION", "RATE", "SHAPE"),
+                        help="Flood segment (shape: %s)" % ", ".join(SHAPES))
+    parser.add_argument("--synack-ratio", dest="synack_ratio", type=float, default=0.0,
+                        help="Fraction of flood SYNs answered by the server")
+    parser.add_argument("--seed", type=int, default=0, help="Random generator seed")
+    args = parser.parse_args()
+
+    floods = [Flood(float(start), float(duration), float(rate), shape) for start, duration, rate, shape in args.flood]
+
+    packets = generate(args.output, args.duration, args.baseline_rate, floods,
+                       flood_synack_ratio=args.synack_ratio, seed=args.seed)
+    print("%d packets written to %s" % (packets, args.output))
+
+
+if __name__ == "__main__":
+    main()
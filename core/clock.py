@@ -0,0 +1,51 @@
+import time
+
+
+class Clock:
+    """
+    Source of the time used to schedule intervals and to stamp detected events
+    """
+
+    def time(self) -> float:
+        """
+        Returns current time in seconds since the epoch
+        """
+
+        pass
+
+
+class LiveClock(Clock):
+    """
+    Monotonic clock expressed as seconds since the epoch:
+    wall clock adjustments don't affect intervals duration
+    """
+
+    def __init__(self):
+        self.__offset = time.time() - time.monotonic()
+
+    def time(self) -> float:
+        return time.monotonic() + self.__offset
+
+
+class PacketClock(Clock):
+    """
+    Clock following the timestamps of the packets read from a capture,
+    reading it doesn't require any system call
+    """
+
+    def __init__(self, now: float = 0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def set(self, now: float):
+        """
+        Moves the clock to given time (e.g. the timestamp of last packet read)
+        """
+
+        self.now = now
+
+
+# clock used when none is given
+default_clock = LiveClock()
@@ -0,0 +1,308 @@
+import math
+from .forecasting import SingleExponentialSmoothing
+from .clock import default_clock
+
+
+class CusumParameters:
+    """
+    Constants of the parametric CUSUM shared by many CompactCusumDetector instances
+    """
+
+    __slots__ = ("threshold", "sigma", "alpha", "window_size", "clock")
+
+    def __init__(self, threshold, sigma=100000, alpha=0.5, window_size=3, clock=None):
+        self.threshold = threshold
+        self.sigma = sigma
+        self.alpha = alpha
+        self.window_size = window_size
+        self.clock = clock if clock is not None else default_clock
+
+
+class CompactCusumDetector:
+    """
+    Parametric CUSUM with the same results of CusumDetector, for deployments with many detectors
+    (e.g. one per address): attributes are kept in __slots__, constants in shared CusumParameters,
+    exponential smoothing is inlined and nothing is shown on the dashboard
+    """
+
+    __slots__ = ("parameters", "_window", "_started", "_mu", "_smoothing_factor", "_z", "_test_statistic",
+                 "_under_attack", "_time_start", "_time_end")
+
+    def __init__(self, parameters: CusumParameters):
+        self.parameters = parameters
+
+        # last parameters.window_size values
+        self._window = []
+        self._started = False
+
+        # exponentially weighted moving average and its smoothing factor
+        self._mu = 0
+        self._smoothing_factor = 0
+
+        self._z = 0
+        self._test_statistic = 0
+        self._under_attack = False
+        self._time_start = 0
+        self._time_end = 0
+
+    def update(self, value: float):
+        parameters = self.parameters
+        window = self._window
+
+        if len(window) < parameters.window_size:
+            # filling window
+            window.append(value)
+
+        else:
+            if not self._started:
+                # first time that the window is full: fitting the smoothing factor
+                window.append(value)
+                del window[0]
+
+                smoothing = SingleExponentialSmoothing(row=None)
+                smoothing.initialize(window)
+                self._mu = smoothing.get_smoothed_value()
+                self._smoothing_factor = smoothing.get_smoothing_factor()
+
+                self._started = True
+
+            window.append(value)
+            del window[0]
+
+            window_mean = sum(window) / parameters.window_size
+            last_mu = self._mu
+            self._mu = self._smoothing_factor * last_mu + (1 - self._smoothing_factor) * window_mean
+
+            alpha_times_mu = parameters.alpha * last_mu
+            self._z = (alpha_times_mu / parameters.sigma) * (value - last_mu - alpha_times_mu / 2)
+
+        self._test_statistic = max(self._test_statistic + self._z, 0)
+
+        if not self._under_attack:
+            if self._test_statistic > parameters.threshold:
+                self._test_statistic = 0
+                self._time_start = parameters.clock.time()
+                self._under_attack = True
+
+        elif self._test_statistic <= parameters.threshold:
+            self._time_end = parameters.clock.time()
+            self._test_statistic = 0
+            self._under_attack = False
+
+        return self._test_statistic
+
+    def under_attack(self):
+        return self._under_attack
+
+    def get_time_start(self):
+        return self._time_start
+
+    def get_time_end(self):
+        return self._time_end
+
+    def get_state(self) -> dict:
+        return {
+            "mu": float(self._mu),
+            "sigma": float(self.parameters.sigma),
+            "z": float(self._z),
+            "test_statistic": float(self._test_statistic),
+            "threshold": float(self.parameters.threshold),
+            "under_attack": self._under_attack,
+            "time_start": self._time_start,
+            "time_end": self._time_end
+        }
+
+
+class NPCusumParameters:
+    """
+    Constants of the non parametric CUSUM shared by many CompactNPCusumDetector instances
+    """
+
+    __slots__ = ("start_alarm_delay", "stop_alarm_delay", "window_size", "outlier_threshold", "clock")
+
+    def __init__(self, start_alarm_delay=4, stop_alarm_delay=4, window_size=3, outlier_threshold=0.65, clock=None):
+        self.start_alarm_delay = start_alarm_delay
+        self.stop_alarm_delay = stop_alarm_delay
+        self.window_size = window_size
+        self.outlier_threshold = outlier_threshold
+        self.clock = clock if clock is not None else default_clock
+
+
+class CompactNPCusumDetector:
+    """
+    Non parametric CUSUM with the same results of NPCusumDetector, for deployments with many detectors
+    (e.g. one per address): attributes are kept in __slots__, constants in shared NPCusumParameters,
+    the smoothing stage is inlined and nothing is shown on the dashboard
+    """
+
+    __slots__ = ("parameters", "_window", "_started", "_mu", "_smoothing_factor", "_sigma", "_z",
+                 "_test_statistic", "_detection_threshold", "_under_attack", "_time_start", "_time_end",
+                 "_outlier_cum", "_alarm_dur", "_attack_ending_cum", "_abrupt_decrease_cum", "_delta")
+
+    def __init__(self, parameters: NPCusumParameters):
+        self.parameters = parameters
+
+        # last parameters.window_size values that are not outliers
+        self._window = []
+        self._started = False
+
+        # moving averages of the window means and of their deviation
+        self._mu = 0
+        self._smoothing_factor = 0
+        self._sigma = 0
+
+        self._z = 0
+        self._test_statistic = 0
+        self._detection_threshold = 0
+        self._under_attack = False
+        self._time_start = 0
+        self._time_end = 0
+
+        # alarm state machine counters
+        self._outlier_cum = 0
+        self._alarm_dur = 0
+        self._attack_ending_cum = 0
+        self._abrupt_decrease_cum = 0
+        self._delta = -1
+
+    def __attack_started(self):
+        self._time_start = self.parameters.clock.time()
+        self._under_attack = True
+        self._alarm_dur += 1
+
+    def __attack_ended(self):
+        self._time_end = self.parameters.clock.time()
+        self._under_attack = False
+        self._test_statistic = 0
+        self._detection_threshold = 0
+
+    def update(self, value: float):
+        parameters = self.parameters
+
+        if value > parameters.outlier_threshold:
+            # outliers don't enter the window
+            if not self._under_attack:
+                self._outlier_cum += 1
+
+                if self._outlier_cum == parameters.start_alarm_delay:
+                    self._outlier_cum -= 1
+                    self.__attack_started()
+            else:
+                self._alarm_dur += 1
+
+            return self._test_statistic
+
+        if self._outlier_cum > 0:
+            self._outlier_cum -= 1
+
+        window = self._window
+        window_size = parameters.window_size
+
+        if len(window) < window_size:
+            # filling window
+            window.append(value)
+            return self._test_statistic
+
+        window.append(value)
+        del window[0]
+
+        if not self._started:
+            # first time that the window is full: fitting the smoothing factor
+            smoothing = SingleExponentialSmoothing(row=None)
+            smoothing.initialize(window)
+            self._mu = smoothing.get_smoothed_value()
+            self._smoothing_factor = smoothing.get_smoothing_factor()
+
+            square_sum = 0
+            for val in window:
+                square_sum += (val - self._mu) ** 2
+            self._sigma = math.sqrt(square_sum / window_size)
+
+            self._started = True
+        else:
+            self._z = sum(window) / window_size - self._mu - 3 * self._sigma
+
+        if not self._under_attack:
+            self._test_statistic = max(self._test_statistic + self._z, 0)
+
+            if self._z > 0:
+                # adjusting detection threshold
+                if self._detection_threshold == 0:
+                    self._detection_threshold = self._z * parameters.start_alarm_delay
+                else:
+                    self._detection_threshold = self._detection_threshold / 2 + \
+                                                self._z * parameters.start_alarm_delay / 2
+
+                if self._test_statistic >= self._detection_threshold:
+                    self.__attack_started()
+            else:
+                # updating mu and sigma with the window mean
+                window_mean = sum(window) / window_size
+                last_mu = self._mu
+                factor = self._smoothing_factor
+
+                self._mu = factor * last_mu + (1 - factor) * window_mean
+                self._sigma = math.sqrt(factor * self._sigma ** 2 + (1 - factor) * (window_mean - last_mu) ** 2)
+
+        elif self._alarm_dur < 6:
+            self.__check_ending_with_z()
+            self._alarm_dur += 1
+        else:
+            self.__check_abrupt_decrease()
+            self._alarm_dur += 1
+
+        return self._test_statistic
+
+    def __check_ending_with_z(self):
+        if self._z <= 0:
+            self._attack_ending_cum += 1
+
+            if self._attack_ending_cum == self.parameters.stop_alarm_delay:
+                self.__attack_ended()
+                self._attack_ending_cum = 0
+
+                if self._alarm_dur < 6:
+                    self._alarm_dur = 0
+
+    def __check_abrupt_decrease(self):
+        last_val = self._window[-1]
+
+        if self._attack_ending_cum > 0:
+            self._attack_ending_cum -= 1
+
+        if self._delta == -1:
+            self._delta = last_val
+        elif self._delta - last_val >= (self._delta - self._mu) / 2:
+            # got abrupt decrease
+            self._abrupt_decrease_cum += 1
+
+            if self._abrupt_decrease_cum == self.parameters.stop_alarm_delay:
+                self.__attack_ended()
+                self._abrupt_decrease_cum = 0
+                self._delta = -1
+        else:
+            self._delta = self._smoothing_factor * self._delta + (1 - self._smoothing_factor) * last_val
+
+            if self._abrupt_decrease_cum > 0:
+                self._abrupt_decrease_cum -= 1
+
+    def under_attack(self):
+        return self._under_attack
+
+    def get_time_start(self):
+        return self._time_start
+
+    def get_time_end(self):
+        return self._time_end
+
+    def get_state(self) -> dict:
+        return {
+            "mu": float(self._mu),
+            "sigma": float(self._sigma),
+            "z": float(self._z),
+            "test_statistic": float(self._test_statistic),
+            "threshold": float(self._detection_threshold),
+            "under_attack": self._under_attack,
+            "time_start": self._time_start,
+            "time_end": self._time_end
+        }
@@ -0,0 +1,176 @@
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+import json
+import os
+import threading
+
+# seconds to wait for the capture thread to run a submitted command
+COMMAND_TIMEOUT = 10
+
+
+class ControlServer:
+    """
+    Local control and query API of a running catcher over a Unix socket.
+    Requests and responses are JSON objects, one per line:
+
+        {"command": "intervals"}
+        {"ok": true, "result": {...}}
+
+    Queries are answered by the server thread reading values published by the capture thread,
+    commands changing the state are submitted to the capture thread and run between two packets.
+    """
+
+    def __init__(self, catcher, path: str):
+        """
+        :param catcher: the TrafficCatcher controlled
+        :param path: Unix socket path, replaced if it already exists
+        """
+
+        self.__catcher = catcher
+        self.__path = path
+        self.__server = None
+
+        self.__commands = {
+            "intervals": self.__intervals,
+            "counters": self.__counters,
+            "detectors": self.__detectors,
+            "attacks": self.__attacks,
+            "statistics": self.__statistics,
+            "prefixes": self.__prefixes,
+            "refit": self.__refit,
+            "set_threshold": self.__set_threshold,
+            "set_interval": self.__set_interval,
+            "checkpoint": self.__checkpoint
+        }
+
+    def __targets(self, request: dict) -> list:
+        """
+        Returns the targets selected by the optional target field of a request
+        """
+
+        targets = self.__catcher.get_targets()
+
+        if "target" in request:
+            targets = [target for target in targets if target.name == request["target"]]
+
+            if len(targets) == 0:
+                raise ValueError("unknown target %s" % request["target"])
+
+        return targets
+
+    def __run(self, function):
+        """
+        Runs a function in the capture thread and waits for its result
+        """
+
+        return self.__catcher.submit(function).result(COMMAND_TIMEOUT)
+
+    def __intervals(self, request: dict):
+        # values of last closed interval
+        return self.__catcher.get_last_interval()
+
+    def __counters(self, request: dict):
+        # counters of current interval, read while they are updated
+        return {target.name: target.get_counters() for target in self.__targets(request)}
+
+    def __detectors(self, request: dict):
+        targets = self.__targets(request)
+        return self.__run(lambda: {target.name: target.get_detectors_state() for target in targets})
+
+    def __attacks(self, request: dict):
+        targets = self.__targets(request)
+        return self.__run(lambda: {target.name: target.get_attacks() for target in targets})
+
+    def __statistics(self, request: dict):
+        targets = self.__targets(request)
+        return self.__run(lambda: {target.name: target.get_statistics() for target in targets})
+
+    def __prefixes(self, request: dict):
+        targets = self.__targets(request)
+        return self.__run(lambda: {target.name: target.get_prefixes() for target in targets})
+
+    def __refit(self, request: dict):
+        return self.__run(self.__catcher.get_refit_state)
+
+    def __set_threshold(self, request: dict):
+        threshold = float(request["value"])
+        targets = self.__targets(request)
+
+        def set_threshold():
+            for target in targets:
+                target.set_threshold(threshold)
+
+        return self.__run(set_threshold)
+
+    def __set_interval(self, request: dict):
+        time_interval = float(request["value"])
+        return self.__run(lambda: self.__catcher.set_interval(time_interval))
+
+    def __checkpoint(self, request: dict):
+        # state is read by the capture thread and written to the file by the server thread
+        state = self.__run(self.__catcher.get_state)
+
+        path = request["path"]
+        with open(path + ".tmp", "w") as output:
+            json.dump(state, output, default=str)
+        os.replace(path + ".tmp", path)
+
+        return path
+
+    def handle(self, line: bytes) -> dict:
+        """
+        Executes a request
+
+        :param line: JSON encoded request
+        :return: the response
+        """
+
+        try:
+            request = json.loads(line)
+            command = self.__commands.get(request.get("command"))
+
+            if command is None:
+                raise ValueError("unknown command, available: %s" % ", ".join(sorted(self.__commands)))
+
+            return {"ok": True, "result": command(request)}
+        except Exception as e:
+            return {"ok": False, "error": "%s: %s" % (type(e).__name__, e)}
+
+    def start(self):
+        """
+        Serves requests in a background thread
+        """
+
+        control = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+
+                    response = json.dumps(control.handle(line), default=str) + "\n"
+                    self.wfile.write(response.encode())
+
+        if os.path.exists(self.__path):
+            os.unlink(self.__path)
+
+        # only the owner can control the catcher: permissions are restricted before connections are accepted
+        self.__server = ThreadingUnixStreamServer(self.__path, Handler, bind_and_activate=False)
+        try:
+            self.__server.server_bind()
+            os.chmod(self.__path, 0o600)
+            self.__server.server_activate()
+        except OSError:
+            self.__server.server_close()
+            self.__server = None
+            raise
+
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            os.unlink(self.__path)
+            self.__server = None
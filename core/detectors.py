@@ -1,17 +1,28 @@
-import math
-from .forecasting import SingleExponentialSmoothing, DoubleExponentialSmoothing
+import collections
+from .forecasting import SingleExponentialSmoothing, AttackForecast
 import core.utils as utils
 import curses
-import time
+from .clock import default_clock
+from .smoothing import NPSmoothingStage
 
 class CusumDetector:
     """
     Parametric cumulative sum implementation for anomaly detection
     """
 
-    def __init__(self, threshold, sigma=100000, alpha=0.5, window_size=3):
+    def __init__(self, threshold, sigma=100000, alpha=0.5, window_size=3, row=0, label=None, clock=None,
+                 forecast_horizon=6, refit_history=0):
         self._detection_threshold = threshold
 
+        # clock used to stamp attack start and end
+        self._clock = clock if clock is not None else default_clock
+
+        # first line of the dashboard block used by the detector
+        self._row = row
+
+        # name of the monitored metric shown in status messages
+        self._label = "" if label is None else " [" + label + "]"
+
         # the gaussian's variance
         # intuitively indicates how much the new value is important in volume (self._test_statistics) computing
         self._sigma = sigma
@@ -28,7 +39,10 @@ class CusumDetector:
         # percentage beyond which the mean value (self.__mu) can be considered as anomalous behaviour
         self._alpha = alpha
 
-        self._smoothing = SingleExponentialSmoothing()
+        self._smoothing = SingleExponentialSmoothing(row=row)
+
+        # optional history of the last refit_history window means, used to fit the smoothing factor again
+        self._history = collections.deque(maxlen=refit_history) if refit_history > 0 else None
 
         # the volume computed (used to check threshold excess)
         self._test_statistic = 0
@@ -37,9 +51,15 @@ class CusumDetector:
 
         self._z = 0
 
+        # last value analyzed
+        self._value = 0
+
         # once read self.__window_size values starts to apply cusum to new values
         self.__start_cusum = False
 
+        # forecast of next values while under attack
+        self._forecast = AttackForecast(forecast_horizon)
+
     def _data_smoothing(self, value: float):
         """
         Cumulative sum (CUSUM) implementation. \n
@@ -83,6 +103,9 @@ class CusumDetector:
 
         self._smoothing.forecast(window_mean)
 
+        if self._history is not None:
+            self._history.append(window_mean)
+
         alpha_times_mu = self._alpha * last_mu
 
         # calulating cusum value
@@ -95,28 +118,55 @@ class CusumDetector:
         if not self._under_attack:
             # checking violation
             if self._test_statistic > self._detection_threshold:
-                utils.colors(0, 0, "Status: DoS attack detected", 197)
+                utils.colors(self._row, 0, "Status: DoS attack detected" + self._label, 197)
                 self._test_statistic = 0
-                self._time_start = time.time()
+                self._time_start = self._clock.time()
                 self._under_attack = True
 
         else:
             if self._test_statistic <= self._detection_threshold:
                 # violation not detected
 
-                utils.colors(0, 0, "                                              ", 1)
-                utils.colors(0, 0, "Status: DoS attack ended", 83)
-                self._time_end = time.time()
+                utils.colors(self._row, 0, "                                              ", 1)
+                utils.colors(self._row, 0, "Status: DoS attack ended" + self._label, 83)
+                self._time_end = self._clock.time()
 
                 self._test_statistic = 0
                 self._under_attack = False
 
     def update(self, value: float):
+        self._value = value
         self._data_smoothing(value)
         self._cusum_detection()
 
+        if self._under_attack:
+            # values giving a non positive z are normal
+            self._forecast.update(value, self._z, self._smoothing.get_smoothed_value() * (1 + self._alpha / 2))
+        else:
+            self._forecast.reset()
+
         return self._test_statistic
 
+    def set_threshold(self, threshold: float):
+        """
+        Changes the value the test statistic must exceed to detect an attack
+        """
+
+        self._detection_threshold = threshold
+
+    def get_smoothing(self) -> SingleExponentialSmoothing:
+        return self._smoothing
+
+    def get_smoothing_history(self):
+        """
+        Returns the last window means smoothed, None if no history is kept
+        """
+
+        return self._history
+
+    def set_smoothing_factor(self, smoothing_factor: float):
+        self._smoothing.set_smoothing_factor(smoothing_factor)
+
     def under_attack(self):
         """
         Tells if a DoS attack was detected
@@ -132,10 +182,36 @@ class CusumDetector:
     def get_time_end(self):
         return self._time_end
 
+    def get_forecast(self) -> AttackForecast:
+        """
+        Returns the forecast of next values, available after some intervals under attack
+        """
+
+        return self._forecast
+
+    def get_state(self) -> dict:
+        """
+        Returns the current values of the detector variables
+        """
+
+        return {
+            "value": float(self._value),
+            "mu": float(self._smoothing.get_smoothed_value()),
+            "sigma": float(self._sigma),
+            "z": float(self._z),
+            "test_statistic": float(self._test_statistic),
+            "threshold": float(self._detection_threshold),
+            "under_attack": self._under_attack,
+            "time_start": self._time_start,
+            "time_end": self._time_end,
+            "forecast": self._forecast.get_state()
+        }
+
 
 class NPCusumDetector:
     """
-    Non parametric cumulative sum implementation for anomaly detection
+    Non parametric cumulative sum implementation for anomaly detection:
+    an alarm state machine driven by a smoothing stage (see NPSmoothingStage)
     """
 
     def __init__(self,
@@ -143,8 +219,23 @@ class NPCusumDetector:
                  stop_alarm_delay: int = 4,
                  window_size: int = 3,
                  outlier_threshold: float = 0.65,
+                 row: int = 0,
+                 label: str = None,
+                 clock=None,
+                 stage: NPSmoothingStage = None,
+                 forecast_horizon: int = 6,
+                 refit_history: int = 0
                  ):
 
+        # clock used to stamp attack start and end
+        self._clock = clock if clock is not None else default_clock
+
+        # first line of the dashboard block used by the detector
+        self._row = row
+
+        # name of the monitored metric shown in status messages
+        self._label = "" if label is None else " [" + label + "]"
+
         self._time_start = 0
 
         self._time_end = 0
@@ -153,48 +244,25 @@ class NPCusumDetector:
 
         self._under_attack = False
 
+        # last value analyzed
+        self._value = 0
+
         # the attack detection threshold used by cusum algorithm
         self._detection_threshold = 0
 
-        # a threshold for outlier identification
-        self.__outlier_threshold = outlier_threshold
-
         # accumulates the threshold violations
         self.__outlier_cum = 0
 
         # time delay required for identifying the starting of an attack
         self.__start_alarm_delay = start_alarm_delay
 
-        # maximum number of elements inside window
-        self.__window_size = window_size
-        # list of last self.__window_size elements
-        self.__window = []
-
-        # smoothing objects that implements the smoothing function
-        self._smoothing = SingleExponentialSmoothing()
-
-        # variance of values in window
-        self._sigma = 0
-
-        # once read self.__window_size values starts to apply cusum to new values
-        self.__start_cusum = False
-
-        # value used to calculate the test statistic
-        self._z = 0
-
-        # smoothing function for forecasting z values under attack
-        self.__z_smoothing = DoubleExponentialSmoothing()
+        # window of last values, mu, sigma and z values (possibly precomputed, see CachedNPSmoothingStage)
+        if stage is None:
+            stage = NPSmoothingStage(window_size, outlier_threshold, row=row, history_size=refit_history)
+        self._stage = stage
 
-        # smoothing function for forecasting ewma values under attack
-        self.__mu_smoothing = DoubleExponentialSmoothing()
-
-        # saves last self.__stop_alarm_delay self._z values
-        self.__z_values = []
-
-        # saves last self.__stop_alarm_delay smoothed values
-        self.__mu_values = []
-
-        self.__start_ending_forecasting = False
+        # forecast of next values while under attack, fitted on the first stop_alarm_delay intervals
+        self._forecast = AttackForecast(forecast_horizon, stop_alarm_delay)
 
         self.__start_abrupt_decrease_check = False
 
@@ -212,11 +280,21 @@ class NPCusumDetector:
 
         self.__alarm_dur = 0
 
-        self.__smoothing_factor = 0
+    @property
+    def _smoothing(self):
+        return self._stage.smoothing
+
+    @property
+    def _sigma(self):
+        return self._stage.sigma
+
+    @property
+    def _z(self):
+        return self._stage.z
 
     def _outlier_processing(self, value: float) -> bool:
 
-        if value > self.__outlier_threshold:
+        if self._stage.is_outlier(value):
             # outlier threshold exceeded
             # the value is an outlier
 
@@ -228,11 +306,10 @@ class NPCusumDetector:
                 if self.__outlier_cum == self.__start_alarm_delay:
                     # reached required times to detect an attack
 
-                    utils.colors(0, 0, "Status: DoS attack detected", 197)
-                    self._time_start = time.time()
+                    utils.colors(self._row, 0, "Status: DoS attack detected" + self._label, 197)
+                    self._time_start = self._clock.time()
 
                     self.__outlier_cum -= 1
-                    self.__z_values.append(self._z)
                     self._under_attack = True
                     self.__alarm_dur += 1
 
@@ -246,68 +323,9 @@ class NPCusumDetector:
 
         return False
 
-    def _data_smoothing(self, value: float):
-
-        if len(self.__window) < self.__window_size:
-            # filling window
-
-            self.__window.append(value)
-            return
-
-        elif len(self.__window) == self.__window_size and not self.__start_cusum:
-            # first time that the window is full
-
-            self.__window.append(value)
-            self.__window = self.__window[1:]
-
-            self._smoothing.initialize(self.__window)
-            self.__smoothing_factor = self._smoothing.get_smoothing_factor()
-
-            mean = self._smoothing.get_smoothed_value()
-
-            # calculating simga value
-            square_sum = 0
-            for val in self.__window:
-                square_sum += (val - mean) ** 2
-
-            self._sigma = math.sqrt(square_sum / self.__window_size)
-
-            self.__start_cusum = True
-
-            return
-
-        self.__window.append(value)
-        self.__window = self.__window[1:]
-
-        # calculating window mean
-        window_mean = sum(self.__window) / self.__window_size
-
-        # saving previous values of mu and sigma
-        last_mu = self._smoothing.get_smoothed_value()
-
-        self._z = window_mean - last_mu - 3 * self._sigma
-
-    def _update_values(self):
-
-        # calculating window mean
-        window_mean = sum(self.__window) / self.__window_size
-
-        # saving previous values of mu and sigma
-        last_mu = self._smoothing.get_smoothed_value()
-        last_sigma_square = self._sigma ** 2
-
-        # calculating window exponentially weighted moving average
-        self._smoothing.forecast(window_mean)
-
-        # calculating simga value
-        self._sigma = math.sqrt(
-            self.__smoothing_factor * last_sigma_square +
-            (1 - self.__smoothing_factor) * (window_mean - last_mu) ** 2
-        )
-
     def _cusum_detection(self):
 
-        if not self.__start_cusum:
+        if not self._stage.started:
             return
 
         if not self._under_attack:
@@ -326,11 +344,12 @@ class NPCusumDetector:
                 if self._test_statistic >= self._detection_threshold:
                     # under attack
 
-                    utils.colors(0, 0, "Status: DoS attack detected", 197)
+                    utils.colors(self._row, 0, "Status: DoS attack detected" + self._label, 197)
+                    self._time_start = self._clock.time()
                     self._under_attack = True
                     self.__alarm_dur += 1
             else:
-                self._update_values()
+                self._stage.update_baseline()
 
         else:
             # under attack
@@ -351,9 +370,9 @@ class NPCusumDetector:
             if self.__attack_ending_cum == self.__stop_alarm_delay:
                 # reached required time delay before detect an attack ending
                 # detected end of attack
-                utils.colors(0, 0, "                                              ", 1)
-                utils.colors(0, 0, "Status: DoS attack ended", 83)
-                self._time_end = time.time()
+                utils.colors(self._row, 0, "                                              ", 1)
+                utils.colors(self._row, 0, "Status: DoS attack ended" + self._label, 83)
+                self._time_end = self._clock.time()
 
                 self._under_attack = False
                 self._test_statistic = 0
@@ -364,7 +383,7 @@ class NPCusumDetector:
                     self.__alarm_dur = 0
 
     def __check_abrupt_decrease(self):
-        last_val = self.__window[-1]
+        last_val = self._stage.last_value()
 
         if self.__attack_ending_cum > 0:
             self.__attack_ending_cum -= 1
@@ -380,9 +399,9 @@ class NPCusumDetector:
 
                 if self.__abrupt_decrease_cum == self.__stop_alarm_delay:
                     # detected end of attack
-                    utils.colors(0, 0, "                                              ", 1)
-                    utils.colors(0, 0, "Status: DoS attack ended", 83)
-                    self._time_end = time.time()
+                    utils.colors(self._row, 0, "                                              ", 1)
+                    utils.colors(self._row, 0, "Status: DoS attack ended" + self._label, 83)
+                    self._time_end = self._clock.time()
 
                     self._under_attack = False
                     self.__abrupt_decrease_cum = 0
@@ -399,20 +418,73 @@ class NPCusumDetector:
                     self.__abrupt_decrease_cum -= 1
 
     def update(self, value: float):
+        self._value = value
 
         if not self._outlier_processing(value):
 
-            self._data_smoothing(value)
+            self._stage.push(value)
             self._cusum_detection()
 
+        if self._under_attack:
+            # window means giving a non positive z are normal
+            self._forecast.update(value, self._z, self._smoothing.get_smoothed_value() + 3 * self._sigma)
+        else:
+            self._forecast.reset()
+
         return self._test_statistic
 
+    def set_threshold(self, threshold: float):
+        """
+        Changes the value beyond which a value is an outlier,
+        the detection threshold of the test statistic is adapted by the algorithm itself
+        """
+
+        self._stage.outlier_threshold = threshold
+
+    def get_smoothing(self) -> SingleExponentialSmoothing:
+        return self._smoothing
+
+    def get_smoothing_history(self):
+        """
+        Returns the last window means used to update the baseline, None if no history is kept
+        """
+
+        return self._stage.history
+
+    def set_smoothing_factor(self, smoothing_factor: float):
+        self._stage.set_smoothing_factor(smoothing_factor)
+
     def get_time_start(self):
         return self._time_start
 
     def get_time_end(self):
         return self._time_end
 
+    def get_forecast(self) -> AttackForecast:
+        """
+        Returns the forecast of next values, available after some intervals under attack
+        """
+
+        return self._forecast
+
+    def get_state(self) -> dict:
+        """
+        Returns the current values of the detector variables
+        """
+
+        return {
+            "value": float(self._value),
+            "mu": float(self._smoothing.get_smoothed_value()),
+            "sigma": float(self._sigma),
+            "z": float(self._z),
+            "test_statistic": float(self._test_statistic),
+            "threshold": float(self._detection_threshold),
+            "under_attack": self._under_attack,
+            "time_start": self._time_start,
+            "time_end": self._time_end,
+            "forecast": self._forecast.get_state()
+        }
+
     def under_attack(self):
         """
         Tells if a DoS attack was detected
@@ -424,8 +496,8 @@ class NPCusumDetector:
 
 
 class SYNNPCusumDetector(NPCusumDetector):
-    def __init__(self, verbose=False):
-        super(SYNNPCusumDetector, self).__init__()
+    def __init__(self, verbose=False, row=0, clock=None, refit_history=0):
+        super(SYNNPCusumDetector, self).__init__(row=row, clock=clock, refit_history=refit_history)
 
         self.intervals = 0
         self._verbose = verbose
@@ -441,22 +513,22 @@ class SYNNPCusumDetector(NPCusumDetector):
         self.intervals += 1
         self.update(syn_value)
 
-        utils.clean_line_end()
-        utils.colors(1, 0,     "Interval number:     " + str(self.intervals), 8)
-        utils.colors(2, 0,     "SYN volume:          " + str(self._test_statistic), 8)
-        utils.colors(3, 0,     "SYN Threshold:       " + str(self._detection_threshold), 8)
+        utils.clean_line_end(self._row)
+        utils.colors(self._row + 1, 0,     "Interval number:     " + str(self.intervals), 8)
+        utils.colors(self._row + 2, 0,     "SYN volume:          " + str(self._test_statistic), 8)
+        utils.colors(self._row + 3, 0,     "SYN Threshold:       " + str(self._detection_threshold), 8)
         if self._verbose:
-            utils.colors(4, 0, "SYN Value:           " + str(syn_value), 8)
-            utils.colors(5, 0, "SYN Zeta:            " + str(self._z), 8)
-            utils.colors(6, 0, "SYN Sigma:           " + str(self._sigma), 8)
-            utils.colors(7, 0, "SYN Mu:              " + str(self._smoothing.get_smoothed_value()), 8)
+            utils.colors(self._row + 4, 0, "SYN Value:           " + str(syn_value), 8)
+            utils.colors(self._row + 5, 0, "SYN Zeta:            " + str(self._z), 8)
+            utils.colors(self._row + 6, 0, "SYN Sigma:           " + str(self._sigma), 8)
+            utils.colors(self._row + 7, 0, "SYN Mu:              " + str(self._smoothing.get_smoothed_value()), 8)
 
         return self._test_statistic, self._detection_threshold
 
 
 class SYNCusumDetector(CusumDetector):
-    def __init__(self, threshold=0.65, verbose=False):
-        super().__init__(threshold=threshold)
+    def __init__(self, threshold=0.65, verbose=False, row=0, clock=None, refit_history=0):
+        super().__init__(threshold=threshold, row=row, clock=clock, refit_history=refit_history)
         self.intervals = 0
         self._verbose = verbose
 
@@ -464,14 +536,14 @@ class SYNCusumDetector(CusumDetector):
         self.intervals += 1
         self.update(syn_count)
 
-        utils.clean_line_end()
-        utils.colors(1, 0,     "Interval number:     " + str(self.intervals), 8)
-        utils.colors(2, 0,     "SYN volume:          " + str(self._test_statistic), 8)
-        utils.colors(3, 0,     "SYN Threshold:       " + str(self._detection_threshold), 8)
+        utils.clean_line_end(self._row)
+        utils.colors(self._row + 1, 0,     "Interval number:     " + str(self.intervals), 8)
+        utils.colors(self._row + 2, 0,     "SYN volume:          " + str(self._test_statistic), 8)
+        utils.colors(self._row + 3, 0,     "SYN Threshold:       " + str(self._detection_threshold), 8)
         if self._verbose:
-            utils.colors(4, 0, "SYN Value:           " + str(syn_count), 8)
-            utils.colors(5, 0, "SYN Zeta:            " + str(self._z), 8)
-            utils.colors(6, 0, "SYN Sigma:           " + str(self._sigma), 8)
-            utils.colors(7, 0, "SYN Mu:              " + str(self._smoothing.get_smoothed_value()), 8)
+            utils.colors(self._row + 4, 0, "SYN Value:           " + str(syn_count), 8)
+            utils.colors(self._row + 5, 0, "SYN Zeta:            " + str(self._z), 8)
+            utils.colors(self._row + 6, 0, "SYN Sigma:           " + str(self._sigma), 8)
+            utils.colors(self._row + 7, 0, "SYN Mu:              " + str(self._smoothing.get_smoothed_value()), 8)
 
         return self._test_statistic, self._detection_threshold
@@ -0,0 +1,375 @@
+from .traffic import TrafficCatcher, Target
+from .clock import PacketClock
+from .compact import CompactNPCusumDetector, NPCusumParameters, CompactCusumDetector, CusumParameters
+import core.utils as utils
+import select
+import socket
+import struct
+import time
+
+# interval record: magic, version, interval index, interval end, interval duration, SYN and SYN/ACK counts,
+# followed by sensor and target names (one byte length and UTF-8 text each)
+RECORD_MAGIC = b"DSTR"
+RECORD_VERSION = 1
+RECORD = struct.Struct("!4sBqddII")
+
+# records are prefixed by their length on TCP streams
+FRAME_LENGTH = struct.Struct("!H")
+
+
+def encode_record(sensor: str, target: str, index: int, interval_end: float, interval: float,
+                  syn: int, synack: int) -> bytes:
+    sensor = sensor.encode()[:255]
+    target = target.encode()[:255]
+
+    return RECORD.pack(RECORD_MAGIC, RECORD_VERSION, index, interval_end, interval, syn, synack) + \
+        bytes((len(sensor),)) + sensor + bytes((len(target),)) + target
+
+
+def decode_record(data: bytes) -> dict:
+    """
+    Decodes an interval record
+
+    :param data: encoded record
+    :return: dictionary with the record fields
+    :raise ValueError: if data isn't a valid record
+    """
+
+    try:
+        magic, version, index, interval_end, interval, syn, synack = RECORD.unpack_from(data)
+
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ValueError("not a DoSTect interval record")
+
+        position = RECORD.size
+        sensor = data[position + 1:position + 1 + data[position]].decode()
+        position += 1 + data[position]
+        target = data[position + 1:position + 1 + data[position]].decode()
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError("malformed record: %s" % e)
+
+    return {
+        "sensor": sensor,
+        "target": target,
+        "index": index,
+        "interval_end": interval_end,
+        "interval": interval,
+        "syn": syn,
+        "synack": synack
+    }
+
+
+def parse_endpoint(endpoint: str, default_host: str = "127.0.0.1") -> tuple:
+    """
+    Parses a [HOST:]PORT endpoint, IPv6 hosts in brackets (e.g. [::1]:9999)
+    """
+
+    host, _, port = endpoint.rpartition(":")
+    host = host.strip("[]") or default_host
+
+    return host, int(port)
+
+
+class SensorExporter:
+    """
+    Sends the counts of every closed interval to a collector.
+    Records are sent without ever blocking the capture thread: when the socket isn't writable
+    (or the collector is unreachable) records are dropped and counted.
+    """
+
+    def __init__(self, endpoint: str, sensor: str = None, protocol: str = "udp"):
+        """
+        :param endpoint: collector [HOST:]PORT
+        :param sensor: sensor name, the host name by default
+        :param protocol: udp or tcp
+        """
+
+        self.__address = socket.getaddrinfo(*parse_endpoint(endpoint), 0, socket.SOCK_DGRAM)[0][4]
+        self.__family = socket.AF_INET6 if ":" in self.__address[0] else socket.AF_INET
+        self.__sensor = sensor if sensor is not None else socket.gethostname()
+        self.__tcp = protocol == "tcp"
+        self.__socket = None
+        self.__connected = False
+
+        self.sent = 0
+        self.dropped = 0
+
+    def __connect(self):
+        if self.__tcp:
+            self.__socket = socket.socket(self.__family, socket.SOCK_STREAM)
+            self.__socket.setblocking(False)
+            # connection completes in background, records are dropped until then
+            self.__socket.connect_ex(self.__address)
+        else:
+            self.__socket = socket.socket(self.__family, socket.SOCK_DGRAM)
+            self.__socket.setblocking(False)
+
+    def __close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+        self.__socket = None
+        self.__connected = False
+
+    def export(self, target: str, interval_end: float, interval: float, data: dict):
+        """
+        Sends the record of a closed interval
+
+        :param target: target name
+        :param interval_end: end time of the interval
+        :param interval: interval duration in seconds
+        :param data: values of the interval returned by Target._counter_reader
+        """
+
+        record = encode_record(self.__sensor, target, round(interval_end / interval), interval_end, interval,
+                               data["syn_counter"], data["synack_counter"])
+
+        if self.__socket is None:
+            self.__connect()
+
+        try:
+            if self.__tcp:
+                if not self.__connected:
+                    # checking if the background connection completed
+                    _, writable, _ = select.select([], [self.__socket], [], 0)
+                    if not writable or self.__socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                        raise BlockingIOError()
+                    self.__connected = True
+
+                frame = FRAME_LENGTH.pack(len(record)) + record
+                if self.__socket.send(frame) != len(frame):
+                    # partial record: the stream can't be resynchronized
+                    raise ConnectionError()
+            else:
+                self.__socket.sendto(record, self.__address)
+
+            self.sent += 1
+        except BlockingIOError:
+            self.dropped += 1
+
+            if self.__tcp and not self.__connected:
+                self.__retry_connection()
+        except OSError:
+            self.dropped += 1
+            self.__close()
+
+    def __retry_connection(self):
+        # giving up a connection attempt failed or still pending, next record starts a new one
+        if self.__socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            self.__close()
+
+    def close(self):
+        self.__close()
+
+
+class CollectorCatcher(TrafficCatcher):
+    """
+    Collects interval records sent by many sensors (UDP datagrams or TCP streams on the same port),
+    aligns them by interval and runs a detector on the counts summed over all the sensors
+    and a compact detector on the counts of each sensor.
+    An interval is closed when every target of every known sensor reported it, or when deadline seconds
+    passed since its first record arrived: missing sensors don't contribute to it and later records are dropped.
+    Intervals where a sensor or target shows up for the first time are always closed at their deadline,
+    so that the other new sensors can report them too.
+    """
+
+    def __init__(self, source: str, parametric=False, time_interval=5, threshold=0.65, verbose=False,
+                 deadline=None, sensors=0, profiler=None, refitter=None):
+        """
+        :param source: [HOST:]PORT where records are received
+        :param deadline: seconds waited for missing sensors, the interval duration by default
+        :param sensors: number of expected sensors, otherwise all the sensors seen so far are expected
+        """
+
+        super().__init__(source, parametric, time_interval, threshold, verbose, profiler=profiler,
+                         clock=PacketClock(), refitter=refitter)
+
+        self.__host, self.__port = parse_endpoint(source, "0.0.0.0")
+        self.__deadline = deadline if deadline is not None else time_interval
+        self.__expected = sensors
+
+        # detector of the counts summed over every sensor
+        self.__total = self._add_target("total", [])
+
+        # compact detector of each sensor
+        if parametric:
+            self.__parameters = CusumParameters(threshold, clock=self._clock)
+        else:
+            self.__parameters = NPCusumParameters(clock=self._clock)
+        self.__sensors = {}
+
+        # first interval reported by each (sensor, target) pair
+        self.__reporters = {}
+
+        # records of pending intervals by interval index:
+        # {index: (first arrival, {sensor: [syn, synack]}, reporting (sensor, target) pairs)}
+        self.__pending = {}
+        self.__last_closed = None
+
+        self.late_records = 0
+        self.invalid_records = 0
+        self.missing_reports = 0
+
+    def __sensor_detector(self, sensor: str):
+        detector = self.__sensors.get(sensor)
+
+        if detector is None:
+            if self._parametric:
+                detector = CompactCusumDetector(self.__parameters)
+            else:
+                detector = CompactNPCusumDetector(self.__parameters)
+            self.__sensors[sensor] = detector
+
+        return detector
+
+    def receive(self, data: bytes):
+        """
+        Adds a received record to its interval
+        """
+
+        try:
+            record = decode_record(data)
+        except ValueError:
+            self.invalid_records += 1
+            return
+
+        if record["interval"] != self._time_interval:
+            self.invalid_records += 1
+            return
+
+        index = record["index"]
+        reporter = (record["sensor"], record["target"])
+
+        # registering the sensor and its target even if the record is late, next intervals expect them
+        self.__sensor_detector(record["sensor"])
+        self.__reporters.setdefault(reporter, index)
+
+        if self.__last_closed is not None and index <= self.__last_closed:
+            self.late_records += 1
+            return
+
+        arrival, reports, reporters = self.__pending.setdefault(index, (time.monotonic(), {}, set()))
+        reporters.add(reporter)
+
+        # counts of the targets of a sensor are summed
+        counts = reports.setdefault(record["sensor"], [0, 0])
+        counts[0] += record["syn"]
+        counts[1] += record["synack"]
+
+    def close_intervals(self, now: float = None) -> float:
+        """
+        Closes in order the pending intervals that are complete or whose deadline passed
+
+        :param now: current monotonic time
+        :return: seconds until the deadline of the oldest pending interval, None if nothing is pending
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        while len(self.__pending) > 0:
+            index = min(self.__pending)
+            arrival, reports, reporters = self.__pending[index]
+
+            if not self.__complete(index, reports, reporters) and now - arrival < self.__deadline:
+                return arrival + self.__deadline - now
+
+            del self.__pending[index]
+            self.__close_interval(index, reports)
+
+        return None
+
+    def __complete(self, index: int, reports: dict, reporters: set) -> bool:
+        """
+        Tells if an interval was reported by the expected number of sensors and by every (sensor, target)
+        pair seen in previous intervals, with no pair seen for the first time
+        """
+
+        if len(reports) < self.__expected:
+            return False
+
+        for reporter, first in self.__reporters.items():
+            if first == index or (first < index and reporter not in reporters):
+                return False
+
+        return True
+
+    def __close_interval(self, index: int, reports: dict):
+        self.__last_closed = index
+        self.missing_reports += max(self.__expected, len(self.__sensors)) - len(reports)
+
+        # detectors see the end of the interval as current time
+        self._clock.set(index * self._time_interval)
+
+        self.__total._syn_counter = sum(syn for syn, synack in reports.values())
+        self.__total._synack_counter = sum(synack for syn, synack in reports.values())
+        self._counter_reader()
+
+        for sensor, (syn, synack) in reports.items():
+            if self._parametric:
+                value = syn
+            else:
+                value = max(float(syn - synack) / syn, 0) if syn != 0 else 0.0
+
+            self.__sensor_detector(sensor).update(value)
+
+        attacked = self.get_attacked_sensors()
+        utils.colors(Target.ROWS, 0, "Sensors: %-6d reporting: %-6d sensors under attack: %-40s" % (
+            len(self.__sensors), len(reports), " ".join(attacked[:5]) + (" ..." if len(attacked) > 5 else "")),
+            197 if attacked else 5)
+
+    def get_attacked_sensors(self) -> list:
+        return sorted(sensor for sensor, detector in self.__sensors.items() if detector.under_attack())
+
+    def get_sensors_state(self) -> dict:
+        return {sensor: detector.get_state() for sensor, detector in self.__sensors.items()}
+
+    def start(self):
+        """
+        Receives records until interrupted
+        """
+
+        family = socket.AF_INET6 if ":" in self.__host else socket.AF_INET
+
+        udp = socket.socket(family, socket.SOCK_DGRAM)
+        udp.bind((self.__host, self.__port))
+
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.__host, self.__port))
+        listener.listen()
+
+        # partially received data of each TCP connection
+        streams = {}
+
+        try:
+            while True:
+                timeout = self.close_intervals()
+                ready, _, _ = select.select([udp, listener, self._wakeup] + list(streams), [], [], timeout)
+
+                for sock in ready:
+                    if sock is udp:
+                        self.receive(udp.recv(65535))
+                    elif sock is listener:
+                        connection, _ = listener.accept()
+                        streams[connection] = b""
+                    elif sock is self._wakeup:
+                        self._run_commands()
+                    else:
+                        data = sock.recv(65536)
+
+                        if not data:
+                            del streams[sock]
+                            sock.close()
+                            continue
+
+                        buffer = streams[sock] + data
+                        while len(buffer) >= FRAME_LENGTH.size:
+                            length, = FRAME_LENGTH.unpack_from(buffer)
+                            if len(buffer) < FRAME_LENGTH.size + length:
+                                break
+                            self.receive(buffer[FRAME_LENGTH.size:FRAME_LENGTH.size + length])
+                            buffer = buffer[FRAME_LENGTH.size + length:]
+                        streams[sock] = buffer
+        finally:
+            for sock in [udp, listener] + list(streams):
+                sock.close()
@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+
+# columns of the per interval results and their types
+COLUMNS = (
+    ("timestamp", np.float64),
+    ("syn", np.int64),
+    ("synack", np.int64),
+    ("value", np.float64),
+    ("z", np.float64),
+    ("mu", np.float64),
+    ("sigma", np.float64),
+    ("test_statistic", np.float64),
+    ("threshold", np.float64),
+    ("attack", np.bool_)
+)
+
+
+class ResultWriter:
+    """
+    Writes the results of every interval in a columnar file, in batches of batch_size intervals
+    so that memory doesn't grow with the number of intervals
+    """
+
+    def __init__(self, path: str, batch_size: int = 65536):
+        self._path = path
+        self._batch_size = batch_size
+        self._batch = {name: [] for name, dtype in COLUMNS}
+        self._rows = 0
+
+    def write(self, timestamp: float, data: dict, state: dict):
+        """
+        Adds the results of an interval
+
+        :param timestamp: end time of the interval
+        :param data: values of the interval returned by Target._counter_reader
+        :param state: state of the detector returned by get_state
+        """
+
+        batch = self._batch
+        batch["timestamp"].append(timestamp)
+        batch["syn"].append(data["syn_counter"])
+        batch["synack"].append(data["synack_counter"])
+        batch["value"].append(state["value"])
+        batch["z"].append(state["z"])
+        batch["mu"].append(state["mu"])
+        batch["sigma"].append(state["sigma"])
+        batch["test_statistic"].append(state["test_statistic"])
+        batch["threshold"].append(state["threshold"])
+        batch["attack"].append(state["under_attack"])
+
+        self._rows += 1
+        if len(batch["timestamp"]) >= self._batch_size:
+            self.flush()
+
+    def _write_batch(self, columns: dict):
+        """
+        Writes a batch of intervals
+
+        :param columns: dictionary of column arrays
+        """
+
+        pass
+
+    def flush(self):
+        if len(self._batch["timestamp"]) == 0:
+            return
+
+        self._write_batch({name: np.asarray(self._batch[name], dtype=dtype) for name, dtype in COLUMNS})
+
+        for values in self._batch.values():
+            values.clear()
+
+    def close(self):
+        self.flush()
+
+    def abort(self):
+        """
+        Discards the results, removing what was written so far (e.g. the analysis could not start)
+        """
+
+        for values in self._batch.values():
+            values.clear()
+
+
+class NPZResultWriter(ResultWriter):
+    """
+    Writes results as a NumPy .npz archive with one array for each column (np.load(path)["z"]).
+    Batches are appended to temporary column files, copied into the archive when closing.
+    """
+
+    def __init__(self, path: str, batch_size: int = 65536):
+        super().__init__(path, batch_size)
+
+        self.__directory = tempfile.mkdtemp(prefix=".dostect-", dir=os.path.dirname(os.path.abspath(path)))
+        self.__files = {name: open(os.path.join(self.__directory, name), "wb") for name, dtype in COLUMNS}
+
+    def _write_batch(self, columns: dict):
+        for name, values in columns.items():
+            values.tofile(self.__files[name])
+
+    def close(self):
+        super().close()
+
+        try:
+            with zipfile.ZipFile(self._path, "w", allowZip64=True) as archive:
+                for name, dtype in COLUMNS:
+                    self.__files[name].close()
+
+                    with archive.open(name + ".npy", "w", force_zip64=True) as entry:
+                        np.lib.format.write_array_header_1_0(entry, {
+                            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                            "fortran_order": False,
+                            "shape": (self._rows,)
+                        })
+
+                        with open(os.path.join(self.__directory, name), "rb") as column:
+                            shutil.copyfileobj(column, entry)
+        finally:
+            shutil.rmtree(self.__directory, ignore_errors=True)
+
+    def abort(self):
+        super().abort()
+
+        for file in self.__files.values():
+            file.close()
+
+        shutil.rmtree(self.__directory, ignore_errors=True)
+
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Writes results as a Parquet file, one row group for each batch (requires pyarrow)
+    """
+
+    def __init__(self, path: str, batch_size: int = 65536):
+        super().__init__(path, batch_size)
+
+        import pyarrow
+        import pyarrow.parquet
+
+        self.__pyarrow = pyarrow
+        self.__schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(dtype)) for name, dtype in COLUMNS])
+        self.__writer = pyarrow.parquet.ParquetWriter(path, self.__schema)
+
+    def _write_batch(self, columns: dict):
+        self.__writer.write_table(self.__pyarrow.Table.from_arrays(
+            [columns[name] for name, dtype in COLUMNS], schema=self.__schema
+        ))
+
+    def close(self):
+        super().close()
+        self.__writer.close()
+
+    def abort(self):
+        super().abort()
+        self.__writer.close()
+
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+def open_result_writer(path: str, batch_size: int = 65536) -> ResultWriter:
+    """
+    Returns a results writer for the format given by the file extension (.npz or .parquet)
+
+    :raise ValueError: if the format isn't supported
+    :raise ImportError: if the format requires a missing package
+    """
+
+    extension = os.path.splitext(path)[-1].lower()
+
+    if extension == ".npz":
+        return NPZResultWriter(path, batch_size)
+
+    if extension == ".parquet":
+        return ParquetResultWriter(path, batch_size)
+
+    raise ValueError("unsupported results format %s (.npz or .parquet)" % extension)
@@ -0,0 +1,103 @@
+from .packets import SYN, RST, ACK, FIN, IPPROTO_TCP, IPPROTO_UDP, IPPROTO_ICMP, IPPROTO_ICMPV6
+
+# packet direction in relation to the target addresses
+INBOUND = 0
+OUTBOUND = 1
+
+# available features: name -> (protocols, TCP flags mask, TCP flags value, direction)
+FEATURES = {
+    "syn": ((IPPROTO_TCP,), SYN | ACK, SYN, INBOUND),
+    "synack": ((IPPROTO_TCP,), SYN | ACK, SYN | ACK, OUTBOUND),
+    "ack": ((IPPROTO_TCP,), SYN | ACK | RST | FIN, ACK, INBOUND),
+    "rst": ((IPPROTO_TCP,), RST, RST, INBOUND),
+    "fin": ((IPPROTO_TCP,), FIN, FIN, INBOUND),
+    "udp": ((IPPROTO_UDP,), 0, 0, INBOUND),
+    "icmp": ((IPPROTO_ICMP, IPPROTO_ICMPV6), 0, 0, INBOUND),
+}
+
+
+class FeatureExtractor:
+    """
+    Computes a configurable set of per interval packet counters in a single pass.
+    A dispatch table indexed by protocol and TCP flags is compiled once,
+    so each packet costs a lookup and one increment for each matching feature.
+    """
+
+    def __init__(self, names):
+        """
+        :param names: names of the features to compute, see FEATURES
+        """
+
+        self.names = list(names)
+
+        # protocol -> list indexed by TCP flags of (inbound features indexes, outbound features indexes)
+        self.__table = {}
+
+        for index, name in enumerate(self.names):
+            protocols, mask, value, direction = FEATURES[name]
+
+            for protocol in protocols:
+                entries = self.__table.setdefault(protocol, [((), ()) for _ in range(256)])
+
+                for flags in range(256):
+                    if flags & mask == value:
+                        entry = list(entries[flags])
+                        entry[direction] = entry[direction] + (index,)
+                        entries[flags] = tuple(entry)
+
+        # inbound packets of current interval
+        self.__packets = 0
+
+        # features counters of current interval
+        self.__counters = [0] * len(self.names)
+
+    def count(self, protocol: int, flags: int, inbound: bool, outbound: bool):
+        """
+        Updates features counters with a packet
+
+        :param protocol: packet transport protocol
+        :param flags: TCP flags, 0 for other protocols
+        :param inbound: True if the packet is directed to the target
+        :param outbound: True if the packet is sent by the target
+        """
+
+        if inbound:
+            self.__packets += 1
+
+        entries = self.__table.get(protocol)
+
+        if entries is None:
+            return
+
+        incoming, outgoing = entries[flags]
+        counters = self.__counters
+
+        if inbound:
+            for index in incoming:
+                counters[index] += 1
+
+        if outbound:
+            for index in outgoing:
+                counters[index] += 1
+
+    def peek(self) -> dict:
+        """
+        Returns features counters of current interval without resetting them
+        """
+
+        return dict(zip(self.names, self.__counters))
+
+    def read(self):
+        """
+        Returns and resets interval counters
+
+        :return: (inbound packets count, dictionary of features counters)
+        """
+
+        counters = dict(zip(self.names, self.__counters))
+        packets = self.__packets
+
+        self.__counters = [0] * len(self.names)
+        self.__packets = 0
+
+        return packets, counters
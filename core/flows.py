@@ -0,0 +1,157 @@
+from array import array
+import math
+
+
+class HalfOpenTable:
+    """
+    Bounded table of TCP connections opened by a SYN and not yet completed by the client ACK (half-open).
+    Flows are stored in preallocated arrays of fixed capacity and expired by a timing wheel:
+    every slot is linked into the wheel bucket of its deadline through intrusive doubly linked lists,
+    so insertion, completion and expiry are O(1) and memory never grows.
+    """
+
+    def __init__(self, timeout: float = 10, capacity: int = 65536, resolution: float = 1):
+        """
+        :param timeout: seconds after which a flow not completed is considered half-open
+        :param capacity: maximum number of tracked flows
+        :param resolution: duration of a timing wheel tick in seconds
+        """
+
+        self.__capacity = capacity
+        self.__resolution = resolution
+
+        # number of wheel buckets covering timeout
+        self.__wheel_size = max(int(math.ceil(timeout / resolution)), 1) + 1
+
+        # nodes [0, capacity) are flow slots, nodes [capacity, capacity + wheel size) are buckets heads
+        nodes = capacity + self.__wheel_size
+        self.__next = array('l', range(nodes))
+        self.__prev = array('l', range(nodes))
+
+        # flow key of each slot
+        self.__keys = [None] * capacity
+
+        # slot of each tracked flow key
+        self.__slots = {}
+
+        # stack of free slots
+        self.__free = array('l', range(capacity - 1, -1, -1))
+
+        # current wheel tick, -1 until first advance
+        self.__tick = -1
+
+        # counters of current interval
+        self.__opened = 0
+        self.__completed = 0
+        self.__expired = 0
+
+    def __link(self, slot: int, bucket: int):
+        head = self.__capacity + bucket
+        first = self.__next[head]
+
+        self.__next[slot] = first
+        self.__prev[slot] = head
+        self.__prev[first] = slot
+        self.__next[head] = slot
+
+    def __unlink(self, slot: int):
+        prev = self.__prev[slot]
+        next = self.__next[slot]
+
+        self.__next[prev] = next
+        self.__prev[next] = prev
+
+    def __release(self, slot: int):
+        del self.__slots[self.__keys[slot]]
+        self.__keys[slot] = None
+        self.__free.append(slot)
+
+    def syn(self, key: bytes):
+        """
+        Tracks a new flow, retransmitted SYNs of an already tracked flow are ignored.
+        If the table is full the flow is counted as half-open immediately.
+
+        :param key: the flow 4-tuple (client address, server address, client port, server port)
+        """
+
+        if key in self.__slots:
+            return
+
+        self.__opened += 1
+
+        if len(self.__free) == 0:
+            self.__expired += 1
+            return
+
+        slot = self.__free.pop()
+        self.__keys[slot] = key
+        self.__slots[key] = slot
+
+        # the deadline falls in the bucket preceding the current one in the wheel
+        self.__link(slot, (self.__tick - 1) % self.__wheel_size)
+
+    def complete(self, key: bytes):
+        """
+        Stops tracking a flow completed (or reset) by the client
+
+        :param key: the flow 4-tuple (client address, server address, client port, server port)
+        """
+
+        slot = self.__slots.get(key)
+
+        if slot is None:
+            return
+
+        self.__unlink(slot)
+        self.__release(slot)
+        self.__completed += 1
+
+    def advance(self, now: float):
+        """
+        Moves the timing wheel to given time expiring the flows whose deadline has passed
+
+        :param now: current time in seconds
+        """
+
+        tick = int(now / self.__resolution)
+
+        if self.__tick == -1:
+            self.__tick = tick
+            return
+
+        if tick - self.__tick > self.__wheel_size:
+            # all buckets are expired
+            self.__tick = tick - self.__wheel_size
+
+        while self.__tick < tick:
+            self.__tick += 1
+
+            head = self.__capacity + self.__tick % self.__wheel_size
+            slot = self.__next[head]
+
+            while slot != head:
+                next = self.__next[slot]
+                self.__release(slot)
+                self.__expired += 1
+                slot = next
+
+            self.__next[head] = head
+            self.__prev[head] = head
+
+    def read(self):
+        """
+        Returns and resets interval counters
+
+        :return: (opened flows, completed flows, flows expired half-open) in the interval
+        """
+
+        counters = self.__opened, self.__completed, self.__expired
+
+        self.__opened = 0
+        self.__completed = 0
+        self.__expired = 0
+
+        return counters
+
+    def __len__(self):
+        return len(self.__slots)
@@ -1,5 +1,4 @@
 from scipy import optimize
-import random
 import sys
 import numpy as np
 import core.utils as utils
@@ -7,15 +6,30 @@ import core.utils as utils
 
 class ExponentialSmoothing:
 
+    # subclasses declare their attributes in __slots__: no per instance dictionary
+    __slots__ = ()
+
     def initialize(self, training_values: list):
         """
         Initializes smoothed value to given value for next iterations.
 
         :param training_values: the values used to estimate forecasting factors
+        :return: True if the factors were fitted, False if the fit failed and the initial guess is kept
         """
 
         pass
 
+    @staticmethod
+    def initial_guess(bounds: tuple) -> np.ndarray:
+        """
+        Returns the factors the fit starts from: the middle of their bounds, so that
+        the same training values always give the same factors (runs are reproducible)
+
+        :param bounds: (lower, upper) bounds of each factor
+        """
+
+        return np.array([(lower + upper) / 2 for lower, upper in bounds])
+
     def get_smoothed_value(self) -> float:
         """
         Returns the calculated smoothed value
@@ -54,55 +68,67 @@ class ExponentialSmoothing:
 
 class SingleExponentialSmoothing(ExponentialSmoothing):
 
-    def __init__(self, initial_smoothed_value=0, smoothing_factor=0):
+    __slots__ = ("__row", "__smoothing_factor", "__smoothed_value")
 
-        self.__bounds = (
-            (0.95, 0.99),  # smoothing factor value bounds
-        )
+    # shared by all the instances
+    BOUNDS = (
+        (0.95, 0.99),  # smoothing factor value bounds
+    )
 
-        self.__smoothing_factor = smoothing_factor
+    def __init__(self, initial_smoothed_value=0, smoothing_factor=0, row=0):
 
-        self.__smoothed_value = initial_smoothed_value
-
-    def __sse(self, values, smoothing_factor):
+        # first line of the dashboard block used to show factors, None to show nothing
+        self.__row = row
 
         self.__smoothing_factor = smoothing_factor
 
-        predictions = [values[0]]
+        self.__smoothed_value = initial_smoothed_value
+
+    @staticmethod
+    def __sse(values, smoothing_factor, initial_smoothed_value):
 
-        for value in values[1:]:
-            predictions.append(self.forecast(value))
+        # every evaluation starts from the same initial value, the state of the smoothing isn't changed
+        smoothed_value = initial_smoothed_value
 
         try:
             s = 0
-            for n, r in zip(values, predictions):
-                s = s + (n - r) ** 2
-
+            for value in values:
+                # error of the one step ahead forecast
+                s = s + (value - smoothed_value) ** 2
+                smoothed_value = smoothing_factor * smoothed_value + (1 - smoothing_factor) * value
             return s
-        
         except OverflowError:
             return sys.float_info.max
 
     def initialize(self, training_values):
 
-        self.__smoothing_factor = random.uniform(self.__bounds[0][0], self.__bounds[0][1])
+        forecasting_factors_init_guess = self.initial_guess(self.BOUNDS)
+        self.__smoothing_factor = forecasting_factors_init_guess[0]
 
         # initializing smoothed value
-        self.__smoothed_value = sum(training_values) / len(training_values)
+        smoothed_value = self.__smoothed_value = sum(training_values) / len(training_values)
 
-        forecasting_factors_init_guess = np.array([self.__smoothing_factor])
+        # errors relative to the deviations from the mean: SLSQP stops at the initial guess on large sums
+        scale = sum((value - smoothed_value) ** 2 for value in training_values) or 1
 
-        loss_function = lambda x: self.__sse(training_values, x[0])
+        loss_function = lambda x: self.__sse(training_values, x[0], smoothed_value) / scale
 
         forecasting_factors = optimize.minimize(
             loss_function,
             forecasting_factors_init_guess,
             method="SLSQP",
-            bounds=self.__bounds
+            bounds=self.BOUNDS
         )
 
-        self.__smoothing_factor = forecasting_factors.x[0]
-        utils.colors(1,50,"Data SES Smoothing factor:     " + str(self.__smoothing_factor),8)
+        # the initial guess is kept when the fit fails
+        fitted = bool(forecasting_factors.success and np.isfinite(forecasting_factors.fun))
+        if fitted:
+            self.__smoothing_factor = forecasting_factors.x[0]
+
+        if self.__row is not None:
+            utils.colors(self.__row + 1,50,"Data SES Smoothing factor:     " + str(self.__smoothing_factor),8)
+
+        return fitted
 
     def get_smoothed_value(self) -> float:
         return self.__smoothed_value
@@ -110,6 +136,13 @@ class SingleExponentialSmoothing(ExponentialSmoothing):
     def get_smoothing_factor(self) -> float:
         return self.__smoothing_factor
 
+    def set_smoothing_factor(self, smoothing_factor: float):
+        """
+        Replaces the estimated smoothing factor (e.g. fitted again on a longer history)
+        """
+
+        self.__smoothing_factor = smoothing_factor
+
     def forecast(self, value: float) -> float:
         self.__smoothed_value = self.__smoothing_factor * self.__smoothed_value + (1 - self.__smoothing_factor) * value
 
@@ -128,12 +161,18 @@ class SingleExponentialSmoothing(ExponentialSmoothing):
 
 class DoubleExponentialSmoothing(ExponentialSmoothing):
 
-    def __init__(self, initial_smoothed_value=0, initial_trend_value=0, smoothing_factor=0, trend_factor=0):
+    __slots__ = ("__row", "__smoothing_factor", "__trend_factor", "__smoothed_value", "__trend_value")
 
-        self.__bounds = (
-            (0.95, 0.99),  # smoothing factor value bounds
-            (0, 1)      # trend factor value bounds
-        )
+    # shared by all the instances
+    BOUNDS = (
+        (0.95, 0.99),  # smoothing factor value bounds
+        (0, 1)      # trend factor value bounds
+    )
+
+    def __init__(self, initial_smoothed_value=0, initial_trend_value=0, smoothing_factor=0, trend_factor=0, row=0):
+
+        # first line of the dashboard block used to show factors, None to show nothing
+        self.__row = row
 
         self.__smoothing_factor = smoothing_factor
         self.__trend_factor = trend_factor
@@ -141,50 +180,58 @@ class DoubleExponentialSmoothing(ExponentialSmoothing):
         self.__smoothed_value = initial_smoothed_value
         self.__trend_value = initial_trend_value
 
-    def __sse(self, values, smoothing_factor, trend_factor):
+    def __sse(self, values, smoothing_factor, trend_factor, initial_smoothed_value, initial_trend_value):
 
         self.__smoothing_factor = smoothing_factor
         self.__trend_factor = trend_factor
 
-        predictions = [values[0]]
-
-        for value in values[1:]:
-            predictions.append(self.forecast(value))
+        # every evaluation starts from the same initial values
+        self.__smoothed_value = initial_smoothed_value
+        self.__trend_value = initial_trend_value
 
         try:
             s = 0
-            for n, r in zip(values, predictions):
-                s = s + (n - r) ** 2
+            for value in values[1:]:
+                # error of the one step ahead forecast
+                s = s + (value - self.get_smoothed_value()) ** 2
+                self.forecast(value)
             return s
         except OverflowError:
             return sys.float_info.max
 
     def initialize(self, training_values: list):
-        self.__smoothing_factor = random.uniform(self.__bounds[0][0], self.__bounds[0][1])
-        self.__trend_factor = random.uniform(self.__bounds[1][0], self.__bounds[1][1])
+        forecasting_factors_init_guess = self.initial_guess(self.BOUNDS)
 
         # initializing smoothed value
-        self.__smoothed_value = sum(training_values) / len(training_values)
+        smoothed_value = sum(training_values) / len(training_values)
 
         # initializing trend value
-        self.__trend_value = (training_values[-1] - training_values[0]) / (len(training_values)-1)
+        trend_value = (training_values[-1] - training_values[0]) / (len(training_values)-1)
 
-        forecasting_factors_init_guess = np.array([self.__smoothing_factor, self.__trend_factor])
+        # errors relative to the deviations from the mean: SLSQP stops at the initial guess on large sums
+        scale = sum((value - smoothed_value) ** 2 for value in training_values) or 1
 
-        loss_function = lambda x: self.__sse(training_values, x[0], x[1])
+        loss_function = lambda x: self.__sse(training_values, x[0], x[1], smoothed_value, trend_value) / scale
 
         forecasting_factors = optimize.minimize(
             loss_function,
             forecasting_factors_init_guess,
             method="SLSQP",
-            bounds=self.__bounds
+            bounds=self.BOUNDS
         )
 
-        self.__smoothing_factor = forecasting_factors.x[0]
-        self.__trend_factor = forecasting_factors.x[1]
+        # the initial guess is kept when the fit fails
+        fitted = bool(forecasting_factors.success and np.isfinite(forecasting_factors.fun))
+        factors = forecasting_factors.x if fitted else forecasting_factors_init_guess
 
-        utils.colors(2,50,"CUSUM DES Smoothing factor:     " + str(self.__smoothing_factor),8)
-        utils.colors(3,50,"CUSUM DES Trend factor:         " + str(self.__trend_factor),8)
+        # smoothing training values with the estimated factors: next forecasts follow the last one
+        self.__sse(training_values, factors[0], factors[1], smoothed_value, trend_value)
+
+        if self.__row is not None:
+            utils.colors(self.__row + 2,50,"CUSUM DES Smoothing factor:     " + str(self.__smoothing_factor),8)
+            utils.colors(self.__row + 3,50,"CUSUM DES Trend factor:         " + str(self.__trend_factor),8)
+
+        return fitted
 
     def get_smoothed_value(self) -> float:
         return self.__smoothed_value + self.__trend_value
@@ -210,9 +257,118 @@ class DoubleExponentialSmoothing(ExponentialSmoothing):
             self.__trend_factor
         )
 
-        forecasted_values = [smoothing.forecast(self.__smoothed_value+self.__trend_value)]
+        # each forecast is taken as the next value: the trend is followed
+        forecasted_values = [self.__smoothed_value + self.__trend_value]
 
         for i in range(intervals-1):
             forecasted_values.append(smoothing.forecast(forecasted_values[-1]))
 
         return forecasted_values
+
+
+class AttackForecast:
+    """
+    Forecasts the values analyzed by a detector (the attack intensity) and its z values while under attack,
+    and estimates in how many intervals the attack ends.
+    Both double exponential smoothings are fitted once on the first training_size intervals of an attack,
+    then updated in constant time every interval.
+    """
+
+    __slots__ = ("__horizon", "__training_size", "__z_smoothing", "__value_smoothing", "__z_values", "__values",
+                 "__normal_value", "started")
+
+    def __init__(self, horizon: int = 6, training_size: int = 4):
+        """
+        :param horizon: number of intervals forecasted
+        :param training_size: number of intervals used to fit the smoothing factors (at least 2)
+        """
+
+        self.__horizon = horizon
+        self.__training_size = max(training_size, 2)
+
+        # smoothing function for forecasting z values under attack
+        self.__z_smoothing = DoubleExponentialSmoothing(row=None)
+
+        # smoothing function for forecasting analyzed values under attack
+        self.__value_smoothing = DoubleExponentialSmoothing(row=None)
+
+        # first z values and analyzed values of the attack, used for fitting
+        self.__z_values = []
+        self.__values = []
+
+        # highest value considered normal by the detector
+        self.__normal_value = 0
+
+        # True when the smoothing factors are fitted and forecasts are available
+        self.started = False
+
+    def update(self, value: float, z: float, normal_value: float):
+        """
+        Adds the values of an interval under attack
+
+        :param value: value analyzed by the detector
+        :param z: z value computed by the detector
+        :param normal_value: highest value that would give a non positive z
+        """
+
+        self.__normal_value = normal_value
+
+        if self.started:
+            self.__z_smoothing.forecast(z)
+            self.__value_smoothing.forecast(value)
+            return
+
+        self.__z_values.append(z)
+        self.__values.append(value)
+
+        if len(self.__values) == self.__training_size:
+            self.__z_smoothing.initialize(self.__z_values)
+            self.__value_smoothing.initialize(self.__values)
+            self.started = True
+
+    def reset(self):
+        """
+        Discards the forecasts when the attack ends
+        """
+
+        if self.started or len(self.__values) > 0:
+            self.__z_values.clear()
+            self.__values.clear()
+            self.started = False
+
+    def get_values(self) -> list:
+        """
+        Returns the forecasted values of next horizon intervals, an empty list if not started
+        """
+
+        if not self.started:
+            return []
+
+        # analyzed values (counts and ratios) are never negative, the trend could be
+        return [max(value, 0) for value in self.__value_smoothing.forecast_for(self.__horizon)]
+
+    def get_z(self) -> list:
+        """
+        Returns the forecasted z values of next horizon intervals, an empty list if not started
+        """
+
+        return self.__z_smoothing.forecast_for(self.__horizon) if self.started else []
+
+    def get_end(self):
+        """
+        Returns in how many intervals the attack is expected to end: the first forecasted value
+        back to normal, None if not started or not expected within horizon intervals
+        """
+
+        for n, value in enumerate(self.get_values()):
+            if value <= self.__normal_value:
+                return n + 1
+
+        return None
+
+    def get_state(self) -> dict:
+        return {
+            "values": [float(value) for value in self.get_values()],
+            "z": [float(z) for z in self.get_z()],
+            "end": self.get_end()
+        }
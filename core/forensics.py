@@ -0,0 +1,239 @@
+from array import array
+from datetime import datetime
+import os
+import re
+import struct
+import threading
+
+# pcap file header and record header (microsecond timestamps)
+PCAP_HEADER = struct.Struct("<IHHiIII")
+PCAP_RECORD = struct.Struct("<IIII")
+PCAP_MAGIC = 0xA1B2C3D4
+
+
+class PacketRing:
+    """
+    Circular buffer of the last raw frames truncated to snaplen bytes, preallocated in fixed size slots
+    so that memory never exceeds its capacity: recording a frame copies its headers into the next slot,
+    without allocating anything.
+    While dumping, a background writer appends the slots to a pcap file starting from the oldest one
+    (the frames before the trigger) and following new frames; slots not written yet are never overwritten,
+    frames are dropped instead (or the recording waits for the writer, for offline analyses).
+    """
+
+    def __init__(self, capacity: int, snaplen: int = 128, wait: bool = False):
+        """
+        :param capacity: bytes of frames kept
+        :param snaplen: bytes kept of each frame
+        :param wait: wait for the writer instead of dropping frames when the ring is full while dumping
+        """
+
+        self.snaplen = snaplen
+        self.slots = max(capacity // snaplen, 1)
+        self.__wait = wait
+
+        self.__data = bytearray(self.slots * snaplen)
+        self.__view = memoryview(self.__data)
+        self.__timestamps = array("d", bytes(8 * self.slots))
+        self.__captured = array("I", bytes(4 * self.slots))
+        self.__lengths = array("I", bytes(4 * self.slots))
+        self.__linktypes = array("I", bytes(4 * self.slots))
+
+        # frames recorded and written by the dump writer so far
+        self.recorded = 0
+        self.written = 0
+
+        self.dropped = 0
+        self.skipped = 0
+
+        self.dumping = False
+        self.path = None
+        self.__end = None
+        self.__writer = None
+        # dump handover between start_dump and the exiting writer
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__space = threading.Event()
+
+    def record(self, timestamp: float, linktype: int, frame: bytes):
+        recorded = self.recorded
+
+        if self.dumping and recorded - self.written >= self.slots:
+            # full of frames to dump
+            if not self.__wait:
+                self.dropped += 1
+                return
+
+            while self.dumping and recorded - self.written >= self.slots:
+                self.__space.clear()
+                self.__wakeup.set()
+                self.__space.wait(0.1)
+
+        slot = recorded % self.slots
+        start = slot * self.snaplen
+        length = len(frame)
+        captured = length if length < self.snaplen else self.snaplen
+
+        self.__view[start:start + captured] = frame[:captured] if captured < length else frame
+        self.__timestamps[slot] = timestamp
+        self.__captured[slot] = captured
+        self.__lengths[slot] = length
+        self.__linktypes[slot] = linktype
+
+        self.recorded = recorded + 1
+
+    def start_dump(self, path: str) -> str:
+        """
+        Starts writing the frames in the ring and the next ones to a pcap file,
+        a dump still running (e.g. the previous attack is being written) continues instead
+
+        :return: the path of the file being written
+        """
+
+        with self.__lock:
+            if self.dumping:
+                self.__end = None
+                return self.path
+
+            if self.__writer is not None:
+                # the previous writer has completed its dump and is closing the file
+                self.__writer.join()
+
+            self.path = path
+            self.__end = None
+            self.written = max(self.recorded - self.slots, 0)
+            self.dumping = True
+
+            self.__writer = threading.Thread(target=self.__write, args=(path,), daemon=True)
+            self.__writer.start()
+
+        return path
+
+    def stop_dump(self):
+        """
+        Stops the dump at the last recorded frame, the writer completes it in background
+        """
+
+        with self.__lock:
+            if self.dumping:
+                self.__end = self.recorded
+                self.__wakeup.set()
+
+    def join(self):
+        """
+        Stops the dump and waits for the writer to complete it
+        """
+
+        self.stop_dump()
+
+        if self.__writer is not None:
+            self.__writer.join()
+
+    def __write(self, path: str):
+        linktype = None
+
+        try:
+            with open(path, "wb") as output:
+                while True:
+                    end = self.__end
+                    last = self.recorded if end is None else end
+
+                    while self.written < last:
+                        slot = self.written % self.slots
+
+                        if linktype is None:
+                            # a pcap file has a single link type, the one of the first frame
+                            linktype = self.__linktypes[slot]
+                            output.write(PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, self.snaplen, linktype))
+
+                        if self.__linktypes[slot] == linktype:
+                            timestamp = self.__timestamps[slot]
+                            seconds = int(timestamp)
+                            start = slot * self.snaplen
+
+                            output.write(PCAP_RECORD.pack(seconds, int((timestamp - seconds) * 1000000),
+                                                          self.__captured[slot], self.__lengths[slot]))
+                            output.write(self.__view[start:start + self.__captured[slot]])
+                        else:
+                            self.skipped += 1
+
+                        self.written += 1
+                        self.__space.set()
+
+                    if end is not None:
+                        # the dump may have been continued (or stopped further) since end was read
+                        with self.__lock:
+                            if self.__end is not None and self.written >= self.__end:
+                                self.dumping = False
+                                return
+                        continue
+
+                    self.__wakeup.wait(0.1)
+                    self.__wakeup.clear()
+        finally:
+            with self.__lock:
+                self.dumping = False
+            self.__space.set()
+
+    def get_state(self) -> dict:
+        return {
+            "slots": self.slots,
+            "snaplen": self.snaplen,
+            "recorded": self.recorded,
+            "dumping": self.dumping,
+            "path": self.path,
+            "dropped": self.dropped
+        }
+
+
+class ForensicCapture:
+    """
+    Packet rings of every target, dumped to pcap files in a directory when attacks are detected
+    """
+
+    def __init__(self, directory: str, capacity: int = 32 << 20, snaplen: int = 128, wait: bool = False):
+        """
+        :param directory: directory where dumps are written
+        :param capacity: bytes of frames kept by the ring of each target
+        :param snaplen: bytes kept of each frame (headers)
+        :param wait: wait for writers instead of dropping frames, so that offline dumps are complete
+        """
+
+        self.directory = directory
+        self.capacity = capacity
+        self.snaplen = snaplen
+        self.__wait = wait
+
+        self.__rings = {}
+
+    def add_ring(self, name: str) -> PacketRing:
+        ring = PacketRing(self.capacity, self.snaplen, self.__wait)
+        self.__rings[name] = ring
+
+        return ring
+
+    def start_dump(self, name: str, timestamp: float) -> str:
+        """
+        Starts dumping the ring of a target to a file named after the target and the attack start
+
+        :return: path of the dump
+        """
+
+        path = os.path.join(self.directory, "%s-%s.pcap" % (
+            re.sub(r"[^\w.-]", "_", name), datetime.fromtimestamp(timestamp).strftime("%Y%m%d-%H%M%S")))
+
+        return self.__rings[name].start_dump(path)
+
+    def stop_dump(self, name: str):
+        self.__rings[name].stop_dump()
+
+    def get_state(self) -> dict:
+        return {name: ring.get_state() for name, ring in self.__rings.items()}
+
+    def close(self):
+        """
+        Completes the running dumps
+        """
+
+        for ring in self.__rings.values():
+            ring.join()
@@ -68,11 +68,14 @@ class Graph():
         # Check if there is volume values to write
         while len(self.tcp_queue) > 0:
 
-            # Retrieve timestamp,values from <timestamp:[data]>
-            timestamp, values = heapq.heappop(self.tcp_queue)
+            # Retrieve timestamp,values,tags,measurement from <timestamp:[data]:[tags]:measurement>
+            timestamp, values, tags, measurement = heapq.heappop(self.tcp_queue)
 
             # Create point with [data] and write it to bucket bucket_name
-            p_syn = influxdb_client.Point("data_interval")
+            p_syn = influxdb_client.Point(measurement)
+
+            for label, value in tags:
+                p_syn.tag(label, value)
 
             for label, value in values:
                 p_syn.field(label, value)
@@ -85,15 +88,28 @@ class Graph():
                 self.stop_writing_thread()
                 raise Exception("[Graph mode] - Error while writing to influxdb instance: check your service or .ini file!")
 
-    def update_data(self, data: tuple, timestamp: int):
+    def update_data(self, data: tuple, timestamp: int, tags: tuple = (), measurement: str = "data_interval"):
         """
         Insert data (TCP volume,threshold, SYN volume, ACK volume) into shared priority queue
 
         :param data: a tuple of data to add, each element in data is a tuple of two elements (label:str, value:Any)
         :param timestamp: the time of record
+        :param tags: a tuple of tags identifying the record source (e.g. the interface), each element in tags
+                     is a tuple of two elements (label:str, value:str)
+        :param measurement: the measurement name of the record
+        """
+
+        heapq.heappush(self.tcp_queue, (timestamp, data, tags, measurement))
+
+    def instrument(self, profiler):
+        """
+        Measures writing durations and queue depth with given profiler
+
+        :param profiler: a core.profiling.Profiler instance
         """
 
-        heapq.heappush(self.tcp_queue, (timestamp, data))
+        self.__write_data = profiler.wrap("graph", self.__write_data)
+        profiler.gauge("graph_queue", lambda: len(self.tcp_queue))
 
     def stop_writing_thread(self):
         """
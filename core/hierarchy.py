@@ -0,0 +1,287 @@
+import collections
+import ipaddress
+import numpy as np
+from .compact import CompactNPCusumDetector, NPCusumParameters, CompactCusumDetector, CusumParameters
+
+
+class PrefixNode:
+    """
+    A host or prefix of the hierarchy with its own detector
+    """
+
+    __slots__ = ("name", "detector", "idle", "attack")
+
+    def __init__(self, name: str, detector):
+        self.name = name
+        self.detector = detector
+
+        # consecutive intervals without SYNs
+        self.idle = 0
+
+        # attack event of the node, while under attack
+        self.attack = None
+
+
+class PrefixHierarchy:
+    """
+    SYN and SYN/ACK counts of every host of the monitored networks, rolled up to shorter prefixes
+    (e.g. /24 and /16) when the interval is closed, with a compact detector for each host and prefix:
+    attacks spread over many hosts of a subnet are seen by the detector of the prefix.
+    Per packet only the host counters of addresses in the monitored networks are increased, for at most
+    max_hosts hosts per interval (further hosts are counted by their longest prefix, e.g. under a flood
+    towards random destinations); at interval close each level is aggregated by a single NumPy pass
+    over the hosts seen in the interval.
+    Nodes are created when they get at least min_syn SYNs in an interval and pruned after idle_intervals
+    intervals without SYNs (unless under attack), so detectors are kept only for active hosts and prefixes.
+    """
+
+    def __init__(self, networks, prefixes=(24, 16), ipv6_prefixes=(64, 48), parametric=False, threshold=5.0,
+                 clock=None, min_syn=10, idle_intervals=12, max_nodes=65536, max_hosts=65536, attacks_history=100):
+        """
+        :param networks: monitored networks (e.g. "10.0.0.0/16"), SYNs to other hosts are ignored
+        :param prefixes: IPv4 prefix lengths above hosts
+        :param ipv6_prefixes: IPv6 prefix lengths above hosts, at most 64
+        :param parametric: parametric detection of SYN counts instead of non parametric detection of SYN/ACK deficit
+        :param threshold: parametric detection threshold
+        :param clock: clock stamping attacks start and end
+        :param min_syn: SYNs in an interval needed to create a node (and to compute its ratio)
+        :param idle_intervals: intervals without SYNs after which a node is pruned
+        :param max_nodes: maximum number of nodes, new nodes are not created beyond it
+        :param max_hosts: maximum number of hosts counted in an interval
+        :param attacks_history: attack events kept
+        """
+
+        self.networks = [ipaddress.ip_network(network, strict=False) for network in networks]
+        self.__levels = {
+            4: sorted(set(length for length in prefixes if 0 < length < 32), reverse=True),
+            6: sorted(set(length for length in ipv6_prefixes if 0 < length <= 64), reverse=True)
+        }
+
+        # packed addresses matching each network: (address size, whole prefix bytes, index, mask, value of the
+        # next byte when the prefix length isn't a multiple of 8)
+        self.__matchers = []
+        for network in self.networks:
+            packed = network.network_address.packed
+            whole, bits = divmod(network.prefixlen, 8)
+            mask = (0xFF << (8 - bits)) & 0xFF
+            self.__matchers.append((len(packed), packed[:whole], whole, mask, packed[whole] & mask if bits else 0))
+
+        self.__parametric = parametric
+        # constants shared by all the detectors
+        if parametric:
+            self.__parameters = CusumParameters(threshold=threshold, clock=clock)
+        else:
+            self.__parameters = NPCusumParameters(clock=clock)
+
+        self.__min_syn = min_syn
+        self.__idle_intervals = idle_intervals
+        self.__max_nodes = max_nodes
+        self.__max_hosts = max_hosts
+
+        # SYNs to each host and SYN/ACKs from each host in current interval, by packed address,
+        # and of the hosts beyond max_hosts by their packed longest prefix
+        self.__syn = collections.defaultdict(int)
+        self.__synack = collections.defaultdict(int)
+        self.__prefix_syn = collections.defaultdict(int)
+        self.__prefix_synack = collections.defaultdict(int)
+
+        # nodes by (IP version, prefix length, prefix as integer)
+        self.__nodes = {}
+
+        self.__attacks = collections.deque(maxlen=attacks_history)
+
+        self.created = 0
+        self.pruned = 0
+        self.rejected = 0
+        self.overflows = 0
+
+    def monitored(self, address: bytes) -> bool:
+        """
+        Tells if a packed address belongs to one of the monitored networks
+        """
+
+        for size, prefix, index, mask, value in self.__matchers:
+            if len(address) == size and address.startswith(prefix) and (mask == 0 or address[index] & mask == value):
+                return True
+
+        return False
+
+    def __count_prefix(self, counts: dict, address: bytes):
+        # counted by the longest prefix of the address, if any
+        levels = self.__levels[4 if len(address) == 4 else 6]
+
+        if len(levels) > 0:
+            value = int.from_bytes(address, "big")
+            shift = len(address) * 8 - levels[0]
+            counts[(value >> shift << shift).to_bytes(len(address), "big")] += 1
+
+    def count_syn(self, address: bytes):
+        if address not in self.__syn:
+            if not self.monitored(address):
+                return
+
+            if len(self.__syn) >= self.__max_hosts:
+                # too many hosts in this interval
+                self.overflows += 1
+                self.__count_prefix(self.__prefix_syn, address)
+                return
+
+        self.__syn[address] += 1
+
+    def count_synack(self, address: bytes):
+        # SYN/ACKs are counted by host only for the hosts counting SYNs, so that they stay within max_hosts
+        if address in self.__syn:
+            self.__synack[address] += 1
+        elif self.monitored(address):
+            self.__count_prefix(self.__prefix_synack, address)
+
+    def __rollup(self, version: int, addresses: list, prefix_addresses: list, sampling: int) -> dict:
+        """
+        Aggregates the counts of the hosts of an IP version at every level
+
+        :param addresses: hosts with SYNs
+        :param prefix_addresses: longest prefixes of the hosts counted by prefix
+        :return: (syn, detector input) of every host and prefix with SYNs, by node key
+        """
+
+        bits = 32 if version == 4 else 128
+        hosts = len(addresses)
+
+        syn = np.array([self.__syn.get(address, 0) for address in addresses] +
+                       [self.__prefix_syn.get(address, 0) for address in prefix_addresses],
+                       dtype=np.float64) * sampling
+        synack = np.array([self.__synack.get(address, 0) for address in addresses] +
+                          [self.__prefix_synack.get(address, 0) for address in prefix_addresses],
+                          dtype=np.float64) * sampling
+
+        # IPv4 addresses, or the upper 64 bits of IPv6 ones (prefixes are at most /64), as integers
+        packed = addresses + prefix_addresses
+        if version == 4:
+            keys = np.frombuffer(b"".join(packed), dtype=">u4").astype(np.uint64)
+        else:
+            keys = np.frombuffer(b"".join(address[:8] for address in packed), dtype=">u8").astype(np.uint64)
+        key_bits = 32 if version == 4 else 64
+
+        # hosts level without the hosts counted by prefix
+        levels = [(bits, None, syn[:hosts], synack[:hosts])]
+        for length in self.__levels[version]:
+            prefixes, inverse = np.unique(keys >> np.uint64(key_bits - length), return_inverse=True)
+            levels.append((length, prefixes, np.bincount(inverse, weights=syn, minlength=len(prefixes)),
+                           np.bincount(inverse, weights=synack, minlength=len(prefixes))))
+
+        active = {}
+        for length, prefixes, syn, synack in levels:
+            # SYN count for parametric detection, ratio of SYNs not answered for non parametric detection
+            if self.__parametric:
+                values = syn
+            else:
+                # the ratio of a few SYNs (e.g. answered in the next interval) is noise, taken as 0
+                values = np.maximum(np.divide(syn - synack, syn, out=np.zeros_like(syn),
+                                              where=syn >= self.__min_syn), 0)
+
+            if prefixes is None:
+                prefixes = [int.from_bytes(address, "big") for address in addresses]
+            else:
+                prefixes = prefixes.tolist()
+
+            for prefix, count, value in zip(prefixes, syn.tolist(), values.tolist()):
+                if count > 0:
+                    active[(version, length, prefix)] = (count, value)
+
+        return active
+
+    def __name(self, key: tuple) -> str:
+        version, length, prefix = key
+
+        if version == 4:
+            return str(ipaddress.IPv4Network((prefix << (32 - length), length)))
+
+        return str(ipaddress.IPv6Network((prefix << (128 - length), length)))
+
+    def close(self, sampling: int = 1) -> list:
+        """
+        Updates the detector of every node with the counts of the interval, creating and pruning nodes,
+        and resets the host counters
+
+        :param sampling: counts are multiplied by the sampling rate
+        :return: names of the nodes under attack
+        """
+
+        active = {}
+        for version, length in ((4, 4), (6, 16)):
+            addresses = [address for address in self.__syn if len(address) == length]
+            prefix_addresses = [address for address in self.__prefix_syn.keys() | self.__prefix_synack.keys()
+                                if len(address) == length]
+            if len(addresses) + len(prefix_addresses) > 0:
+                active.update(self.__rollup(version, addresses, prefix_addresses, sampling))
+
+        self.__syn.clear()
+        self.__synack.clear()
+        self.__prefix_syn.clear()
+        self.__prefix_synack.clear()
+
+        attacks = []
+
+        for key, node in list(self.__nodes.items()):
+            count, value = active.pop(key, (0, 0.0))
+            self.__update(node, value)
+
+            if count > 0:
+                node.idle = 0
+            else:
+                node.idle += 1
+
+            if node.detector.under_attack():
+                attacks.append(node.name)
+            elif node.idle > self.__idle_intervals:
+                del self.__nodes[key]
+                self.pruned += 1
+
+        for key, (count, value) in active.items():
+            if count < self.__min_syn:
+                continue
+
+            if len(self.__nodes) >= self.__max_nodes:
+                self.rejected += 1
+                continue
+
+            if self.__parametric:
+                detector = CompactCusumDetector(self.__parameters)
+            else:
+                detector = CompactNPCusumDetector(self.__parameters)
+
+            node = self.__nodes[key] = PrefixNode(self.__name(key), detector)
+            self.created += 1
+            self.__update(node, value)
+
+        return attacks
+
+    def __update(self, node: PrefixNode, value: float):
+        detector = node.detector
+        detector.update(value)
+
+        if detector.under_attack() and node.attack is None:
+            node.attack = {"prefix": node.name, "start": detector.get_time_start(), "end": 0}
+            self.__attacks.append(node.attack)
+
+        elif not detector.under_attack() and node.attack is not None:
+            node.attack["end"] = detector.get_time_end()
+            node.attack = None
+
+    def get_attacks(self) -> list:
+        """
+        Returns the last attack events of hosts and prefixes, oldest first (end is 0 while under attack)
+        """
+
+        return list(self.__attacks)
+
+    def get_state(self) -> dict:
+        return {
+            "nodes": len(self.__nodes),
+            "created": self.created,
+            "pruned": self.pruned,
+            "rejected": self.rejected,
+            "overflows": self.overflows,
+            "under_attack": sorted(node.name for node in self.__nodes.values() if node.detector.under_attack()),
+            "attacks": self.get_attacks()
+        }
@@ -0,0 +1,190 @@
+import socket
+from .pcap import CHUNK_SIZE, read_stream, decompress
+
+# TCP flags
+FIN = 0x01
+SYN = 0x02
+RST = 0x04
+ACK = 0x10
+
+# link types (see https://www.tcpdump.org/linktypes.html)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# ethernet types
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88A8
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+# IPv6 extension headers that can precede the TCP header
+IPV6_HOP_BY_HOP = 0
+IPV6_ROUTING = 43
+IPV6_FRAGMENT = 44
+IPV6_AH = 51
+IPV6_DEST_OPTS = 60
+IPV6_EXTENSION_HEADERS = frozenset((IPV6_HOP_BY_HOP, IPV6_ROUTING, IPV6_FRAGMENT, IPV6_AH, IPV6_DEST_OPTS))
+
+
+def pack_address(address: str) -> bytes:
+    """
+    Converts an IPv4/IPv6 address into its packed representation (4 or 16 bytes),
+    the one used to match addresses read from packets
+
+    :param address: address in text form, IPv6 scope (e.g. %eth0) is ignored
+    :return: packed address
+    """
+
+    address = address.split("%")[0]
+
+    if ":" in address:
+        return socket.inet_pton(socket.AF_INET6, address)
+
+    return socket.inet_pton(socket.AF_INET, address)
+
+
+def unpack_address(address: bytes) -> str:
+    """
+    Converts a packed IPv4/IPv6 address read from a packet into its text form
+
+    :param address: packed address (4 or 16 bytes)
+    :return: address in text form
+    """
+
+    if len(address) == 16:
+        return socket.inet_ntop(socket.AF_INET6, address)
+
+    return socket.inet_ntop(socket.AF_INET, address)
+
+
+def network_offset(frame: bytes, linktype: int) -> int:
+    """
+    Finds where the network layer begins in a frame
+
+    :param frame: raw frame
+    :param linktype: link type of the frame
+    :return: offset of the IPv4/IPv6 header, -1 if the frame doesn't carry an IP packet
+    """
+
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        eth_type = (frame[12] << 8) | frame[13]
+
+        # skipping VLAN tags
+        while eth_type == ETH_P_8021Q or eth_type == ETH_P_8021AD:
+            offset += 4
+            eth_type = (frame[offset] << 8) | frame[offset + 1]
+
+        if eth_type == ETH_P_IP or eth_type == ETH_P_IPV6:
+            return offset + 2
+
+        return -1
+
+    if linktype == LINKTYPE_RAW or linktype == LINKTYPE_IPV4 or linktype == LINKTYPE_IPV6:
+        return 0
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        # Linux "any" interface captures: protocol type at the end of the 16 bytes header
+        eth_type = (frame[14] << 8) | frame[15]
+        return 16 if eth_type == ETH_P_IP or eth_type == ETH_P_IPV6 else -1
+
+    if linktype == LINKTYPE_LINUX_SLL2:
+        # protocol type at the beginning of the 20 bytes header
+        eth_type = (frame[0] << 8) | frame[1]
+        return 20 if eth_type == ETH_P_IP or eth_type == ETH_P_IPV6 else -1
+
+    return -1
+
+
+def classify(frame: bytes, linktype: int):
+    """
+    Extracts from a raw frame only the fields needed to classify packets,
+    without building any packet object.
+    IPv4 is checked first, IPv6 extension headers chain is walked until the transport header.
+
+    :param frame: raw frame
+    :param linktype: link type of the frame
+    :return: (transport protocol, TCP flags, packed source address, packed destination address,
+             transport header offset) or None if it is not an IP packet or it is a non first fragment.
+             TCP flags are 0 for protocols other than TCP.
+    """
+
+    try:
+        offset = network_offset(frame, linktype)
+
+        if offset < 0:
+            return None
+
+        version = frame[offset] >> 4
+
+        if version == 4:
+            # skipping non first fragments
+            if (frame[offset + 6] & 0x1F) | frame[offset + 7]:
+                return None
+
+            protocol = frame[offset + 9]
+            transport = offset + ((frame[offset] & 0x0F) << 2)
+
+            return (
+                protocol,
+                frame[transport + 13] if protocol == IPPROTO_TCP else 0,
+                frame[offset + 12:offset + 16],
+                frame[offset + 16:offset + 20],
+                transport
+            )
+
+        if version == 6:
+            next_header = frame[offset + 6]
+            position = offset + 40
+
+            while next_header in IPV6_EXTENSION_HEADERS:
+                if next_header == IPV6_FRAGMENT:
+                    if ((frame[position + 2] << 8) | frame[position + 3]) & 0xFFF8:
+                        # non first fragment
+                        return None
+
+                    length = 8
+                elif next_header == IPV6_AH:
+                    length = (frame[position + 1] + 2) << 2
+                else:
+                    length = (frame[position + 1] + 1) << 3
+
+                next_header = frame[position]
+                position += length
+
+            return (
+                next_header,
+                frame[position + 13] if next_header == IPPROTO_TCP else 0,
+                frame[offset + 8:offset + 24],
+                frame[offset + 24:offset + 40],
+                position
+            )
+
+    except IndexError:
+        # truncated frame
+        pass
+
+    return None
+
+
+def read_capture(path: str, threaded: bool = False):
+    """
+    Reads a pcap/pcapng capture, possibly compressed, without dissecting packets (see core.pcap)
+
+    :param path: capture file path
+    :param threaded: decompress compressed captures on a background thread
+    :return: a generator of (timestamp, link type, raw frame) tuples
+    :raise CaptureError: if the file isn't a pcap/pcapng capture
+    """
+
+    with open(path, "rb", buffering=CHUNK_SIZE) as capture, decompress(capture, threaded) as stream:
+        yield from read_stream(stream)
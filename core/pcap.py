@@ -0,0 +1,412 @@
+import gzip
+import lzma
+import queue
+import struct
+import threading
+import zlib
+
+# pcap file header magic numbers (microsecond and nanosecond timestamps)
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NANO = 0xA1B23C4D
+
+# pcapng block types
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_OBSOLETE_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# pcapng interface description options
+PCAPNG_OPTION_END = 0
+PCAPNG_OPTION_TSRESOL = 9
+PCAPNG_OPTION_TSOFFSET = 14
+
+# bytes read from the capture at once
+CHUNK_SIZE = 1 << 20
+
+# compressed files magic numbers
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+class CaptureError(ValueError):
+    """
+    Raised when a capture is not a valid pcap/pcapng file
+    """
+
+    pass
+
+
+class CaptureBuffer:
+    """
+    Large reads from a binary stream (a file or a decompressor) parsed in place:
+    records are read from buffer starting at position, refilled when fewer bytes are left
+    """
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE):
+        self.__stream = stream
+        self.__chunk_size = chunk_size
+
+        self.buffer = b""
+        self.position = 0
+
+    def fill(self, size: int) -> bool:
+        """
+        Makes at least size bytes available from position
+
+        :return: False if the stream ended before
+        """
+
+        pending = [self.buffer[self.position:]]
+        available = len(pending[0])
+
+        # streams may return less than requested before their end (e.g. decompressors)
+        while available < size:
+            data = self.__stream.read(max(self.__chunk_size, size - available))
+            if not data:
+                break
+
+            pending.append(data)
+            available += len(data)
+
+        self.buffer = b"".join(pending)
+        self.position = 0
+
+        return available >= size
+
+
+def read_pcap(capture: CaptureBuffer):
+    """
+    Reads the records of a pcap capture, header included
+
+    :param capture: buffer positioned at the file header
+    :return: a generator of (timestamp, link type, raw frame) tuples
+    """
+
+    if not capture.fill(24):
+        raise CaptureError("truncated pcap header")
+
+    for order in "<>":
+        magic, = struct.unpack_from(order + "I", capture.buffer)
+
+        if magic == PCAP_MAGIC or magic == PCAP_MAGIC_NANO:
+            break
+    else:
+        raise CaptureError("not a pcap capture")
+
+    scale = 1e-9 if magic == PCAP_MAGIC_NANO else 1e-6
+    linktype, = struct.unpack_from(order + "I", capture.buffer, 20)
+    # upper bits of the link type field carry FCS information
+    linktype &= 0x0FFFFFFF
+
+    record = struct.Struct(order + "IIII")
+    unpack = record.unpack_from
+    capture.position = 24
+
+    while True:
+        buffer = capture.buffer
+        position = capture.position
+
+        if position + 16 > len(buffer):
+            if not capture.fill(16):
+                # end of capture (or a record header truncated by an interrupted capture)
+                return
+            continue
+
+        seconds, fraction, captured, length = unpack(buffer, position)
+        end = position + 16 + captured
+
+        if end > len(buffer):
+            if not capture.fill(16 + captured):
+                return
+            continue
+
+        capture.position = end
+
+        # frames are at most captured bytes long, as truncated by the snaplen
+        yield seconds + fraction * scale, linktype, buffer[position + 16:end]
+
+
+class Interface:
+    """
+    Link type and timestamp units of a pcapng interface
+    """
+
+    __slots__ = ("linktype", "snaplen", "resolution", "offset")
+
+    def __init__(self, linktype: int, snaplen: int):
+        self.linktype = linktype
+        self.snaplen = snaplen
+
+        # timestamp units per second (microseconds by default) and seconds added to timestamps
+        self.resolution = 1000000
+        self.offset = 0
+
+    def read_options(self, options: bytes, order: str):
+        position = 0
+
+        while position + 4 <= len(options):
+            code, length = struct.unpack_from(order + "HH", options, position)
+            position += 4
+
+            if code == PCAPNG_OPTION_END:
+                break
+
+            if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+                # power of 10, or of 2 if the most significant bit is set
+                value = options[position]
+                self.resolution = 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+
+            elif code == PCAPNG_OPTION_TSOFFSET and length >= 8:
+                self.offset, = struct.unpack_from(order + "q", options, position)
+
+            # option values are padded to 32 bits
+            position += (length + 3) & ~3
+
+
+def read_pcapng(capture: CaptureBuffer):
+    """
+    Reads the packets of a pcapng capture: enhanced, simple and obsolete packet blocks
+    of any interface, each with its own link type and timestamp resolution.
+    Other blocks are skipped.
+
+    :param capture: buffer positioned at the first section header block
+    :return: a generator of (timestamp, link type, raw frame) tuples
+    """
+
+    order = "<"
+    block_header = struct.Struct("<II")
+    enhanced = struct.Struct("<IIIII")
+    interfaces = []
+    timestamp = 0
+
+    try:
+        while True:
+            buffer = capture.buffer
+            position = capture.position
+
+            if position + 12 > len(buffer):
+                if not capture.fill(12):
+                    return
+                continue
+
+            block_type, = struct.unpack_from("<I", buffer, position)
+
+            if block_type == PCAPNG_SECTION_HEADER:
+                # each section sets its own byte order and interfaces
+                byte_order = buffer[position + 8:position + 12]
+                if byte_order == struct.pack("<I", PCAPNG_BYTE_ORDER_MAGIC):
+                    order = "<"
+                elif byte_order == struct.pack(">I", PCAPNG_BYTE_ORDER_MAGIC):
+                    order = ">"
+                else:
+                    raise CaptureError("invalid pcapng byte order magic")
+
+                block_header = struct.Struct(order + "II")
+                enhanced = struct.Struct(order + "IIIII")
+                interfaces = []
+
+            block_type, block_length = block_header.unpack_from(buffer, position)
+
+            if block_length < 12 or block_length & 3:
+                raise CaptureError("invalid pcapng block length %d" % block_length)
+
+            end = position + block_length
+
+            if end > len(buffer):
+                if not capture.fill(block_length):
+                    # block truncated by an interrupted capture
+                    return
+                continue
+
+            capture.position = end
+            body = position + 8
+
+            if block_type == PCAPNG_ENHANCED_PACKET:
+                interface_id, high, low, captured, length = enhanced.unpack_from(buffer, body)
+                interface = interfaces[interface_id]
+                timestamp = ((high << 32) | low) / interface.resolution + interface.offset
+
+                # frames are at most captured bytes long, as truncated by the snaplen
+                yield timestamp, interface.linktype, buffer[body + 20:body + 20 + captured]
+
+            elif block_type == PCAPNG_SIMPLE_PACKET:
+                # no timestamp (packets get the time of the previous one) nor captured length
+                length, = struct.unpack_from(order + "I", buffer, body)
+                interface = interfaces[0]
+                captured = min(length, block_length - 16, interface.snaplen or length)
+
+                yield timestamp, interface.linktype, buffer[body + 4:body + 4 + captured]
+
+            elif block_type == PCAPNG_OBSOLETE_PACKET:
+                interface_id, drops, high, low, captured, length = struct.unpack_from(order + "HHIIII", buffer,
+                                                                                      body)
+                interface = interfaces[interface_id]
+                timestamp = ((high << 32) | low) / interface.resolution + interface.offset
+
+                yield timestamp, interface.linktype, buffer[body + 20:body + 20 + captured]
+
+            elif block_type == PCAPNG_INTERFACE_DESCRIPTION:
+                linktype, reserved, snaplen = struct.unpack_from(order + "HHI", buffer, body)
+                interface = Interface(linktype, snaplen)
+                interface.read_options(buffer[body + 8:end - 4], order)
+                interfaces.append(interface)
+
+    except (IndexError, struct.error) as e:
+        raise CaptureError("malformed pcapng block: %s" % e)
+
+
+def read_stream(stream):
+    """
+    Reads a pcap or pcapng capture from a binary stream, recognizing its format
+
+    :return: a generator of (timestamp, link type, raw frame) tuples
+    :raise CaptureError: if the stream isn't a pcap/pcapng capture
+    """
+
+    capture = CaptureBuffer(stream)
+
+    if not capture.fill(4):
+        raise CaptureError("empty capture")
+
+    magic, = struct.unpack_from("<I", capture.buffer)
+
+    if magic == PCAPNG_SECTION_HEADER:
+        return read_pcapng(capture)
+
+    return read_pcap(capture)
+
+
+def decompressed_chunks(stream, decompressor_factory, chunk_size: int = CHUNK_SIZE):
+    """
+    Decompresses a stream in large chunks with decompressor objects, that release the GIL while working.
+    Concatenated compressed streams (e.g. multi member gzip) are decompressed one after the other.
+
+    :param stream: compressed binary stream
+    :param decompressor_factory: function returning a new decompressor object
+    :return: a generator of decompressed chunks
+    """
+
+    decompressor = decompressor_factory()
+
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            return
+
+        while data:
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+
+            if not getattr(decompressor, "eof", False):
+                break
+
+            data = decompressor.unused_data
+            decompressor = decompressor_factory()
+
+
+class ThreadedReader:
+    """
+    Produces chunks (e.g. decompressed ones) on a background thread, so that decompression overlaps parsing:
+    chunks are handed over through a bounded queue, the thread stops when the reader is closed
+    """
+
+    def __init__(self, chunks, queue_size: int = 8):
+        """
+        :param chunks: iterable of byte strings
+        :param queue_size: chunks produced ahead of the parser
+        """
+
+        self.__chunks = queue.Queue(maxsize=queue_size)
+        self.__closed = threading.Event()
+        self.__ended = False
+
+        self.__thread = threading.Thread(target=self.__produce, args=(chunks,), daemon=True)
+        self.__thread.start()
+
+    def __produce(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self.__put(chunk):
+                    return
+            self.__put(b"")
+        except Exception as e:
+            # raised again by read in the parsing thread
+            self.__put(e)
+
+    def __put(self, item) -> bool:
+        while not self.__closed.is_set():
+            try:
+                self.__chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Returns the next chunk, whatever its size: CaptureBuffer reads until it has enough bytes
+        """
+
+        if self.__ended:
+            return b""
+
+        chunk = self.__chunks.get()
+
+        if isinstance(chunk, Exception):
+            self.__ended = True
+            raise chunk
+
+        if not chunk:
+            self.__ended = True
+
+        return chunk
+
+    def close(self):
+        self.__closed.set()
+        self.__thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def decompress(stream, threaded: bool = False):
+    """
+    Decompresses a capture as a stream if compressed with gzip, zstd or xz
+    (recognized by their magic numbers, whatever the file extension)
+
+    :param stream: buffered binary file, not closed by closing the returned stream
+    :param threaded: decompress on a background thread
+    :return: a binary stream, the given one if not compressed
+    :raise ImportError: if the zstandard package is needed and missing
+    """
+
+    magic = stream.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)]
+
+    if magic.startswith(GZIP_MAGIC):
+        factory = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+        opener = lambda: gzip.GzipFile(fileobj=stream)
+    elif magic.startswith(XZ_MAGIC):
+        factory = lzma.LZMADecompressor
+        opener = lambda: lzma.LZMAFile(stream)
+    elif magic.startswith(ZSTD_MAGIC):
+        import zstandard
+        decompressor = zstandard.ZstdDecompressor()
+        factory = decompressor.decompressobj
+        opener = lambda: decompressor.stream_reader(stream, read_size=CHUNK_SIZE, read_across_frames=True,
+                                                   closefd=False)
+    else:
+        # not compressed: nothing to overlap
+        return stream
+
+    if threaded:
+        return ThreadedReader(decompressed_chunks(stream, factory))
+
+    return opener()
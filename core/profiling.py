@@ -0,0 +1,256 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import socket
+import struct
+import sys
+import threading
+import time
+
+# packet sockets statistics option (see packet(7))
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+
+class Histogram:
+    """
+    Histogram of durations in nanoseconds with power of two buckets:
+    recording costs a bit_length and an increment
+    """
+
+    BUCKETS = 48
+
+    def __init__(self):
+        self.buckets = [0] * Histogram.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        self.buckets[min(ns.bit_length(), Histogram.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p: float) -> int:
+        """
+        Returns an upper bound of the p-th percentile
+
+        :param p: percentile in [0, 100]
+        :return: upper bound of the bucket containing the percentile in nanoseconds
+        """
+
+        if self.count == 0:
+            return 0
+
+        rank = self.count * p / 100
+        cumulative = 0
+
+        for n, bucket in enumerate(self.buckets):
+            cumulative += bucket
+            if cumulative >= rank:
+                return min(1 << n, self.max)
+
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0
+
+
+class Profiler:
+    """
+    Collects per stage durations, interval close jitter and queue depths.
+    Stages are measured by wrapping the functions implementing them, so when profiling
+    is not enabled nothing is wrapped and there is no overhead.
+    """
+
+    def __init__(self):
+        self.__stages = {}
+        self.__gauges = {}
+        self.__jitter = Histogram()
+        self.__started = time.time()
+
+        self.__stopped = threading.Event()
+        self.__server = None
+
+    def stage(self, name: str) -> Histogram:
+        if name not in self.__stages:
+            self.__stages[name] = Histogram()
+
+        return self.__stages[name]
+
+    def wrap(self, name: str, function):
+        """
+        Returns given function instrumented to record its durations in the name stage
+
+        :param name: stage name
+        :param function: the function implementing the stage
+        """
+
+        record = self.stage(name).record
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(clock() - start)
+
+        return wrapper
+
+    def gauge(self, name: str, function):
+        """
+        Registers a value read every time statistics are reported (e.g. a queue depth)
+
+        :param name: gauge name
+        :param function: function returning the current value
+        """
+
+        self.__gauges[name] = function
+
+    def socket_gauges(self, name: str, sock):
+        """
+        Registers received and dropped packets counters of a packet socket
+
+        :param name: name used in gauges (e.g. interface name)
+        :param sock: a PF_PACKET socket
+        """
+
+        counters = [0, 0]
+
+        def read(index):
+            try:
+                # statistics are reset by the kernel on every read
+                received, dropped = struct.unpack("II", sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+                counters[0] += received
+                counters[1] += dropped
+            except (OSError, socket.error):
+                pass
+
+            return counters[index]
+
+        self.gauge("capture_received{interface=\"%s\"}" % name, lambda: read(0))
+        self.gauge("capture_dropped{interface=\"%s\"}" % name, lambda: read(1))
+
+    def gauges(self) -> dict:
+        """
+        Returns current values of registered gauges
+        """
+
+        return {name: function() for name, function in self.__gauges.items()}
+
+    def jitter(self, ns: int):
+        """
+        Records how late an interval was closed in relation to its scheduled end
+
+        :param ns: delay in nanoseconds
+        """
+
+        self.__jitter.record(max(ns, 0))
+
+    def report(self) -> str:
+        """
+        Returns a human readable statistics dump
+        """
+
+        elapsed = time.time() - self.__started
+        lines = ["[%s] uptime %.1fs" % (time.strftime("%H:%M:%S"), elapsed)]
+
+        for name, histogram in self.__stages.items():
+            lines.append(
+                "  %-10s count %-10d rate %10.1f/s  mean %8.0fns  p50 %8dns  p99 %8dns  max %8dns" % (
+                    name, histogram.count, histogram.count / elapsed, histogram.mean(),
+                    histogram.percentile(50), histogram.percentile(99), histogram.max
+                )
+            )
+
+        lines.append("  %-10s count %-10d mean %8.0fns  p99 %8dns  max %8dns" % (
+            "jitter", self.__jitter.count, self.__jitter.mean(), self.__jitter.percentile(99), self.__jitter.max
+        ))
+
+        for name, function in self.__gauges.items():
+            lines.append("  %-10s %s" % (name, function()))
+
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """
+        Returns statistics in Prometheus text exposition format
+        """
+
+        lines = [
+            "# TYPE dostect_stage_duration_seconds histogram"
+        ]
+
+        for name, histogram in self.__stages.items():
+            cumulative = 0
+            for n, bucket in enumerate(histogram.buckets):
+                cumulative += bucket
+                if bucket > 0:
+                    lines.append('dostect_stage_duration_seconds_bucket{stage="%s",le="%g"} %d' %
+                                 (name, (1 << n) / 1e9, cumulative))
+            lines.append('dostect_stage_duration_seconds_bucket{stage="%s",le="+Inf"} %d' % (name, histogram.count))
+            lines.append('dostect_stage_duration_seconds_sum{stage="%s"} %g' % (name, histogram.total / 1e9))
+            lines.append('dostect_stage_duration_seconds_count{stage="%s"} %d' % (name, histogram.count))
+
+        lines.append("# TYPE dostect_interval_jitter_seconds summary")
+        for quantile in (0.5, 0.99):
+            lines.append('dostect_interval_jitter_seconds{quantile="%g"} %g' %
+                         (quantile, self.__jitter.percentile(quantile * 100) / 1e9))
+        lines.append("dostect_interval_jitter_seconds_sum %g" % (self.__jitter.total / 1e9))
+        lines.append("dostect_interval_jitter_seconds_count %d" % self.__jitter.count)
+
+        for name, function in self.__gauges.items():
+            lines.append("dostect_%s %s" % (name, function()))
+
+        return "\n".join(lines) + "\n"
+
+    def start_dump(self, interval: float, output=sys.stderr):
+        """
+        Periodically writes statistics dump in a background thread
+
+        :param interval: seconds between dumps
+        :param output: file where dumps are written
+        """
+
+        def dump():
+            while not self.__stopped.wait(interval):
+                output.write(self.report() + "\n")
+                output.flush()
+
+        threading.Thread(target=dump, daemon=True).start()
+
+    def start_server(self, port: int, address: str = "127.0.0.1"):
+        """
+        Serves statistics in Prometheus text format over HTTP in a background thread
+
+        :param port: listening port
+        :param address: listening address, local only by default
+        """
+
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = profiler.prometheus().encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((address, port), Handler)
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.__stopped.set()
+
+        if self.__server is not None:
+            self.__server.shutdown()
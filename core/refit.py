@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from .forecasting import SingleExponentialSmoothing
+import time
+
+
+def fit_smoothing_factor(values: list) -> tuple:
+    """
+    Fits a single exponential smoothing factor on given values
+
+    :param values: the values smoothed by a detector (window means)
+    :return: (smoothing factor, fit duration in seconds) tuple, the factor is None if the fit failed
+    """
+
+    started = time.perf_counter()
+
+    smoothing = SingleExponentialSmoothing(row=None)
+    fitted = smoothing.initialize(values)
+
+    return smoothing.get_smoothing_factor() if fitted else None, time.perf_counter() - started
+
+
+class SmoothingRefitter:
+    """
+    Periodically fits again the smoothing factors of registered detectors over a longer history
+    of the values they smoothed, following baselines drifting over the day.
+    Fits run on a background thread, so that the capture thread is never stalled by SLSQP:
+    every interval close the finished fits are swapped in, all at the same interval boundary,
+    and new ones are started every period intervals.
+    """
+
+    # fewer values than these don't give a meaningful fit
+    MIN_HISTORY = 10
+
+    def __init__(self, period: int = 720, history_size: int = 720, wait: bool = False):
+        """
+        :param period: intervals between fits
+        :param history_size: values of each detector used for fitting
+        :param wait: wait for running fits at interval close, so that offline analyses are reproducible
+        """
+
+        self.period = period
+        self.history_size = history_size
+        self.__wait = wait
+
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dostect-refit")
+
+        # registered detectors and their running fits by name
+        self.__detectors = {}
+        self.__pending = {}
+
+        self.__intervals = 0
+
+        # fits statistics and last factor change of each detector
+        self.fits = 0
+        self.failures = 0
+        self.last_fit_seconds = 0
+        self.max_fit_seconds = 0
+        self.total_fit_seconds = 0
+        self.__changes = {}
+
+        # profiler where the factor of each registered detector is exposed, if instrumented
+        self.__profiler = None
+
+    def register(self, name: str, detector):
+        """
+        Registers a detector keeping a history of its smoothed values (see get_smoothing_history)
+
+        :param name: name used in metrics (e.g. target/syn)
+        :param detector: a CusumDetector or NPCusumDetector
+        """
+
+        self.__detectors[name] = detector
+        self.__changes[name] = 0.0
+
+        if self.__profiler is not None:
+            self.__profiler.gauge("smoothing_factor{detector=\"%s\"}" % name,
+                                  lambda: detector.get_smoothing().get_smoothing_factor())
+            self.__profiler.gauge("smoothing_factor_change{detector=\"%s\"}" % name,
+                                  lambda: self.__changes[name])
+
+    def step(self):
+        """
+        Swaps in the factors of finished fits and starts new fits every period intervals,
+        called by the capture thread when intervals are closed
+        """
+
+        if self.__wait and len(self.__pending) > 0:
+            wait_futures(self.__pending.values())
+
+        for name, future in list(self.__pending.items()):
+            if not future.done():
+                continue
+
+            del self.__pending[name]
+            factor, seconds = future.result()
+            detector = self.__detectors[name]
+
+            if factor is None:
+                # the current factor is kept
+                self.failures += 1
+                self.__changes[name] = 0.0
+            else:
+                self.__changes[name] = factor - detector.get_smoothing().get_smoothing_factor()
+                detector.set_smoothing_factor(factor)
+                self.fits += 1
+
+            self.last_fit_seconds = seconds
+            self.max_fit_seconds = max(self.max_fit_seconds, seconds)
+            self.total_fit_seconds += seconds
+
+        self.__intervals += 1
+        if self.__intervals % self.period != 0:
+            return
+
+        for name, detector in self.__detectors.items():
+            history = detector.get_smoothing_history()
+
+            if name in self.__pending or len(history) < self.MIN_HISTORY:
+                continue
+
+            # the worker fits a copy: the history keeps changing
+            self.__pending[name] = self.__executor.submit(fit_smoothing_factor, list(history))
+
+    def get_state(self) -> dict:
+        """
+        Returns fits statistics, current smoothing factors and their last change
+        """
+
+        return {
+            "fits": self.fits,
+            "failures": self.failures,
+            "pending": len(self.__pending),
+            "last_fit_seconds": self.last_fit_seconds,
+            "max_fit_seconds": self.max_fit_seconds,
+            "total_fit_seconds": self.total_fit_seconds,
+            "factors": {
+                name: {
+                    "factor": float(detector.get_smoothing().get_smoothing_factor()),
+                    "change": float(self.__changes[name])
+                } for name, detector in self.__detectors.items()
+            }
+        }
+
+    def instrument(self, profiler):
+        """
+        Registers fits statistics, and the factors of detectors registered from now on, as profiler gauges
+        """
+
+        self.__profiler = profiler
+
+        profiler.gauge("refit_count", lambda: self.fits)
+        profiler.gauge("refit_failures", lambda: self.failures)
+        profiler.gauge("refit_last_seconds", lambda: self.last_fit_seconds)
+        profiler.gauge("refit_max_seconds", lambda: self.max_fit_seconds)
+
+    def close(self):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
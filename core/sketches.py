@@ -0,0 +1,202 @@
+import math
+import zlib
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters sketch.
+    Tracks at most capacity keys with their (over)estimated count, so memory and update cost
+    don't depend on the number of distinct keys seen.
+    Counters are grouped in buckets by count so that the minimum counter is found in O(1).
+    """
+
+    def __init__(self, capacity: int = 100):
+
+        self.__capacity = capacity
+
+        # estimated count of each monitored key
+        self.__counters = {}
+
+        # maximum overestimation of each monitored key count
+        self.__errors = {}
+
+        # keys grouped by their count
+        self.__buckets = {}
+
+        # minimum count among monitored keys
+        self.__min = 0
+
+    def update(self, key):
+        """
+        Counts an occurrence of given key
+
+        :param key: the key seen
+        """
+
+        counters = self.__counters
+        buckets = self.__buckets
+        count = counters.get(key)
+
+        if count is None and len(counters) < self.__capacity:
+            # free counter available
+            count = 0
+            self.__errors[key] = 0
+            self.__min = 1
+
+        else:
+            if count is None:
+                # replacing a key with minimum count
+                count = self.__min
+                key_out = buckets[count].pop()
+                del counters[key_out]
+                del self.__errors[key_out]
+                self.__errors[key] = count
+            else:
+                buckets[count].discard(key)
+
+            if len(buckets[count]) == 0:
+                del buckets[count]
+
+                if count == self.__min:
+                    # the key just updated has the new minimum count
+                    self.__min = count + 1
+
+        count += 1
+        counters[key] = count
+
+        if count in buckets:
+            buckets[count].add(key)
+        else:
+            buckets[count] = {key}
+
+    def top(self, n: int) -> list:
+        """
+        Returns the n keys with highest estimated count
+
+        :param n: number of keys to return
+        :return: list of (key, estimated count, maximum overestimation) tuples sorted by count
+        """
+
+        keys = sorted(self.__counters, key=self.__counters.get, reverse=True)[:n]
+
+        return [(key, self.__counters[key], self.__errors[key]) for key in keys]
+
+    def reset(self):
+        """
+        Forgets all monitored keys
+        """
+
+        self.__counters.clear()
+        self.__errors.clear()
+        self.__buckets.clear()
+        self.__min = 0
+
+    def __len__(self):
+        return len(self.__counters)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog cardinality estimator.
+    Uses 2^precision one byte registers (4 KB with default precision) whatever the number of distinct keys,
+    sketches with the same precision can be merged to estimate the cardinality of the union.
+    """
+
+    def __init__(self, precision: int = 12, registers: bytes = None):
+
+        self.__precision = precision
+        self.__size = 1 << precision
+        self.__rank_bits = 32 - precision
+
+        if registers is None:
+            self.__registers = bytearray(self.__size)
+        else:
+            self.__registers = bytearray(registers)
+
+        # bias correction constant
+        if self.__size >= 128:
+            self.__alpha = 0.7213 / (1 + 1.079 / self.__size)
+        else:
+            self.__alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.__size]
+
+    @staticmethod
+    def hash(key: bytes) -> int:
+        """
+        Deterministic 32 bit hash: crc32 followed by murmur3 finalizer to spread bits
+
+        :param key: the key to hash
+        :return: 32 bit hash value
+        """
+
+        h = zlib.crc32(key)
+        h ^= h >> 16
+        h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+        h ^= h >> 13
+        h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+        h ^= h >> 16
+
+        return h
+
+    def update(self, key: bytes):
+        """
+        Adds given key to the set
+
+        :param key: the key seen
+        """
+
+        h = self.hash(key)
+
+        index = h >> self.__rank_bits
+        rank = self.__rank_bits - (h & ((1 << self.__rank_bits) - 1)).bit_length() + 1
+
+        if rank > self.__registers[index]:
+            self.__registers[index] = rank
+
+    def estimate(self) -> float:
+        """
+        Returns the estimated number of distinct keys
+        """
+
+        m = self.__size
+        registers = self.__registers
+
+        estimate = self.__alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+
+        if estimate <= 2.5 * m and zeros > 0:
+            # small range correction: linear counting
+            return m * math.log(m / zeros)
+
+        if estimate > (1 << 32) / 30:
+            # large range correction
+            return -(1 << 32) * math.log(1 - estimate / (1 << 32))
+
+        return estimate
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """
+        Returns a new sketch estimating the union of this and other sketch sets
+
+        :param other: a sketch with the same precision
+        """
+
+        if other.get_precision() != self.__precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precisions")
+
+        return HyperLogLog(self.__precision, bytes(map(max, self.__registers, other.get_registers())))
+
+    def copy(self) -> 'HyperLogLog':
+        return HyperLogLog(self.__precision, self.__registers)
+
+    def reset(self):
+        """
+        Forgets all keys seen
+        """
+
+        self.__registers[:] = bytes(self.__size)
+
+    def get_precision(self) -> int:
+        return self.__precision
+
+    def get_registers(self) -> bytes:
+        return bytes(self.__registers)
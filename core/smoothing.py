@@ -0,0 +1,249 @@
+import collections
+import hashlib
+import math
+import os
+import numpy as np
+from .forecasting import SingleExponentialSmoothing
+
+
+class NPSmoothingStage:
+    """
+    Smoothing stage of the non parametric CUSUM: keeps the window of last values that are not outliers,
+    the exponentially weighted moving average of the window means (mu) and of their deviation (sigma)
+    and computes the z value of each new window.
+    The alarm state machine decides when mu and sigma are updated (only outside attacks).
+    """
+
+    def __init__(self, window_size: int = 3, outlier_threshold: float = 0.65, row: int = 0, history_size: int = 0):
+        self.window_size = window_size
+        self.outlier_threshold = outlier_threshold
+
+        # optional history of the last history_size window means used to update the baseline
+        self.history = collections.deque(maxlen=history_size) if history_size > 0 else None
+
+        # list of last self.window_size values
+        self._window = []
+
+        # smoothing object that implements the smoothing function
+        self.smoothing = SingleExponentialSmoothing(row=row)
+        self._smoothing_factor = 0
+
+        # variance of values in window
+        self.sigma = 0
+
+        # value used to calculate the test statistic, kept until next window
+        self.z = 0
+
+        # once read self.window_size values the window is full and z values are computed
+        self.started = False
+
+    def is_outlier(self, value: float) -> bool:
+        return value > self.outlier_threshold
+
+    def _initialize(self):
+        """
+        Fits the smoothing factor on the first full window and computes initial sigma
+        """
+
+        self.smoothing.initialize(self._window)
+        self._smoothing_factor = self.smoothing.get_smoothing_factor()
+
+        mean = self.smoothing.get_smoothed_value()
+
+        # calculating simga value
+        square_sum = 0
+        for val in self._window:
+            square_sum += (val - mean) ** 2
+
+        self.sigma = math.sqrt(square_sum / self.window_size)
+
+    def _window_mean(self) -> float:
+        return sum(self._window) / self.window_size
+
+    def push(self, value: float):
+        """
+        Adds a value that is not an outlier to the window, computing z once the window is full
+        """
+
+        if len(self._window) < self.window_size:
+            # filling window
+
+            self._window.append(value)
+            return
+
+        self._window.append(value)
+        self._window = self._window[1:]
+
+        if not self.started:
+            # first time that the window is full
+            self._initialize()
+            self.started = True
+
+            return
+
+        # saving previous value of mu
+        last_mu = self.smoothing.get_smoothed_value()
+
+        self.z = self._window_mean() - last_mu - 3 * self.sigma
+
+    def update_baseline(self):
+        """
+        Updates mu and sigma with the mean of current window
+        """
+
+        # calculating window mean
+        window_mean = self._window_mean()
+
+        # saving previous values of mu and sigma
+        last_mu = self.smoothing.get_smoothed_value()
+        last_sigma_square = self.sigma ** 2
+
+        # calculating window exponentially weighted moving average
+        self.smoothing.forecast(window_mean)
+
+        if self.history is not None:
+            self.history.append(window_mean)
+
+        # calculating simga value
+        self.sigma = math.sqrt(
+            self._smoothing_factor * last_sigma_square +
+            (1 - self._smoothing_factor) * (window_mean - last_mu) ** 2
+        )
+
+    def last_value(self) -> float:
+        return self._window[-1]
+
+    def set_smoothing_factor(self, smoothing_factor: float):
+        """
+        Replaces the smoothing factor used for both mu and sigma
+        """
+
+        self.smoothing.set_smoothing_factor(smoothing_factor)
+        self._smoothing_factor = smoothing_factor
+
+
+class CachedNPSmoothingStage(NPSmoothingStage):
+    """
+    Smoothing stage reading window means and initial smoothing from a precomputed series,
+    used to replay the same values many times with different alarm parameters
+    """
+
+    def __init__(self, series: dict, row: int = None):
+        """
+        :param series: values precomputed by SmoothingCache.get
+        """
+
+        super().__init__(int(series["window_size"]), float(series["outlier_threshold"]), row=row)
+
+        self.__values = series["values"]
+        self.__means = series["means"]
+        self.__initial = series["initial"]
+        # position of last pushed value
+        self.__position = -1
+
+    def _initialize(self):
+        mu, self.sigma, self._smoothing_factor = self.__initial
+        self.smoothing = SingleExponentialSmoothing(mu, self._smoothing_factor)
+
+    def _window_mean(self) -> float:
+        return self.__means[self.__position]
+
+    def push(self, value: float):
+        self.__position += 1
+
+        if self.__position < self.window_size:
+            return
+
+        if not self.started:
+            self._initialize()
+            self.started = True
+
+            return
+
+        self.z = self.__means[self.__position] - self.smoothing.get_smoothed_value() - 3 * self.sigma
+
+    def last_value(self) -> float:
+        return self.__values[self.__position]
+
+
+class SmoothingCache:
+    """
+    Precomputed smoothing stage outputs that don't depend on the alarm state machine:
+    values that are not outliers, their window means and the initial smoothing fit.
+    Entries are NumPy arrays keyed by the input series and the smoothing parameters,
+    kept in memory and optionally saved as .npz files in a directory.
+    """
+
+    def __init__(self, directory: str = None):
+        self.__directory = directory
+        self.__entries = {}
+
+    @staticmethod
+    def key(values, window_size: int, outlier_threshold: float) -> str:
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest = hashlib.sha1(values.tobytes())
+        digest.update(("%d %r" % (window_size, outlier_threshold)).encode())
+
+        return digest.hexdigest()
+
+    def get(self, values, window_size: int = 3, outlier_threshold: float = 0.65) -> dict:
+        """
+        Returns the precomputed series of given input values, computing it if needed
+
+        :param values: detector input of each interval
+        :param window_size: detector window size
+        :param outlier_threshold: detector outlier threshold
+        :return: dictionary of arrays to build a CachedNPSmoothingStage
+        """
+
+        key = SmoothingCache.key(values, window_size, outlier_threshold)
+
+        if key in self.__entries:
+            return self.__entries[key]
+
+        path = None
+        if self.__directory is not None:
+            path = os.path.join(self.__directory, key + ".npz")
+
+            if os.path.exists(path):
+                with np.load(path) as entry:
+                    self.__entries[key] = dict(entry)
+                return self.__entries[key]
+
+        entry = SmoothingCache.compute(values, window_size, outlier_threshold)
+        self.__entries[key] = entry
+
+        if path is not None:
+            os.makedirs(self.__directory, exist_ok=True)
+            np.savez(path, **entry)
+
+        return entry
+
+    @staticmethod
+    def compute(values, window_size: int = 3, outlier_threshold: float = 0.65) -> dict:
+        values = np.asarray(values, dtype=np.float64)
+
+        # outliers never enter the window
+        values = values[values <= outlier_threshold]
+
+        # mean of the window ending at each value, summing in the same order as the live stage
+        means = np.full(len(values), np.nan)
+        if len(values) >= window_size:
+            windows = np.lib.stride_tricks.sliding_window_view(values, window_size)
+            means[window_size - 1:] = windows.sum(axis=1) / window_size
+
+        # initial fit done by the live stage on the first full window
+        initial = np.zeros(3)
+        if len(values) > window_size:
+            stage = NPSmoothingStage(window_size, outlier_threshold, row=None)
+            for value in values[:window_size + 1]:
+                stage.push(float(value))
+            initial[:] = stage.smoothing.get_smoothed_value(), stage.sigma, stage.smoothing.get_smoothing_factor()
+
+        return {
+            "values": values,
+            "means": means,
+            "initial": initial,
+            "window_size": np.array(window_size),
+            "outlier_threshold": np.array(outlier_threshold)
+        }
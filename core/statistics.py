@@ -0,0 +1,184 @@
+import math
+
+
+class RunningStatistics:
+    """
+    Count, sum, mean, variance, minimum and maximum of a stream of values,
+    updated in constant time and memory (Welford's algorithm)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+        self.__mean = 0.0
+        # sum of squared differences from the mean
+        self.__m2 = 0.0
+
+    def update(self, value: float):
+        self.count += 1
+        self.total += value
+
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+        delta = value - self.__mean
+        self.__mean += delta / self.count
+        self.__m2 += delta * (value - self.__mean)
+
+    def mean(self) -> float:
+        return self.__mean
+
+    def variance(self) -> float:
+        """
+        Returns the sample variance of the values seen so far
+        """
+
+        if self.count < 2:
+            return 0.0
+
+        return self.__m2 / (self.count - 1)
+
+    def deviation(self) -> float:
+        return math.sqrt(self.variance())
+
+
+class P2Quantile:
+    """
+    Estimates a quantile of a stream of values keeping only five markers
+    (P-square algorithm by Jain and Chlamtac)
+    """
+
+    def __init__(self, p: float):
+        """
+        :param p: quantile to estimate in (0, 1) (e.g. 0.99)
+        """
+
+        self.p = p
+        self.count = 0
+
+        # markers heights and positions, desired positions and their increments
+        self.__heights = []
+        self.__positions = [0, 1, 2, 3, 4]
+        self.__desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.__increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, value: float):
+        self.count += 1
+        heights = self.__heights
+
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        positions = self.__positions
+
+        # finding the cell containing the value
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.__desired[i] += self.__increments[i]
+
+        # adjusting the heights of the middle markers if they are off their desired position
+        for i in range(1, 4):
+            d = self.__desired[i] - positions[i]
+
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.__parabolic(i, d)
+
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+
+                heights[i] = height
+                positions[i] += d
+
+    def __parabolic(self, i: int, d: int) -> float:
+        heights = self.__heights
+        positions = self.__positions
+
+        return heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1])
+        )
+
+    def estimate(self) -> float:
+        if self.count == 0:
+            return 0.0
+
+        if self.count <= 5:
+            # exact quantile of the few values seen
+            return self.__heights[min(int(self.p * self.count), self.count - 1)]
+
+        return self.__heights[2]
+
+
+class DecimatedHistory:
+    """
+    History of a stream of values in a fixed size array: when the array is full
+    adjacent points are merged, halving the resolution of the whole history.
+    Every point is the maximum of the values it covers, so that short peaks
+    (e.g. an attack) are not averaged away.
+    """
+
+    def __init__(self, size: int):
+        """
+        :param size: maximum number of points kept (even)
+        """
+
+        self.__size = size + size % 2
+        self.__points = [0.0] * self.__size
+        self.__length = 0
+
+        # number of values covered by each point and values collected for next point
+        self.__stride = 1
+        self.__pending = 0
+        self.__pending_max = 0.0
+
+    def update(self, value: float):
+        if self.__pending == 0 or value > self.__pending_max:
+            self.__pending_max = value
+        self.__pending += 1
+
+        if self.__pending < self.__stride:
+            return
+
+        points = self.__points
+        points[self.__length] = self.__pending_max
+        self.__length += 1
+        self.__pending = 0
+
+        if self.__length == self.__size:
+            # merging adjacent points
+            for i in range(self.__size // 2):
+                points[i] = max(points[2 * i], points[2 * i + 1])
+
+            self.__length = self.__size // 2
+            self.__stride *= 2
+
+    def get_stride(self) -> int:
+        """
+        Returns the number of values covered by each point
+        """
+
+        return self.__stride
+
+    def get_points(self) -> list:
+        return self.__points[:self.__length]
@@ -1,65 +1,597 @@
-from scapy.sendrecv import sniff
-from scapy.layers.inet import TCP, IP
-from .detectors import SYNNPCusumDetector, SYNCusumDetector
+import scapy.arch  # sets the platform dependent sockets in conf
+from scapy.config import conf
+from .packets import SYN, RST, ACK, LINKTYPE_ETHERNET, classify, pack_address, unpack_address, read_capture
+from .sketches import SpaceSaving, HyperLogLog
+from .flows import HalfOpenTable
+from .statistics import RunningStatistics, P2Quantile, DecimatedHistory
+from .clock import LiveClock, PacketClock, default_clock
+from .features import FeatureExtractor
+from .hierarchy import PrefixHierarchy
+from .detectors import SYNNPCusumDetector, SYNCusumDetector, NPCusumDetector, CusumDetector
+from concurrent.futures import Future
+import select
 import time
+import random
+import socket
+import queue
+import collections
+import ctypes
+import struct
 import netifaces as ni
 import core.utils as utils
 import curses
 
+# link type of loopback interfaces in packet socket addresses
+ARPHRD_LOOPBACK = 772
 
-class TrafficCatcher:
+# classic BPF program dropping the frames sent by the host: loads the packet type (SKF_AD_PKTTYPE ancillary data),
+# rejects PACKET_OUTGOING frames and accepts the others whole
+OUTGOING_FILTER = (
+    (0x20, 0, 0, 0xFFFFF004),
+    (0x15, 0, 1, socket.PACKET_OUTGOING),
+    (0x06, 0, 0, 0),
+    (0x06, 0, 0, 0xFFFFFFFF)
+)
+SO_ATTACH_FILTER = 26
 
-    def __init__(self, source: str, parametric=False, time_interval=5, threshold=0.65, verbose=False):
 
-        self._time_interval = time_interval
-        self._source = source
-        self._threshold = threshold
+def skip_outgoing(sock: socket.socket):
+    """
+    Attaches to a packet socket a filter dropping outgoing frames in the kernel,
+    so that they are neither received nor counted in the socket statistics
+    """
+
+    program = ctypes.create_string_buffer(b"".join(struct.pack("HBBI", *instruction)
+                                                   for instruction in OUTGOING_FILTER))
+    fprog = struct.pack("HL", len(OUTGOING_FILTER), ctypes.addressof(program))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class Target:
+    """
+    Counters and detector of a monitored set of addresses (e.g. all the addresses of a network interface)
+    """
+
+    # number of curses lines used by each target on the dashboard
+    ROWS = 8
+
+    def __init__(self, name: str, addresses, parametric=False, threshold=0.65, verbose=False, row=0,
+                 top_sources=5, sketch_size=100, half_open_timeout=None, flow_table_size=65536,
+                 sources_precision=12, sources_window=12, features=(), clock=None, history_size=0,
+                 attacks_history=100, time_interval=5, refit_history=0, forensics=None, networks=(),
+                 prefixes=(24, 16), ipv6_prefixes=(64, 48)):
+
+        self.name = name
+        # packed IPv4/IPv6 addresses
+        self.addresses = set(pack_address(address) for address in addresses)
+        self.row = row
+
+        # interval duration, used to turn forecasts in intervals into times
+        self.time_interval = time_interval
+        self._clock = clock if clock is not None else default_clock
+
         self._anomalous_intervals_count = 0
-        self._max_volume = 0
-        self._min_volume = 0
-        self._volumes = []
+
+        # volumes aggregates and quantiles in constant memory,
+        # optionally a history of the volumes with decreasing resolution
+        self.__volumes = RunningStatistics()
+        self.__volume_quantiles = {p: P2Quantile(p) for p in (0.5, 0.95, 0.99)}
+        self.__volume_history = DecimatedHistory(history_size) if history_size > 0 else None
         self._time_start = 0
         self._time_end = 0
-       
-        utils.colors(0,0,"Status: monitoring...",5)
 
+        self._parametric = parametric
+
+        # detectors optionally keep the history of the values they smoothed, see SmoothingRefitter
         if parametric:
-            self._syn_cusum = SYNCusumDetector(threshold=threshold, verbose=verbose)
+            self._syn_cusum = SYNCusumDetector(threshold=threshold, verbose=verbose, row=row, clock=clock,
+                                               refit_history=refit_history)
         else:
-            self._syn_cusum = SYNNPCusumDetector(verbose=verbose)
+            self._syn_cusum = SYNNPCusumDetector(verbose=verbose, row=row, clock=clock, refit_history=refit_history)
 
         self._syn_counter = 0
         self._synack_counter = 0
 
+        # heavy hitters among SYN sources, reset every interval when not under attack
+        # and kept for the whole attack duration otherwise
+        self.__sources = SpaceSaving(sketch_size)
+        self.__top_sources = top_sources
+        self.__under_attack = False
+
+        # top sources when last attack was detected and when it ended
+        self._attack_start_sources = []
+        self._attack_end_sources = []
+
+        # last detected attacks, oldest first
+        self.__attacks = collections.deque(maxlen=attacks_history)
+        self.__forecasting = False
+
+        # distinct SYN sources of current interval and sketches of last sources_window intervals
+        self.__distinct_sources = HyperLogLog(sources_precision)
+        self.__sources_window = collections.deque(maxlen=sources_window)
+
+        # optional additional per interval counters, each one analyzed by its own detector:
+        # counts with parametric detection, ratio over inbound packets with non parametric detection
+        self._features = None
+        self._feature_detectors = {}
+        if len(features) > 0:
+            self._features = FeatureExtractor(features)
+
+            for name in self._features.names:
+                if parametric:
+                    self._feature_detectors[name] = CusumDetector(threshold=threshold, row=row, label=name,
+                                                                  clock=clock, refit_history=refit_history)
+                else:
+                    self._feature_detectors[name] = NPCusumDetector(row=row, label=name, clock=clock,
+                                                                    refit_history=refit_history)
+
+        # 1 in self._sampling packets (or flows) counted, counters are scaled back at the end of the interval
+        self._sampling = 1
+        self.__flow_sampling = True
+        self.__skipped = 0
+
+        # optional half-open connections tracking, used as detector input instead of SYN and SYN/ACK counts
+        self._flows = None
+        if half_open_timeout is not None:
+            self._flows = HalfOpenTable(timeout=half_open_timeout, capacity=flow_table_size)
+
+        # optional per host counts of the monitored networks, rolled up to prefixes each with its own detector
+        self._hierarchy = None
+        if len(networks) > 0:
+            self._hierarchy = PrefixHierarchy(networks, prefixes, ipv6_prefixes, parametric=parametric,
+                                              threshold=threshold, clock=clock, attacks_history=attacks_history)
+
+        # optional ring of the last frames headers, dumped to a pcap file when an attack is detected
+        self.__forensics = forensics
+        self.__ring = forensics.add_ring(name) if forensics is not None else None
+
+    def count(self, frame: bytes, linktype: int):
+        """
+        If given frame carries a TCP packet with SYN flag set to 1 directed to one of the target addresses
+        increases syn packets counter, if it is a SYN/ACK sent by one of the target addresses
+        increases syn/ack packets counter
+
+        :param frame: raw frame read
+        :param linktype: link type of the frame
+        """
+
+        if self.__ring is not None:
+            # every frame is kept, sampled or not
+            self.__ring.record(self._clock.time(), linktype, frame)
+
+        if self._sampling > 1 and not self.__flow_sampling:
+            # 1 in N packets sampling with a random gap between samples (N on average) so that periodic
+            # traffic patterns don't bias the counters, skipped packets aren't even classified
+            self.__skipped -= 1
+            if self.__skipped > 0:
+                return
+            self.__skipped = random.randint(1, 2 * self._sampling - 1)
+
+        fields = classify(frame, linktype)
+
+        if fields is None:
+            return
+
+        protocol, flags, src, dst, transport = fields
+
+        if self._sampling > 1 and self.__flow_sampling:
+            # both directions of a connection are hashed to the same value,
+            # so a sampled connection keeps its whole handshake
+            client = src + frame[transport:transport + 2]
+            server = dst + frame[transport + 2:transport + 4]
+            key = client + server if client < server else server + client
+
+            if HyperLogLog.hash(key) & (self._sampling - 1):
+                return
+
+        if self._features is not None:
+            self._features.count(protocol, flags, dst in self.addresses, src in self.addresses)
+
+        if flags & SYN:
+            if self._hierarchy is not None:
+                # any host, not only the target addresses
+                if flags & ACK:
+                    self._hierarchy.count_synack(src)
+                else:
+                    self._hierarchy.count_syn(dst)
+
+            if flags & ACK:
+                if src in self.addresses:
+                    self._synack_counter += 1
+            elif dst in self.addresses:
+                self._syn_counter += 1
+                self.__sources.update(src)
+                self.__distinct_sources.update(src)
+
+                if self._flows is not None:
+                    self._flows.syn(src + dst + frame[transport:transport + 4])
+
+        elif self._flows is not None and flags & (ACK | RST) and dst in self.addresses:
+            # handshake completed or aborted by the client
+            self._flows.complete(src + dst + frame[transport:transport + 4])
+
+    def set_sampling(self, rate: int, by_flow: bool = True):
+        """
+        Changes the sampling applied to next packets
+
+        :param rate: 1 in rate packets/connections are counted, a power of 2 (1 disables sampling)
+        :param by_flow: True to sample connections by hash of their addresses and ports,
+                        False to sample packets
+        """
+
+        self._sampling = rate
+        self.__flow_sampling = by_flow
+        self.__skipped = random.randint(1, 2 * rate - 1)
+
+    def advance(self, now: float):
+        """
+        Expires half-open connections tracked until given time
+
+        :param now: current time in seconds
+        """
+
+        if self._flows is not None:
+            self._flows.advance(now)
+
     def _counter_reader(self):
         """
         - Computes the volume with cusum algorithm __g and checks if threshold has been exceeded.
         - Resets the syn counter for the next interval
         - If threshold is exceeded resets last computed volume to 0.
         - If threshold is not exceeded but in last interval an attack was detected resets last computed ewma to 0.
+
+        :return: a dictionary with the values of the interval (volume, threshold, counters and estimates)
         """
 
-        volume, threshold = self._syn_cusum.analyze(self._syn_counter, self._synack_counter)
+        data = {}
 
-        self._max_volume = max(volume, self._max_volume)
-        self._volumes.append(volume)
+        # estimating the counts of the whole traffic from the sampled ones, the ratios used by
+        # non parametric detection are not affected by the scaling
+        sampling = self._sampling
+        self._syn_counter *= sampling
+        self._synack_counter *= sampling
 
-        if self._syn_cusum.under_attack():
+        if self._flows is None:
+            volume, threshold = self._syn_cusum.analyze(self._syn_counter, self._synack_counter)
+        else:
+            # flows resolved in the interval: ratio of half-open ones for non parametric detection,
+            # half-open count for parametric detection
+            opened, completed, half_open = self._flows.read()
+            completed *= sampling
+            half_open *= sampling
+            data["half_open"] = half_open
+
+            if self._parametric:
+                volume, threshold = self._syn_cusum.analyze(half_open)
+            else:
+                volume, threshold = self._syn_cusum.analyze(completed + half_open, completed)
+
+        volume = float(volume)
+        self.__volumes.update(volume)
+        for quantile in self.__volume_quantiles.values():
+            quantile.update(volume)
+        if self.__volume_history is not None:
+            self.__volume_history.update(volume)
+
+        if self._features is not None:
+            self.__features_reader(data)
+
+        if self._hierarchy is not None:
+            data["prefixes_under_attack"] = len(self._hierarchy.close(sampling))
+
+        detectors = [self._syn_cusum] + list(self._feature_detectors.values())
+        attacks = [detector for detector in detectors if detector.under_attack()]
+
+        if len(attacks) > 0:
             self._anomalous_intervals_count += 1
             if self._time_start == 0:
-                self._time_start = self._syn_cusum.get_time_start()
-        elif self._anomalous_intervals_count > 1: self._time_end = self._syn_cusum.get_time_end()
-        
+                self._time_start = attacks[0].get_time_start()
+        elif self._anomalous_intervals_count > 1:
+            self._time_end = max(detector.get_time_end() for detector in detectors)
+
+        self.__sources_reader()
+        self.__forecast_reader(data)
+
+        self.__sources_window.append(self.__distinct_sources.copy())
+        self.__distinct_sources.reset()
+
+        data.update((
+            ("volume", float(volume)),
+            ("threshold", float(threshold)),
+            ("syn_counter", int(self._syn_counter)),
+            ("synack_counter", int(self._synack_counter)),
+            ("distinct_sources", float(self.get_distinct_sources())),
+            ("sampling", sampling)
+        ))
+
         self._syn_counter = 0
         self._synack_counter = 0
 
-        return volume, threshold
+        return data
+
+    def __features_reader(self, data: dict):
+        """
+        Updates each feature detector with the feature value of the interval
+
+        :param data: dictionary where features values are added
+        """
+
+        packets, counters = self._features.read()
+        packets *= self._sampling
+
+        for name, count in counters.items():
+            count *= self._sampling
+            detector = self._feature_detectors[name]
+
+            if self._parametric:
+                value = count
+            else:
+                value = count / packets if packets > 0 else 0
+
+            data[name + "_counter"] = int(count)
+            data[name + "_volume"] = float(detector.update(value))
+            data[name + "_attack"] = detector.under_attack()
+
+    def get_feature_attacks(self) -> list:
+        """
+        Returns the names of the features whose detector is signaling an attack
+        """
+
+        return [name for name, detector in self._feature_detectors.items() if detector.under_attack()]
+
+    def __sources_reader(self):
+        """
+        Reports top SYN sources on attack start and end events
+        """
+
+        under_attack = self._syn_cusum.under_attack()
+
+        if under_attack and not self.__under_attack:
+            # attack started
+            self._attack_start_sources = self.get_top_sources()
+            self._attack_end_sources = []
+
+            self.__attacks.append({
+                "start": self._syn_cusum.get_time_start(),
+                "end": 0,
+                "start_sources": self._attack_start_sources,
+                "end_sources": []
+            })
+
+            if self.__forensics is not None:
+                # frames before the detection are dumped too, as many as the ring keeps
+                self.__attacks[-1]["capture"] = self.__forensics.start_dump(self.name,
+                                                                            self._syn_cusum.get_time_start())
+
+        elif not under_attack and self.__under_attack:
+            # attack ended
+            self._attack_end_sources = self.get_top_sources()
+
+            if len(self.__attacks) > 0:
+                self.__attacks[-1]["end"] = self._syn_cusum.get_time_end()
+                self.__attacks[-1]["end_sources"] = self._attack_end_sources
+
+            if self.__forensics is not None:
+                self.__forensics.stop_dump(self.name)
+
+        if under_attack:
+            utils.colors(self.row + 4, 50, "Top SYN sources:", 197)
+            for n, (address, count, error) in enumerate(self.get_top_sources()[:3]):
+                utils.colors(self.row + 5 + n, 50, "{:<40} {}".format(address, count), 197)
+        elif self.__under_attack:
+            for n in range(4):
+                utils.colors(self.row + 4 + n, 50, " " * 50, 1)
+
+        if not under_attack:
+            self.__sources.reset()
+
+        self.__under_attack = under_attack
+
+    def __forecast_reader(self, data: dict):
+        """
+        Reports the forecast of the attack intensity and of the attack end while under attack
+
+        :param data: dictionary where forecasted values are added
+        """
+
+        forecast = self._syn_cusum.get_forecast()
+
+        if forecast.started:
+            values = forecast.get_values()
+            z = forecast.get_z()
+            end = forecast.get_end()
+
+            data["forecast_value"] = float(values[0])
+            data["forecast_z"] = float(z[0])
+            if end is not None:
+                data["forecast_remaining"] = float(end * self.time_interval)
+
+            if len(self.__attacks) > 0:
+                self.__attacks[-1]["forecast"] = {
+                    "values": [float(value) for value in values],
+                    "z": [float(value) for value in z],
+                    "end": self._clock.time() + end * self.time_interval if end is not None else 0
+                }
+
+            utils.colors(self.row + 2, 50, "Forecast next value:  %-28.4f" % values[0], 197)
+            utils.colors(self.row + 3, 50, "Expected attack end:  %-28s" % (
+                "in %d intervals" % end if end is not None else "not within %d intervals" % len(values)), 197)
+
+        elif self.__forecasting:
+            for n in (2, 3):
+                utils.colors(self.row + n, 50, " " * 50, 1)
+
+        self.__forecasting = forecast.started
+
+    def get_forecast(self) -> dict:
+        """
+        Returns the forecast of the SYN detector: next values, z values and intervals until the attack end
+        (None if unknown), empty while not under attack or in the first intervals of an attack
+        """
+
+        return self._syn_cusum.get_forecast().get_state()
+
+    def get_prefixes(self) -> dict:
+        """
+        Returns the state of hosts and prefixes detection (active nodes and attacks), None if disabled
+        """
+
+        return self._hierarchy.get_state() if self._hierarchy is not None else None
+
+    def get_top_sources(self) -> list:
+        """
+        Returns the sources that sent more SYN packets in current interval,
+        or since the attack was detected if under attack
+
+        :return: list of (address, estimated SYN count, maximum overestimation) tuples
+        """
+
+        return [(unpack_address(address), count, error) for address, count, error in
+                self.__sources.top(self.__top_sources)]
+
+    def get_distinct_sources(self, intervals: int = 1) -> float:
+        """
+        Returns the estimated number of distinct SYN sources in last closed intervals,
+        merging the sketches of each interval
+
+        :param intervals: number of intervals of the window, at most sources_window
+        :return: estimated distinct sources count
+        """
+
+        sketches = list(self.__sources_window)[-intervals:]
+
+        if len(sketches) == 0:
+            return 0
+
+        window = sketches[0]
+        for sketch in sketches[1:]:
+            window = window.merge(sketch)
+
+        return window.estimate()
+
+    def get_attacks(self) -> list:
+        """
+        Returns last detected attacks, oldest first
+
+        :return: list of dictionaries with start and end time (0 if not ended) and top sources at both events
+        """
+
+        return list(self.__attacks)
+
+    def get_counters(self) -> dict:
+        """
+        Returns the counters of current interval
+        """
+
+        counters = {
+            "syn_counter": self._syn_counter,
+            "synack_counter": self._synack_counter
+        }
+
+        if self._features is not None:
+            for name, count in self._features.peek().items():
+                counters[name + "_counter"] = count
+
+        return counters
+
+    def get_detectors_state(self) -> dict:
+        """
+        Returns the state of the SYN detector (syn key) and of each feature detector
+        """
+
+        state = {"syn": self._syn_cusum.get_state()}
+
+        for name, detector in self._feature_detectors.items():
+            state[name] = detector.get_state()
+
+        return state
+
+    def get_statistics(self) -> dict:
+        """
+        Returns the statistics of the volumes of the closed intervals
+        """
+
+        stride, history = self.get_volume_history()
+
+        return {
+            "intervals": self.get_total_intervals(),
+            "anomalous_intervals": self.get_anomalous_intervals_count(),
+            "mean_volume": self.get_mean_volume(),
+            "volume_deviation": self.get_volume_deviation(),
+            "min_volume": self.get_min_volume(),
+            "max_volume": self.get_max_volume(),
+            "volume_quantiles": {str(p): quantile.estimate() for p, quantile in self.__volume_quantiles.items()},
+            "volume_history": {"stride": stride, "points": history}
+        }
+
+    def get_state(self) -> dict:
+        """
+        Returns the whole state of the target: counters, detectors, statistics and attacks
+        """
+
+        return {
+            "addresses": sorted(unpack_address(address) for address in self.addresses),
+            "counters": self.get_counters(),
+            "detectors": self.get_detectors_state(),
+            "statistics": self.get_statistics(),
+            "attacks": self.get_attacks(),
+            "forecast": self.get_forecast(),
+            "prefixes": self.get_prefixes(),
+            "top_sources": self.get_top_sources(),
+            "distinct_sources": self.get_distinct_sources()
+        }
+
+    def set_threshold(self, threshold: float):
+        """
+        Changes the threshold of every detector of the target
+        """
+
+        self._syn_cusum.set_threshold(threshold)
+
+        for detector in self._feature_detectors.values():
+            detector.set_threshold(threshold)
+
+    def get_attack_start_sources(self) -> list:
+        return self._attack_start_sources
+
+    def get_attack_end_sources(self) -> list:
+        return self._attack_end_sources
+
+    def get_volumes_sum(self) -> float:
+        return self.__volumes.total
 
     def get_mean_volume(self) -> float:
-        return sum(self._volumes)/self._syn_cusum.intervals
+        return self.__volumes.mean()
+
+    def get_volume_deviation(self) -> float:
+        return self.__volumes.deviation()
+
+    def get_min_volume(self) -> float:
+        return self.__volumes.min
 
     def get_max_volume(self) -> float:
-        return self._max_volume
+        return max(self.__volumes.max, 0)
+
+    def get_volume_quantile(self, p: float) -> float:
+        """
+        Returns the estimated quantile of the volumes of all the intervals
+
+        :param p: one of 0.5, 0.95, 0.99
+        """
+
+        return self.__volume_quantiles[p].estimate()
+
+    def get_volume_history(self) -> tuple:
+        """
+        Returns the volumes history, empty if not enabled
+
+        :return: (intervals covered by each point, list of maximum volumes)
+        """
+
+        if self.__volume_history is None:
+            return 1, []
+
+        return self.__volume_history.get_stride(), self.__volume_history.get_points()
 
     def get_total_intervals(self) -> int:
         return self._syn_cusum.intervals
@@ -74,95 +606,439 @@ class TrafficCatcher:
         return self._time_end
 
 
+class TrafficCatcher:
+
+    def __init__(self, source, parametric=False, time_interval=5, threshold=0.65, verbose=False,
+                 half_open_timeout=None, features=(), profiler=None, clock=None, history_size=0, exporter=None,
+                 refitter=None, forensics=None, networks=(), prefixes=(24, 16), ipv6_prefixes=(64, 48)):
+
+        self._time_interval = time_interval
+
+        # clock shared by the catcher and the detectors of its targets
+        self._clock = clock if clock is not None else LiveClock()
+        self._source = source
+        self._parametric = parametric
+        self._threshold = threshold
+        self._verbose = verbose
+        self._half_open_timeout = half_open_timeout
+        self._features = features
+
+        # monitored networks whose hosts and prefixes get their own detectors, see PrefixHierarchy
+        self._networks = networks
+        self._prefixes = prefixes
+        self._ipv6_prefixes = ipv6_prefixes
+        self._history_size = history_size
+
+        # optional SensorExporter sending the counts of every interval to a collector
+        self._exporter = exporter
+
+        # optional ResultWriter of the detector values of every interval (offline analysis only)
+        self._results = None
+
+        # optional SmoothingRefitter fitting again the smoothing factors of every detector
+        self._refitter = refitter
+
+        # optional ForensicCapture dumping the frames of every target around attacks
+        self._forensics = forensics
+
+        # monitored targets by name
+        self._targets = {}
+
+        # values of last closed interval of each target, replaced as a whole so that other threads
+        # can read it without synchronization
+        self._last_interval = {}
+
+        # functions submitted by other threads (e.g. the control server) run by the capture thread,
+        # which is woken up writing on a socket pair
+        self.__commands = queue.SimpleQueue()
+        self._wakeup, self.__wakeup_writer = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+
+        # when profiling the functions implementing each stage are replaced by instrumented ones
+        self._profiler = profiler
+        if profiler is not None:
+            utils.colors = profiler.wrap("curses", utils.colors)
+            self._counter_reader = profiler.wrap("interval", self._counter_reader)
+
+            if refitter is not None:
+                refitter.instrument(profiler)
+
+        utils.colors(0,0,"Status: monitoring...",5)
+
+    def _add_target(self, name: str, addresses) -> Target:
+        """
+        Creates a new target with its own counters and detector,
+        each target gets its own block of lines on the dashboard
+
+        :param name: target name (e.g. interface name)
+        :param addresses: addresses belonging to the target
+        :return: the created target
+        """
+
+        target = Target(
+            name,
+            addresses,
+            parametric=self._parametric,
+            threshold=self._threshold,
+            verbose=self._verbose,
+            row=len(self._targets) * Target.ROWS,
+            half_open_timeout=self._half_open_timeout,
+            features=self._features,
+            clock=self._clock,
+            history_size=self._history_size,
+            time_interval=self._time_interval,
+            refit_history=self._refitter.history_size if self._refitter is not None else 0,
+            forensics=self._forensics,
+            networks=self._networks,
+            prefixes=self._prefixes,
+            ipv6_prefixes=self._ipv6_prefixes
+        )
+
+        if self._refitter is not None:
+            # SYN detector named as the target, feature detectors as target/feature
+            self._refitter.register(name, target._syn_cusum)
+            for feature, detector in target._feature_detectors.items():
+                self._refitter.register(name + "/" + feature, detector)
+
+        if self._profiler is not None:
+            target.count = self._profiler.wrap("count", target.count)
+            target._syn_cusum.analyze = self._profiler.wrap("detector", target._syn_cusum.analyze)
+
+        if len(self._targets) > 0:
+            # more than one target: labelling blocks
+            first = next(iter(self._targets.values()))
+            utils.colors(first.row, 50, "[" + first.name + "]", 5)
+            utils.colors(target.row, 0, "Status: monitoring...", 5)
+            utils.colors(target.row, 50, "[" + name + "]", 5)
+
+        self._targets[name] = target
+
+        return target
+
+    def _counter_reader(self):
+        """
+        Closes current interval on every target
+
+        :return: a list of (target, interval values, top syn sources) tuples
+        """
+
+        results = []
+
+        for target in self._targets.values():
+            sources = target.get_top_sources()
+            data = target._counter_reader()
+
+            results.append((target, data, sources))
+
+        self._last_interval = {
+            target.name: dict(data, top_sources=sources) for target, data, sources in results
+        }
+
+        # smoothing factors fitted in background are swapped in between two intervals
+        if self._refitter is not None:
+            self._refitter.step()
+
+        return results
+
+    def _export(self, results: list, interval_end: float):
+        """
+        Sends the counts of a closed interval to the collector and writes its results, if enabled
+        """
+
+        if self._exporter is not None:
+            for target, data, sources in results:
+                self._exporter.export(target.name, interval_end, self._time_interval, data)
+
+        if self._results is not None:
+            for target, data, sources in results:
+                self._results.write(interval_end, data, target._syn_cusum.get_state())
+
+    def submit(self, function) -> Future:
+        """
+        Schedules a function to be run by the capture thread between two packets,
+        used to read or change the state of targets and detectors from other threads
+
+        :param function: function without arguments
+        :return: the future result of the function
+        """
+
+        future = Future()
+        self.__commands.put((function, future))
+
+        try:
+            self.__wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            # capture thread already woken up
+            pass
+
+        return future
+
+    def _run_commands(self):
+        """
+        Runs the functions submitted by other threads
+        """
+
+        try:
+            while self._wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                function, future = self.__commands.get_nowait()
+            except queue.Empty:
+                return
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function())
+                except Exception as e:
+                    future.set_exception(e)
+
+    def get_last_interval(self) -> dict:
+        """
+        Returns the values of last closed interval of each target, safe to call from any thread
+        """
+
+        return self._last_interval
+
+    def get_interval(self) -> float:
+        return self._time_interval
+
+    def set_interval(self, time_interval: float):
+        """
+        Changes the duration of next intervals
+
+        :param time_interval: interval duration in seconds
+        """
+
+        if time_interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self._time_interval = time_interval
+
+        for target in self._targets.values():
+            target.time_interval = time_interval
+
+    def get_state(self) -> dict:
+        """
+        Returns the whole state of the catcher and of its targets
+        """
+
+        return {
+            "time": self._clock.time(),
+            "interval": self._time_interval,
+            "targets": {name: target.get_state() for name, target in self._targets.items()},
+            "refit": self.get_refit_state(),
+            "forensics": self._forensics.get_state() if self._forensics is not None else None
+        }
+
+    def get_refit_state(self) -> dict:
+        """
+        Returns the statistics of smoothing factors fits, None if factors are not fitted again
+        """
+
+        return self._refitter.get_state() if self._refitter is not None else None
+
+    def get_targets(self) -> list:
+        return list(self._targets.values())
+
+    def get_mean_volume(self) -> float:
+        intervals = sum(target.get_total_intervals() for target in self._targets.values())
+
+        if intervals == 0:
+            return 0
+
+        return sum(target.get_volumes_sum() for target in self._targets.values())/intervals
+
+    def get_max_volume(self) -> float:
+        return max((target.get_max_volume() for target in self._targets.values()), default=0)
+
+    def get_total_intervals(self) -> int:
+        return max((target.get_total_intervals() for target in self._targets.values()), default=0)
+
+    def get_anomalous_intervals_count(self) -> int:
+        return sum(target.get_anomalous_intervals_count() for target in self._targets.values())
+
+    def get_time_start(self):
+        return min((target.get_time_start() for target in self._targets.values() if target.get_time_start() != 0),
+                   default=0)
+
+    def get_time_end(self):
+        return max((target.get_time_end() for target in self._targets.values()), default=0)
+
+
 class LiveCatcher(TrafficCatcher):
     """
     A thread used for capturing traffic and saving data of interest into DB
     """
 
-    def __init__(self, source, plot=None, parametric=False, time_interval=5, threshold=0.65, verbose=False):
-        super().__init__(source, parametric, time_interval, threshold, verbose)
+    def __init__(self, source, plot=None, parametric=False, time_interval=5, threshold=0.65, verbose=False,
+                 half_open_timeout=None, features=(), profiler=None, history_size=0,
+                 overload=None, sampling="flow", max_sampling=64, exporter=None, align=False, refitter=None,
+                 forensics=None, networks=(), prefixes=(24, 16), ipv6_prefixes=(64, 48)):
+
+        if isinstance(source, str):
+            source = [source]
 
-        self.__timestamp = time.time()
-        self.__ipv4_address = ni.ifaddresses(self._source)[ni.AF_INET][0]['addr']
+        super().__init__(list(source), parametric, time_interval, threshold, verbose,
+                         half_open_timeout=half_open_timeout, features=features, profiler=profiler,
+                         clock=LiveClock(), history_size=history_size, exporter=exporter, refitter=refitter,
+                         forensics=forensics, networks=networks, prefixes=prefixes, ipv6_prefixes=ipv6_prefixes)
 
+        self.__timestamp = self._clock.time()
+
+        if align:
+            # intervals aligned to multiples of their duration, so that intervals of different hosts match
+            self.__timestamp -= self.__timestamp % time_interval
+
+        # overload mode: when the packet callback takes more than the overload fraction of an interval
+        # the sampling rate is doubled (up to max_sampling), when it takes less than a quarter of it
+        # the sampling rate is halved
+        self.__overload = overload
+        self.__flow_sampling = sampling == "flow"
+        self.__max_sampling = max_sampling
+        self.__sampling = 1
+        self.__busy = 0
+        self.__busy_since = time.perf_counter()
+
+        # one target for each interface, considering all its IPv4 and IPv6 addresses
+        for interface in self._source:
+            interface_addresses = ni.ifaddresses(interface)
+            addresses = [address['addr'] for address in
+                         interface_addresses.get(ni.AF_INET, []) + interface_addresses.get(ni.AF_INET6, [])]
+            self._add_target(interface, addresses)
 
         self.__graph = False
         if plot is not None:
             self.__plot = plot
             self.__graph = True
 
-    def __callback(self, pkt):
-        """
-        Called by sniff every time it reads a packet.
-        If given packet is a TCP packet and has SYN flag set to 1
-        increases syn packets counter
+            if profiler is not None:
+                plot.instrument(profiler)
 
-        :param pkt: packet read
+    def __check_interval(self):
+        """
+        Closes every interval elapsed since last computation time
         """
 
-        syn = 0x2
-        ack = 0x10
-
-        # current time minus last computation time
-        diff_time = time.time() - self.__timestamp
+        # checks if it's been at least self.__time_interval seconds,
+        # if more intervals have been lost self._counter_reader() is called for each of them
+        while self._clock.time() - self.__timestamp >= self._time_interval:
 
-        syn_count = self._syn_counter
-        synack_count = self._synack_counter
+            if self._profiler is not None:
+                self._profiler.jitter(int((self._clock.time() - self.__timestamp - self._time_interval) * 1e9))
 
-        # checks if it's been at least self.__time_interval seconds and not more than self.__time_interval*2
-        if self._time_interval <= diff_time < self._time_interval * 2:
-
-            volume, threshold = self._counter_reader()
-            
+            results = self._counter_reader()
+            self._export(results, self.__timestamp + self._time_interval)
 
             # graphing
             if self.__graph:
-                self.__plot.update_data(
-                    (
-                        ("volume", float(volume)),
-                        ("threshold", float(threshold)),
-                        ("syn_counter", int(syn_count)),
-                        ("synack_counter", int(synack_count))
-                    ), time.time()
-                )
+                for target, data, sources in results:
+                    timestamp = self._clock.time()
+
+                    self.__plot.update_data(tuple(data.items()), timestamp, (("interface", target.name),))
+
+                    for address, count, error in sources:
+                        self.__plot.update_data(
+                            (
+                                ("syn_counter", int(count)),
+                                ("error", int(error))
+                            ), timestamp, (("interface", target.name), ("source", address)), "top_sources"
+                        )
 
             self.__timestamp += self._time_interval
 
-        # if it's been more than self.__time_interval*2 seconds:
-        elif diff_time > self._time_interval * 2:
+            if self.__overload is not None:
+                self.__adapt_sampling()
 
-            # number of lost intervals
-            lost_intervals_number = int(diff_time / self._time_interval)
+    def __adapt_sampling(self):
+        """
+        Changes the sampling rate of every target according to the time spent counting packets
+        since last interval close
+        """
 
-            # for each lost interval will be called self.__counter_reader()
-            for c in range(lost_intervals_number):
-                volume, threshold = self._counter_reader()
+        now = time.perf_counter()
+        load = self.__busy / max(now - self.__busy_since, 1e-9)
+        self.__busy = 0
+        self.__busy_since = now
 
-                # graphing
-                if self.__graph:
-                    self.__plot.update_data(
-                        (
-                            ("volume", float(volume)),
-                            ("threshold", float(threshold)),
-                            ("syn_counter", int(syn_count)),
-                            ("synack_counter", int(synack_count))
-                        ), time.time()
-                    )
+        sampling = self.__sampling
+        if load > self.__overload:
+            sampling = min(sampling * 2, self.__max_sampling)
+        elif load < self.__overload / 4:
+            sampling = max(sampling // 2, 1)
 
-                self.__timestamp += self._time_interval
+        if sampling != self.__sampling:
+            self.__sampling = sampling
+            for target in self._targets.values():
+                target.set_sampling(sampling, self.__flow_sampling)
 
-        if pkt.haslayer(TCP):
-            if (pkt[TCP].flags & syn) and not (pkt[TCP].flags & ack) and (pkt[IP].dst == self.__ipv4_address):
-                self._syn_counter += 1
-            elif (pkt[TCP].flags & syn) and (pkt[TCP].flags & ack) and (pkt[IP].src == self.__ipv4_address):
-                self._synack_counter += 1
+            utils.colors(0, 70, "Sampling: 1/%-6d" % sampling, 12 if sampling > 1 else 5)
+
+    def get_sampling(self) -> int:
+        return self.__sampling
 
     def start(self):
         """
-        Starts packet capturing and analyzing
+        Starts packet capturing and analyzing.
+        A single loop multiplexes the sockets opened on every monitored interface.
         """
 
-        sniff(iface=self._source, prn=self.__callback, store=0)
+        sockets = {}
+        overload = self.__overload is not None
+
+        try:
+            for interface in self._source:
+                sock = conf.L2listen(iface=interface)
+
+                if sock.ins.getsockname()[3] == ARPHRD_LOOPBACK:
+                    # frames sent on loopback are received twice, as outgoing and as incoming
+                    skip_outgoing(sock.ins)
+
+                # interfaces without a known link layer (e.g. loopback) deliver ethernet-like frames
+                linktype = conf.l2types.layer2num.get(sock.LL, LINKTYPE_ETHERNET)
+
+                if self._profiler is not None:
+                    sock.recv_raw = self._profiler.wrap("capture", sock.recv_raw)
+                    self._profiler.socket_gauges(interface, sock.ins)
+
+                sockets[sock] = (self._targets[interface], linktype)
+
+            while True:
+                # waiting packets at most until the end of current interval
+                timeout = max(self.__timestamp + self._time_interval - self._clock.time(), 0)
+                ready, _, _ = select.select(list(sockets) + [self._wakeup], [], [], timeout)
+
+                if self._half_open_timeout is not None:
+                    now = self._clock.time()
+                    for target in self._targets.values():
+                        target.advance(now)
+
+                self.__check_interval()
+
+                for sock in ready:
+                    if sock is self._wakeup:
+                        self._run_commands()
+                        continue
+
+                    # reading raw frame, avoiding packet dissection
+                    _, frame, _ = sock.recv_raw()
+
+                    if frame:
+                        target, linktype = sockets[sock]
+
+                        if overload:
+                            started = time.perf_counter()
+                            target.count(frame, linktype)
+                            self.__busy += time.perf_counter() - started
+                        else:
+                            target.count(frame, linktype)
+        finally:
+            for sock in sockets:
+                sock.close()
 
 
 class OfflineCatcher(TrafficCatcher):
@@ -170,48 +1046,65 @@ class OfflineCatcher(TrafficCatcher):
     A thread used for capturing traffic and saving data of interest into DB
     """
 
-    def __init__(self, source, ipv4_address, parametric=False, time_interval=5, threshold=0.65, verbose=False):
+    def __init__(self, source, address, parametric=False, time_interval=5, threshold=0.65, verbose=False,
+                 half_open_timeout=None, features=(), profiler=None, history_size=0, exporter=None, results=None,
+                 refitter=None, decompress_thread=False, forensics=None, networks=(), prefixes=(24, 16),
+                 ipv6_prefixes=(64, 48)):
 
-        super().__init__(source, parametric, time_interval, threshold, verbose)
+        # detectors see the time of the packets read
+        super().__init__(source, parametric, time_interval, threshold, verbose,
+                         half_open_timeout=half_open_timeout, features=features, profiler=profiler,
+                         clock=PacketClock(), history_size=history_size, exporter=exporter, refitter=refitter,
+                         forensics=forensics, networks=networks, prefixes=prefixes, ipv6_prefixes=ipv6_prefixes)
 
-        self.__ipv4_address = ipv4_address
+        self.__target = self._add_target(address, [address])
+        self._results = results
+
+        # compressed captures are decompressed on a separate thread, overlapping parsing
+        self.__decompress_thread = decompress_thread
 
         # timestamp of first packet in a new time interval
         self.__first_pkt_timestamp = 0
 
-    def __callback(self, pkt):
+    def __callback(self, timestamp, linktype, frame):
         """
-        Called by sniff every time it reads a packet.
-        If given packet is a TCP packet and has SYN flag set to 1
+        Called every time a frame is read from the capture.
+        If given frame carries a TCP packet and has SYN flag set to 1
         increases syn packets counter
 
-        :param pkt: packet read
+        :param timestamp: frame capture time
+        :param linktype: link type of the frame
+        :param frame: raw frame read
         """
 
-        syn = 0x2
-        ack = 0x10
+        self._clock.set(timestamp)
 
         if self.__first_pkt_timestamp == 0:
-            self.__first_pkt_timestamp = pkt.time
+            self.__first_pkt_timestamp = timestamp
 
         # current packet time minus first packet time in interval
-        diff_time = pkt.time - self.__first_pkt_timestamp
+        diff_time = timestamp - self.__first_pkt_timestamp
 
         # checks if it's been at least self.__time_interval seconds and not more than self.__time_interval*2
         if self._time_interval <= diff_time:
-            self._counter_reader()
+            self._export(self._counter_reader(), self.__first_pkt_timestamp + self._time_interval)
+            self._run_commands()
             self.__first_pkt_timestamp = 0
 
-        if pkt.haslayer(TCP):
-            if (pkt[TCP].flags & syn) and not (pkt[TCP].flags & ack) and (pkt[IP].dst == self.__ipv4_address):
-                self._syn_counter += 1
-            elif (pkt[TCP].flags & syn) and (pkt[TCP].flags & ack) and (pkt[IP].src == self.__ipv4_address):
-                self._synack_counter += 1
+        if self._half_open_timeout is not None:
+            self.__target.advance(timestamp)
+
+        self.__target.count(frame, linktype)
 
     def start(self):
         """
         Starts packet capturing and analyzing
         """
 
-        sniff(offline=self._source, prn=self.__callback, store=0)
-
+        try:
+            for timestamp, linktype, frame in read_capture(self._source, self.__decompress_thread):
+                self.__callback(timestamp, linktype, frame)
+        finally:
+            # results of the intervals analyzed so far are written even if interrupted
+            if self._results is not None:
+                self._results.close()
@@ -1,6 +1,12 @@
 import curses
 
+# dashboard output can be disabled (e.g. when running benchmarks)
+enabled = True
+
 def colors(line, column, txt, rgb):
+    if not enabled:
+        return
+
     try:
         stdscr = curses.initscr()
         curses.start_color()
@@ -14,9 +20,11 @@ def colors(line, column, txt, rgb):
     except:
         pass
 
-def clean_line_end():
+def clean_line_end(row=0):
+    if not enabled:
+        return
 
-    for i in range(1,8):
+    for i in range(row + 1, row + 8):
         stdscr = curses.initscr()       
         stdscr.addstr(i, 0,'                                                ')
         stdscr.refresh()
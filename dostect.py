@@ -1,8 +1,16 @@
 import argparse
+import importlib.util
 import os
 import socket
 import netifaces
-from core.traffic import OfflineCatcher, LiveCatcher
+from core.traffic import OfflineCatcher, LiveCatcher, Target
+from core.features import FEATURES
+from core.profiling import Profiler
+from core.control import ControlServer
+from core.distributed import SensorExporter, CollectorCatcher
+from core.export import open_result_writer
+from core.refit import SmoothingRefitter
+from core.forensics import ForensicCapture
 from core.graph import Graph
 import sys
 import ipaddress
@@ -11,25 +19,46 @@ from core import utils
 from datetime import datetime
 import curses
 
+# Extensions of supported compressed captures
+COMPRESSED_EXTENSIONS = (".gz", ".zst", ".zstd", ".xz")
+
 # Check if the input file has a valid extension
 def is_valid_capture(parser, arg):
     if not os.path.exists(arg):
         parser.error("The file %s does not exist!" % arg)
     else:
-        ext = os.path.splitext(arg)[-1].lower() # Get file extension
+        name, ext = os.path.splitext(arg.lower()) # Get file extension
+
+        # Compressed captures (e.g. capture.pcap.gz)
+        compression = None
+        if ext in COMPRESSED_EXTENSIONS:
+            compression = ext
+            ext = os.path.splitext(name)[-1]
 
         if ext != ".pcap" and ext != ".pcapng": # Check supported extensions
              parser.error("The file %s is of an incorrect format" % arg)
+        elif compression in (".zst", ".zstd") and importlib.util.find_spec("zstandard") is None:
+             parser.error("The file %s requires zstandard (pip install zstandard)" % arg)
         else:
             return arg  # Return an open file handle
 
 # Check if the interface exists
 def is_valid_interface(parser, arg):
-    if arg in netifaces.interfaces():
+    if arg == "all" or arg in netifaces.interfaces():
         return arg
     else:
         parser.error("Interface %s not found" % arg)
 
+# Expand interfaces list: "all" stands for every interface with an IP address
+def expand_interfaces(interfaces):
+    if "all" in interfaces:
+        return [i for i in netifaces.interfaces()
+                if len(netifaces.ifaddresses(i).get(netifaces.AF_INET, []) +
+                       netifaces.ifaddresses(i).get(netifaces.AF_INET6, [])) > 0]
+
+    # removing duplicates keeping order
+    return list(dict.fromkeys(interfaces))
+
 
 def main():
 
@@ -37,15 +66,18 @@ def main():
     
     # Create an exclusive group: in this group only one parameter can be used at time
     source_group = parser.add_mutually_exclusive_group(required=True)
-    source_group.add_argument('-i', '--interface', action='store', dest="interface",
-                        help="Network interface from which to perform live capture",
+    source_group.add_argument('-i', '--interface', action='store', dest="interface", nargs='+',
+                        help="Network interfaces from which to perform live capture, 'all' for every interface",
                         metavar="INTERFACE",
                         type=lambda x: is_valid_interface(parser, x))
 
     source_group.add_argument('-f', '--file', action='store', dest="file",
-                        help="Packet capture file", metavar="FILE .pcap/.pcapng",
+                        help="Packet capture file, possibly compressed (.gz, .zst, .xz)", metavar="FILE .pcap/.pcapng",
                         type=lambda x: is_valid_capture(parser, x))
 
+    source_group.add_argument('--collect', action='store', dest="collect", metavar="[HOST:]PORT",
+                        help="Collect interval counts sent by sensors (UDP or TCP) and detect attacks on their sum")
+
     parser.add_argument('-s', '--slice', dest='interval', action='store',default=5.0,
                         help="Specify duration of time interval observation in seconds (default: 5)")
    
@@ -61,8 +93,83 @@ def main():
                         help="Threshold detection value for CUSUM Parametric mode", type=float)
     
     parser.add_argument('-a', '--address', action='store', dest="address",
-                        help=" IPv4 address of attacked machine for PCAP capture: requires --file", type=str)
+                        help=" IPv4/IPv6 address of attacked machine for PCAP capture: requires --file", type=str)
     
+    parser.add_argument('--half-open', action='store', dest="half_open", metavar="TIMEOUT", type=float,
+                        help="Use as detection metric the connections left half-open for TIMEOUT seconds "
+                             "instead of SYN and SYN/ACK counts")
+
+    parser.add_argument('--features', action='store', dest="features", nargs='+', default=[],
+                        choices=sorted(FEATURES), metavar="FEATURE",
+                        help="Additional per interval packet counters analyzed each one by its own CUSUM detector "
+                             "(%s)" % ", ".join(sorted(FEATURES)))
+
+    parser.add_argument('--networks', action='store', dest="networks", nargs='+', default=[], metavar="NETWORK",
+                        help="Monitored networks (e.g. 10.0.0.0/16): every host and prefix gets its own detector")
+
+    parser.add_argument('--prefixes', action='store', dest="prefixes", nargs='+', type=int, default=[24, 16],
+                        metavar="LENGTH", help="IPv4 prefix lengths the hosts of --networks are rolled up to "
+                                               "(default: 24 16)")
+
+    parser.add_argument('--ipv6-prefixes', action='store', dest="ipv6_prefixes", nargs='+', type=int,
+                        default=[64, 48], metavar="LENGTH",
+                        help="IPv6 prefix lengths the hosts of --networks are rolled up to, at most 64 "
+                             "(default: 64 48)")
+
+    parser.add_argument('--stats', action='store', dest="stats", metavar="SECONDS", type=float,
+                        help="Periodically write profiling statistics to stderr every SECONDS seconds")
+
+    parser.add_argument('--stats-port', action='store', dest="stats_port", metavar="PORT", type=int,
+                        help="Serve profiling statistics in Prometheus text format on http://127.0.0.1:PORT/metrics")
+
+    parser.add_argument('--overload', action='store', dest="overload", metavar="LOAD", type=float,
+                        help="Sample packets when counting them takes more than LOAD (0-1) of the time: "
+                             "requires --interface")
+
+    parser.add_argument('--sampling', action='store', dest="sampling", choices=["flow", "packet"], default="flow",
+                        help="Overload sampling of connections by hash (flow, default) or 1 in N packets (packet)")
+
+    parser.add_argument('--sensor', action='store', dest="sensor", metavar="HOST:PORT",
+                        help="Send the counts of every interval to the collector at HOST:PORT")
+
+    parser.add_argument('--sensor-protocol', action='store', dest="sensor_protocol", choices=["udp", "tcp"],
+                        default="udp", help="Protocol used to send counts to the collector (default: udp)")
+
+    parser.add_argument('--sensor-name', action='store', dest="sensor_name", metavar="NAME",
+                        help="Name identifying this sensor on the collector (default: host name)")
+
+    parser.add_argument('--deadline', action='store', dest="deadline", metavar="SECONDS", type=float,
+                        help="Seconds the collector waits for missing sensors (default: interval duration)")
+
+    parser.add_argument('--sensors', action='store', dest="sensors", metavar="N", type=int, default=0,
+                        help="Number of sensors expected by the collector (default: the sensors seen so far)")
+
+    parser.add_argument('--results', action='store', dest="results", metavar="FILE .npz/.parquet", type=str,
+                        help="Write the detector values of every interval to a NumPy (.npz) or Parquet (.parquet) "
+                             "file: requires --file")
+
+    parser.add_argument('--refit', action='store', dest="refit", metavar="INTERVALS", type=int,
+                        help="Fit again the smoothing factors every INTERVALS intervals in background")
+
+    parser.add_argument('--refit-history', action='store', dest="refit_history", metavar="N", type=int,
+                        default=720, help="Intervals of history used to fit the smoothing factors (default: 720)")
+
+    parser.add_argument('--decompress-thread', action='store_true', dest="decompress_thread",
+                        help="Decompress compressed captures (.gz, .zst, .xz) on a separate thread: requires --file")
+
+    parser.add_argument('--forensics', action='store', dest="forensics", metavar="DIR", type=str,
+                        help="Dump the frames around every detected attack to a pcap file in DIR")
+
+    parser.add_argument('--forensic-buffer', action='store', dest="forensic_buffer", metavar="BYTES", type=int,
+                        default=32 << 20, help="Bytes of recent frames kept for dumps by each target "
+                                               "(default: 32 MiB)")
+
+    parser.add_argument('--forensic-snaplen', action='store', dest="forensic_snaplen", metavar="BYTES", type=int,
+                        default=128, help="Bytes kept of each dumped frame (default: 128)")
+
+    parser.add_argument('--control', action='store', dest="control", metavar="PATH", type=str,
+                        help="Serve the control and query API on the Unix socket PATH")
+
     parser.add_argument("-v", "--verbose",  action='store', dest="verbose",type=bool, nargs='?',
                         const=True, default=False,
                         help="Flag to set verbose output mode")
@@ -81,6 +188,49 @@ def main():
     if (args.graph and args.file is not None):
             parser.error("--graph unable to start with --file [FILE .pcap/.pcapng]")
 
+    # Check collector mode options
+    if args.collect is not None and (args.graph or args.sensor is not None or args.half_open is not None or
+                                     len(args.features) > 0 or args.overload is not None or len(args.networks) > 0):
+        parser.error("--collect unable to start with --graph, --sensor, --half-open, --features, --overload "
+                     "or --networks")
+
+    for network in args.networks:
+        try:
+            ipaddress.ip_network(network, strict=False)
+        except ValueError:
+            parser.error("%s is not an IPv4/IPv6 network!" % network)
+
+    if not all(0 < length < 32 for length in args.prefixes) or \
+            not all(0 < length <= 64 for length in args.ipv6_prefixes):
+        parser.error("--prefixes must be between 1 and 31, --ipv6-prefixes between 1 and 64")
+
+    # Check overload mode and file capture both selected
+    if args.overload is not None and args.file is not None:
+        parser.error("--overload unable to start with --file [FILE .pcap/.pcapng]")
+
+    if (args.refit is not None and args.refit <= 0) or args.refit_history <= 0:
+        parser.error("--refit and --refit-history must be positive")
+
+    if args.decompress_thread and args.file is None:
+        parser.error("--decompress-thread requires --file [FILE .pcap/.pcapng]")
+
+    if args.forensics is not None:
+        if args.collect is not None:
+            parser.error("--forensics unable to start with --collect")
+
+        if not os.path.isdir(args.forensics):
+            parser.error("%s is not a directory" % args.forensics)
+
+        if args.forensic_snaplen <= 0 or args.forensic_buffer < args.forensic_snaplen:
+            parser.error("--forensic-snaplen must be positive and not greater than --forensic-buffer")
+
+    # Check results export without file capture
+    if args.results is not None and args.file is None:
+        parser.error("--results requires --file [FILE .pcap/.pcapng]")
+
+    if args.overload is not None and not 0 < args.overload < 1:
+        parser.error("--overload must be between 0 and 1")
+
     # Check file && localaddr dependency
     if (args.file and args.address is None) or (args.interface and args.address is not None):
         parser.error("--pcap requires --address [ADDRESS].")
@@ -88,9 +238,15 @@ def main():
     elif args.file is not None:
         # Check address format
         try: 
-            ipaddress.IPv4Address(args.address)
+            ipaddress.ip_address(args.address)
         except:
-            parser.error("%s is not an IPv4 address!" % str(args.address))
+            parser.error("%s is not an IPv4/IPv6 address!" % str(args.address))
+
+    if args.interface is not None:
+        args.interface = expand_interfaces(args.interface)
+
+        if len(args.interface) == 0:
+            parser.error("No interface with an IP address found")
 
     # Initialize to default value if None
     if args.threshold is None:
@@ -105,35 +261,140 @@ def main():
             utils.colors(7,0,"[Graph startup] - Error while connecting to influxdb instance: check your influxd service!", 12)
             sys.exit(1)
 
+    # Initialize profiler if --stats or --stats-port
+    profiler = None
+    if args.stats is not None or args.stats_port is not None:
+        profiler = Profiler()
+
+        if args.stats is not None:
+            profiler.start_dump(args.stats)
+
+        if args.stats_port is not None:
+            try:
+                profiler.start_server(args.stats_port)
+            except OSError as e:
+                parser.error("Unable to serve statistics on port %d: %s" % (args.stats_port, e))
+
     # Set TERM for curses color support
     if os.getenv("TERM") is None:
         os.environ['TERM'] = "xterm-256color"
 
+    # Counts exporter if --sensor
+    exporter = None
+    if args.sensor is not None:
+        try:
+            exporter = SensorExporter(args.sensor, args.sensor_name, args.sensor_protocol)
+        except (OSError, ValueError) as e:
+            parser.error("Invalid collector address %s: %s" % (args.sensor, e))
+
+    # Interval results writer if --results
+    results = None
+    if args.results is not None:
+        try:
+            results = open_result_writer(args.results)
+        except ImportError:
+            parser.error("Parquet results require pyarrow (pip install pyarrow)")
+        except (OSError, ValueError) as e:
+            parser.error("Unable to write results to %s: %s" % (args.results, e))
+
+    # Smoothing factors refitter if --refit, offline analyses wait for fits to be reproducible
+    refitter = None
+    if args.refit is not None:
+        refitter = SmoothingRefitter(args.refit, args.refit_history, wait=args.file is not None)
+
+    # Frames rings dumped on attacks if --forensics, offline dumps wait for the writer to be complete
+    forensics = None
+    if args.forensics is not None:
+        forensics = ForensicCapture(args.forensics, args.forensic_buffer, args.forensic_snaplen,
+                                    wait=args.file is not None)
+
+    if args.collect is not None:
+        # Start collector (--collect [HOST:]PORT mode)
+        analyzer = CollectorCatcher(
+            source=args.collect,
+            parametric=args.param,
+            time_interval=int(args.interval),
+            threshold=float(args.threshold),
+            verbose=bool(args.verbose),
+            deadline=args.deadline,
+            sensors=args.sensors,
+            profiler=profiler,
+            refitter=refitter
+        )
     # Start live capture if file is None (-i [INTERFACE] mode)
-    if args.file is None:
+    elif args.file is None:
         analyzer = LiveCatcher(
-            source=str(args.interface),
+            source=args.interface,
             plot=plot,
             parametric=args.param,
             time_interval=int(args.interval),
             threshold=float(args.threshold),
-            verbose=bool(args.verbose)
+            verbose=bool(args.verbose),
+            half_open_timeout=args.half_open,
+            features=args.features,
+            profiler=profiler,
+            overload=args.overload,
+            sampling=args.sampling,
+            exporter=exporter,
+            align=exporter is not None,
+            refitter=refitter,
+            forensics=forensics,
+            networks=args.networks,
+            prefixes=args.prefixes,
+            ipv6_prefixes=args.ipv6_prefixes
         )
     else:
         # Start analyzer from PCAP capture (-f [FILE] mode)
         analyzer = OfflineCatcher(
             source=str(args.file),
-            ipv4_address=str(args.address),
+            address=str(args.address),
             parametric=args.param,
             time_interval=int(args.interval),
             threshold=float(args.threshold),
-            verbose=bool(args.verbose)
+            verbose=bool(args.verbose),
+            half_open_timeout=args.half_open,
+            features=args.features,
+            profiler=profiler,
+            exporter=exporter,
+            results=results,
+            refitter=refitter,
+            decompress_thread=args.decompress_thread,
+            forensics=forensics,
+            networks=args.networks,
+            prefixes=args.prefixes,
+            ipv6_prefixes=args.ipv6_prefixes
         )
 
+    # Start control server if --control
+    control = None
+    if args.control is not None:
+        control = ControlServer(analyzer, args.control)
+
+        try:
+            control.start()
+        except OSError as e:
+            # nothing analyzed: no results file and no temporary columns left behind
+            if results is not None:
+                results.abort()
+
+            parser.error("Unable to serve the control API on %s: %s" % (args.control, e))
+
     def sigint_handler(signum, frame):
 
+        if control is not None:
+            control.stop()
+
+        if refitter is not None:
+            refitter.close()
+
+        if forensics is not None:
+            forensics.close()
+
         if args.graph:
             plot.stop_writing_thread()
+
+        if profiler is not None:
+            profiler.stop()
         
         print_statistics()
 
@@ -141,19 +402,60 @@ def main():
         exit(0)
 
     def print_statistics():
+        targets = analyzer.get_targets()
+
+        # statistics are printed below the dashboard blocks of all targets
+        row = Target.ROWS * len(targets)
+
         utils.colors(0,0,"                                                        ",5)
         utils.colors(0,0,"Status: monitoring ended",7)
-        utils.colors(9,0,"Total intervals:           " + str(analyzer.get_total_intervals()),3)
-        utils.colors(10,0,"Anomalous intervals count: " + str(analyzer.get_anomalous_intervals_count()),3)
-        utils.colors(12,0,"Max volume reached:        " + str(analyzer.get_max_volume()),3)
-        utils.colors(13,0,"Mean volume reached:       " + str(analyzer.get_mean_volume()),3)
+        utils.colors(row + 1,0,"Total intervals:           " + str(analyzer.get_total_intervals()),3)
+        utils.colors(row + 2,0,"Anomalous intervals count: " + str(analyzer.get_anomalous_intervals_count()),3)
+        utils.colors(row + 4,0,"Max volume reached:        " + str(analyzer.get_max_volume()),3)
+        utils.colors(row + 5,0,"Mean volume reached:       " + str(analyzer.get_mean_volume()),3)
+
+        if len(targets) == 1:
+            target = targets[0]
+            utils.colors(row + 3,0,"Volume std dev / p95 / p99: %.4f / %.4f / %.4f" % (
+                target.get_volume_deviation(), target.get_volume_quantile(0.95), target.get_volume_quantile(0.99)),3)
 
         start_time = analyzer.get_time_start()
         end_time =  analyzer.get_time_end()
 
-        if args.file is None and start_time != 0 and end_time != 0:
-            utils.colors(14,0,"Attack start detected at:       " + str(datetime.fromtimestamp(start_time)),12)
-            utils.colors(15,0,"End attack detected at:         " + str(datetime.fromtimestamp(end_time)),12)
+        if start_time != 0 and end_time != 0:
+            utils.colors(row + 6,0,"Attack start detected at:       " + str(datetime.fromtimestamp(start_time)),12)
+            utils.colors(row + 7,0,"End attack detected at:         " + str(datetime.fromtimestamp(end_time)),12)
+
+        # top SYN sources of last attack
+        sources_row = row + 9
+        for target in targets:
+            sources = target.get_attack_end_sources() or target.get_attack_start_sources()
+
+            if len(sources) > 0:
+                utils.colors(sources_row,0,"[" + target.name + "] top SYN sources of last attack:",12)
+                sources_row += 1
+
+                for address, count, error in sources:
+                    utils.colors(sources_row,0,"    {:<40} {}".format(address, count),12)
+                    sources_row += 1
+
+        if args.collect is not None:
+            # sensors summary
+            attacked = analyzer.get_attacked_sensors()
+            utils.colors(sources_row,0,"Sensors: " + str(len(analyzer.get_sensors_state())) +
+                         " late records: " + str(analyzer.late_records) +
+                         " missing reports: " + str(analyzer.missing_reports),3)
+            if len(attacked) > 0:
+                utils.colors(sources_row + 1,0,"Sensors under attack: " + " ".join(attacked),12)
+            sources_row += 2
+
+        if len(targets) > 1:
+            # per target summary
+            for n, target in enumerate(targets):
+                utils.colors(sources_row + n,0,"[" + target.name + "] intervals: " + str(target.get_total_intervals()) +
+                             " anomalous: " + str(target.get_anomalous_intervals_count()) +
+                             " max volume: " + str(target.get_max_volume()) +
+                             " p99 volume: %.4f" % target.get_volume_quantile(0.99),3)
 
     # Register handler for SIGINT
     signal.signal(signal.SIGINT, sigint_handler)
@@ -164,6 +466,20 @@ def main():
     except (KeyboardInterrupt, SystemExit):
         sys.exit()
 
+    if control is not None:
+        control.stop()
+
+    if refitter is not None:
+        refitter.close()
+
+    # attacks still running are dumped up to the last frame
+    if forensics is not None:
+        forensics.close()
+
+    if profiler is not None:
+        profiler.stop()
+        sys.stderr.write(profiler.report() + "\n")
+
     print_statistics()
    
 